@@ -1,84 +1,37 @@
+import time
+
+_import_started_at = time.perf_counter()
+
+import asyncio
 import traceback
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from sqlalchemy import select
+from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 import auth
-import models
-from config import ROLE_ADMIN, ROLE_TEACHER, logger, settings
-from database import create_tables, get_db_context
+import cache
+import jobs
+import profiler
+from config import logger, settings
+from database import create_tables, get_engine
 from handlers import main_router
+from seed import seed_database
+from startup import startup
 
 
 async def init_database():
     """Инициализация базы данных"""
     try:
-        await create_tables()
-
-        async with get_db_context() as db:
-            # Проверяем существующих преподавателей
-            result = await db.execute(select(models.Teacher))
-            existing_teachers = len(result.scalars().all())
-
-            if existing_teachers == 0:
-                logger.info("Нет преподавателей, создаем тестовые данные...")
-
-                for teacher_data in settings.TEACHERS_DATA:
-                    teacher = models.Teacher(
-                        username=teacher_data["username"],
-                        full_name=teacher_data["full_name"],
-                        subject=teacher_data["subject"],
-                        password_hash=auth.get_password_hash(teacher_data["password"]),
-                        role=ROLE_TEACHER,
-                    )
-                    db.add(teacher)
-
-                for admin_data in settings.ADMINS_DATA:
-                    admin = models.Teacher(
-                        username=admin_data["username"],
-                        full_name=admin_data["full_name"],
-                        subject=admin_data["subject"],
-                        password_hash=auth.get_password_hash(admin_data["password"]),
-                        role=ROLE_ADMIN,
-                    )
-                    db.add(admin)
-
-                await db.commit()
-                logger.info("Тестовые преподаватели и администраторы созданы успешно")
-            else:
-                # Проверяем и создаем администраторов, если их нет
-                for admin_data in settings.ADMINS_DATA:
-                    admin_result = await db.execute(
-                        select(models.Teacher).where(
-                            models.Teacher.username == admin_data["username"]
-                        )
-                    )
-                    admin = admin_result.scalar_one_or_none()
-
-                    if not admin:
-                        logger.info(
-                            f"Создаем учетную запись администратора {admin_data['full_name']}..."
-                        )
-                        admin = models.Teacher(
-                            username=admin_data["username"],
-                            full_name=admin_data["full_name"],
-                            subject=admin_data["subject"],
-                            password_hash=auth.get_password_hash(
-                                admin_data["password"]
-                            ),
-                            role=ROLE_ADMIN,
-                        )
-                        db.add(admin)
-                        await db.commit()
-                        logger.info(f"Администратор {admin.full_name} создан успешно")
-                    else:
-                        logger.info(
-                            f"Администратор {admin_data['full_name']} уже существует"
-                        )
+        with startup.phase("create_tables"):
+            await create_tables()
+
+        if settings.SEED_ON_STARTUP:
+            with startup.phase("seed"):
+                await seed_database()
 
     except IntegrityError as e:
         logger.error(f"Ошибка целостности данных: {e}")
@@ -89,16 +42,57 @@ async def init_database():
         logger.error(traceback.format_exc())
 
 
+async def warm_up():
+    """
+    Прогрев воркера после старта: криптография и соединение с БД.
+    Готовность (/health/ready) включается только после него
+    """
+    try:
+        with startup.phase("warm_up_crypto"):
+            await asyncio.to_thread(auth.warm_up)
+
+        if not settings.TENANCY_ENABLED:
+            with startup.phase("warm_up_database"):
+                async with get_engine().connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+
+        startup.ready = True
+        startup.log()
+    except Exception as e:
+        logger.error(f"Ошибка при прогреве: {e}")
+        logger.error(traceback.format_exc())
+
+
 # Create tables on startup
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Управление жизненным циклом приложения"""
     logger.info("Запуск приложения...")
-    # Инициализация базы данных
-    await init_database()
+    # Инициализация базы данных; БД школ в мультиарендном режиме
+    # создаются лениво при первом запросе
+    if not settings.TENANCY_ENABLED:
+        await init_database()
+        await jobs.schedule_recurring()
+
+    # Фоновые задачи; при JOBS_ENABLED=False их выполняет
+    # отдельный процесс: python cli.py jobs work
+    if settings.JOBS_ENABLED:
+        await jobs.runner.start()
+
+    if settings.LOOP_LAG_MONITOR_ENABLED:
+        profiler.loop_monitor.start()
+
+    # Прогрев идет в фоне: воркер уже принимает соединения,
+    # а балансировщик ждет /health/ready
+    warm_up_task = asyncio.create_task(warm_up())
 
     yield
 
+    warm_up_task.cancel()
+    await profiler.loop_monitor.stop()
+    await jobs.runner.stop(settings.JOBS_DRAIN_SECONDS)
+    await jobs.queue.close()
+    await cache.backend.close()
     logger.info("Остановка приложения...")
 
 
@@ -110,6 +104,7 @@ app = FastAPI(
     redoc_url="/redoc",
 )
 app.include_router(main_router)
+startup.record("import", _import_started_at)
 
 
 # Глобальный обработчик исключений
@@ -137,13 +132,6 @@ app.add_middleware(
 )
 
 
-# Health check
-@app.get("/health")
-async def health_check():
-    """Проверка здоровья приложения"""
-    return {"status": "healthy", "service": "school-praise-api", "version": "1.0.0"}
-
-
 @app.get("/")
 async def read_root():
     """Корневой эндпоинт"""
@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import Column, Index, MetaData, Table, inspect, null, select, union_all
+from sqlalchemy.engine import Connection
+
+import models
+from config import logger, settings
+from database import get_engine, sql_datetime
+
+ARCHIVE_TABLE_PREFIX = "praise_messages_archive_"
+
+# Архивные таблицы не входят в Base.metadata: create_all и миграции
+# их не трогают, они создаются по мере архивации
+archive_metadata = MetaData()
+
+
+def term_for(created_at: datetime) -> str:
+    """
+    Учебное полугодие сообщения: '2024_1' - сентябрь-декабрь 2024,
+    '2024_2' - январь-август 2025 (учебный год 2024/25)
+    """
+    if created_at.month >= 9:
+        return f"{created_at.year}_1"
+    return f"{created_at.year - 1}_2"
+
+
+def archive_table(term: str) -> Table:
+    """Описание архивной таблицы полугодия с колонками горячей таблицы"""
+    name = f"{ARCHIVE_TABLE_PREFIX}{term}"
+    if name in archive_metadata.tables:
+        return archive_metadata.tables[name]
+    # Без внешних ключей: архив переживает удаление преподавателя
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key)
+        for column in models.PraiseMessage.__table__.columns
+    ]
+    return Table(
+        name,
+        archive_metadata,
+        *columns,
+        Index(f"ix_{name}_teacher_id_created_at", "teacher_id", "created_at"),
+    )
+
+
+def archive_sources(conn: Connection) -> Dict[str, Set[str]]:
+    """Существующие архивные таблицы и их колонки"""
+    inspector = inspect(conn)
+    return {
+        name: {column["name"] for column in inspector.get_columns(name)}
+        for name in sorted(inspector.get_table_names())
+        if name.startswith(ARCHIVE_TABLE_PREFIX)
+    }
+
+
+def _ensure_archive_table(conn: Connection, term: str) -> Table:
+    """Создание архивной таблицы или добавление колонок, появившихся позже"""
+    table = archive_table(term)
+    inspector = inspect(conn)
+    if not inspector.has_table(table.name):
+        table.create(conn)
+        return table
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    for column in table.columns:
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(
+                f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+            )
+    return table
+
+
+def archive_batch(conn: Connection, cutoff: datetime, batch_size: int) -> Dict[str, int]:
+    """
+    Перенос одной порции сообщений старше cutoff в архивные таблицы.
+    Вызывается внутри транзакции; возвращает число строк по полугодиям
+    """
+    hot = models.PraiseMessage.__table__
+    rows = conn.execute(
+        select(hot.c.id, hot.c.created_at)
+        .where(hot.c.created_at < sql_datetime(cutoff))
+        .order_by(hot.c.created_at)
+        .limit(batch_size)
+    ).all()
+
+    by_term: Dict[str, List[str]] = {}
+    for praise_id, created_at in rows:
+        by_term.setdefault(term_for(created_at), []).append(praise_id)
+
+    for term, ids in by_term.items():
+        table = _ensure_archive_table(conn, term)
+        columns = [column.name for column in table.columns]
+        conn.execute(
+            table.insert().from_select(
+                columns,
+                select(*(hot.c[name] for name in columns)).where(hot.c.id.in_(ids)),
+            )
+        )
+        conn.execute(hot.delete().where(hot.c.id.in_(ids)))
+    return {term: len(ids) for term, ids in by_term.items()}
+
+
+async def archive_old_praises(
+    older_than_days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    tenant: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Архивация сообщений старше заданного возраста порциями,
+    каждая порция - отдельная короткая транзакция
+    """
+    days = older_than_days if older_than_days is not None else settings.ARCHIVE_AFTER_DAYS
+    size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+
+    engine = get_engine(tenant)
+    totals: Dict[str, int] = {}
+    while True:
+        async with engine.begin() as conn:
+            moved = await conn.run_sync(archive_batch, cutoff, size)
+        for term, count in moved.items():
+            totals[term] = totals.get(term, 0) + count
+        if sum(moved.values()) < size:
+            break
+
+    if totals:
+        logger.info(f"Архивировано сообщений по полугодиям: {totals}")
+    return totals
+
+
+def praises_with_archive(sources: Dict[str, Set[str]], hot_conditions=()):
+    """
+    Подзапрос UNION ALL по горячей таблице и архивам (см. archive_sources)
+    для прозрачного чтения выгрузками администратора. Колонки, которых
+    нет в старых архивах, читаются как NULL; hot_conditions ограничивают
+    только строки горячей таблицы
+    """
+    hot = models.PraiseMessage.__table__
+    selects = [select(*hot.columns).where(*hot_conditions)]
+    for name, existing in sources.items():
+        table = archive_table(name[len(ARCHIVE_TABLE_PREFIX) :])
+        selects.append(
+            select(
+                *(
+                    table.c[column.name]
+                    if column.name in existing
+                    else null().label(column.name)
+                    for column in hot.columns
+                )
+            )
+        )
+    return union_all(*selects).subquery("praises")
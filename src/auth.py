@@ -1,25 +1,50 @@
+import hashlib
+import hmac
+import secrets
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 
 from fastapi import Header, HTTPException, status
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 
 from config import settings
 
-pwd_context = CryptContext(
-    schemes=["argon2", "bcrypt"],
-    deprecated="auto",
-    argon2__memory_cost=10240,
-    argon2__parallelism=2,
-    argon2__rounds=6,
-)
+
+# passlib с бэкендами argon2/bcrypt и python-jose с cryptography
+# импортируются при первом использовании, а не при импорте приложения
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """Контекст хеширования паролей"""
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["argon2", "bcrypt"],
+        deprecated="auto",
+        argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+        argon2__parallelism=settings.ARGON2_PARALLELISM,
+        argon2__rounds=settings.ARGON2_TIME_COST,
+    )
+
+
+@lru_cache(maxsize=None)
+def dummy_hash() -> str:
+    """Хеш с текущими параметрами для проверки входа неизвестного логина"""
+    return get_pwd_context().hash("dummy-password-for-unknown-users")
+
+
+def warm_up() -> None:
+    """Загрузка криптографических библиотек и бэкенда argon2 заранее"""
+    from jose import jwt  # noqa: F401
+
+    get_pwd_context().handler("argon2").get_backend()
+    dummy_hash()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Верификация пароля"""
     try:
-        return pwd_context.verify(plain_password, hashed_password)
+        return get_pwd_context().verify(plain_password, hashed_password)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -27,10 +52,15 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         )
 
 
+def needs_rehash(hashed_password: str) -> bool:
+    """Хеш создан другой схемой или с другими параметрами argon2"""
+    return get_pwd_context().needs_update(hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     """Хеширование пароля"""
     try:
-        return pwd_context.hash(password)
+        return get_pwd_context().hash(password)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -38,8 +68,58 @@ def get_password_hash(password: str) -> str:
         )
 
 
+def calibrate_argon2(
+    target_ms: float,
+    memory_cost: int,
+    parallelism: int,
+    samples: int = 3,
+) -> Tuple[Dict[str, int], float]:
+    """
+    Подбор параметров argon2 под целевое время проверки пароля на этом
+    сервере: при заданной памяти увеличивается число проходов, пока проверка
+    не займет target_ms; если и один проход медленнее цели, уменьшается память.
+    Возвращает параметры и измеренное время проверки (мс)
+    """
+    from passlib.hash import argon2
+
+    def measure(time_cost: int, memory: int) -> float:
+        handler = argon2.using(
+            rounds=time_cost, memory_cost=memory, parallelism=parallelism
+        )
+        hashed = handler.hash("calibration-password")
+        timings = []
+        for _ in range(samples):
+            started_at = time.perf_counter()
+            handler.verify("calibration-password", hashed)
+            timings.append((time.perf_counter() - started_at) * 1000)
+        return sorted(timings)[len(timings) // 2]
+
+    # argon2 требует не меньше 8 КиБ на поток
+    min_memory = 8 * parallelism
+    time_cost = 1
+    elapsed = measure(time_cost, memory_cost)
+    while elapsed > target_ms and memory_cost // 2 >= min_memory:
+        memory_cost //= 2
+        elapsed = measure(time_cost, memory_cost)
+    while elapsed < target_ms:
+        next_elapsed = measure(time_cost + 1, memory_cost)
+        if next_elapsed > target_ms and target_ms - elapsed < next_elapsed - target_ms:
+            break
+        time_cost += 1
+        elapsed = next_elapsed
+
+    params = {
+        "ARGON2_MEMORY_COST": memory_cost,
+        "ARGON2_TIME_COST": time_cost,
+        "ARGON2_PARALLELISM": parallelism,
+    }
+    return params, elapsed
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Создание JWT токена"""
+    from jose import jwt
+
     try:
         to_encode = data.copy()
         if expires_delta:
@@ -60,6 +140,20 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         )
 
 
+def create_refresh_token() -> Tuple[str, str]:
+    """Новый refresh-токен и его HMAC для хранения в БД"""
+    token = secrets.token_urlsafe(32)
+    return token, hash_refresh_token(token)
+
+
+def hash_refresh_token(token: str) -> str:
+    """
+    HMAC-SHA256 refresh-токена на SECRET_KEY. Токен случайный и длинный,
+    поэтому медленный хеш не нужен: утечка таблицы не дает рабочих токенов
+    """
+    return hmac.new(settings.SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+
 async def get_token(authorization: Optional[str] = Header(None)):
     """Извлечение токена из заголовка"""
     if not authorization:
@@ -96,8 +190,13 @@ async def get_token(authorization: Optional[str] = Header(None)):
         )
 
 
-def verify_token(token: str):
-    """Верификация JWT токена"""
+def verify_token(token: str, tenant: Optional[str] = None):
+    """
+    Верификация JWT токена. Токен действует только в школе,
+    для которой выдан (claim tenant)
+    """
+    from jose import jwt
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Недействительные учетные данные",
@@ -109,11 +208,13 @@ def verify_token(token: str):
         )
 
         teacher_id: str = payload.get("sub")
-        if teacher_id is None:
+        if teacher_id is None or payload.get("tenant") != tenant:
             raise credentials_exception
 
         return teacher_id
 
+    except HTTPException:
+        raise
     except jwt.JWTError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
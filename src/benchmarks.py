@@ -0,0 +1,71 @@
+"""
+Микробенчмарки горячих путей API.
+
+Запуск: python benchmarks.py
+"""
+
+import re
+import timeit
+import uuid
+import warnings
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+import schemas
+
+PRAISE_PAYLOAD = {
+    "teacher_id": str(uuid.uuid4()),
+    "message": "Спасибо за интересные уроки и терпение! " * 5,
+    "is_anonymous": False,
+    "user_name": "Иван Петров",
+}
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    from pydantic import validator
+
+    class LegacyPraiseMessageCreate(BaseModel):
+        """Схема в прежнем виде (валидаторы pydantic v1) для сравнения"""
+
+        message: str = Field(..., min_length=5, max_length=1000)
+        is_anonymous: bool = Field(default=True)
+        user_name: Optional[str] = Field(None, min_length=2, max_length=100)
+        teacher_id: str = Field(
+            ...,
+            pattern=r"^[a-f0-9]{8}-[a-f0-9]{4}-4[a-f0-9]{3}-[89ab][a-f0-9]{3}-[a-f0-9]{12}$",
+        )
+
+        @validator("message")
+        def validate_message(cls, v):
+            if re.search(r"[<>{}[\]]", v):
+                raise ValueError("Сообщение содержит недопустимые символы")
+            return v.strip()
+
+        @validator("user_name")
+        def validate_user_name(cls, v, values):
+            if not values.get("is_anonymous") and not v:
+                raise ValueError("Имя отправителя обязательно для неанонимных сообщений")
+            return v
+
+
+def _per_call_us(func, number: int) -> float:
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    return best / number * 1_000_000
+
+
+def bench_praise_validation(number: int = 20000) -> None:
+    """Стоимость валидации тела POST /praise в микросекундах на запрос"""
+    before = _per_call_us(
+        lambda: LegacyPraiseMessageCreate.model_validate(PRAISE_PAYLOAD), number
+    )
+    after = _per_call_us(
+        lambda: schemas.PraiseMessageCreate.model_validate(PRAISE_PAYLOAD), number
+    )
+    print("PraiseMessageCreate validation")
+    print(f"  before: {before:.2f} us/request")
+    print(f"  after:  {after:.2f} us/request ({before / after:.2f}x)")
+
+
+if __name__ == "__main__":
+    bench_praise_validation()
@@ -0,0 +1,381 @@
+import asyncio
+import csv
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Set
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import archive
+import auth
+import models
+import schemas
+import spam
+from config import ROLE_TEACHER, logger
+from database import get_engine
+
+TEACHER_FIELDS = ["id", "username", "full_name", "subject", "role", "password_hash"]
+PRAISE_FIELDS = [
+    "id",
+    "teacher_id",
+    "teacher_username",
+    "message",
+    "created_at",
+    "is_anonymous",
+    "user_name",
+    "is_flagged",
+]
+
+
+def _file_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".ndjson", ".jsonl"):
+        return "ndjson"
+    raise ValueError(f"{path}: expected .csv, .ndjson or .jsonl file")
+
+
+def iter_records(path: str) -> Iterator[dict]:
+    """Потоковое чтение записей из CSV или NDJSON без загрузки файла в память"""
+    file_format = _file_format(path)
+    with open(path, encoding="utf-8", newline="") as source:
+        if file_format == "csv":
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class RecordWriter:
+    """Потоковая запись записей в CSV или NDJSON"""
+
+    def __init__(self, path: str, fields: List[str]):
+        self.format = _file_format(path)
+        self.fields = fields
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        if self.format == "csv":
+            self.csv = csv.DictWriter(self.file, fieldnames=fields)
+            self.csv.writeheader()
+
+    def write(self, record: dict) -> None:
+        if self.format == "csv":
+            self.csv.writerow(record)
+        else:
+            self.file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class Checkpoint:
+    """
+    Отметка прогресса импорта рядом с входным файлом: число записей,
+    уже закоммиченных в БД. Повторный запуск пропускает их
+    """
+
+    def __init__(self, input_path: str, enabled: bool = True):
+        self.path = f"{input_path}.progress"
+        self.enabled = enabled
+        self.committed = 0
+        if enabled and os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as source:
+                self.committed = json.load(source)["committed"]
+
+    def save(self, committed: int) -> None:
+        self.committed = committed
+        if not self.enabled:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as target:
+            json.dump({"committed": committed}, target)
+        os.replace(tmp_path, self.path)
+
+    def finish(self) -> None:
+        if self.enabled and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Progress:
+    """Периодический отчет о скорости импорта/экспорта"""
+
+    def __init__(self, label: str, start: int = 0):
+        self.label = label
+        self.start = start
+        self.started_at = time.monotonic()
+
+    def report(self, done: int) -> None:
+        elapsed = time.monotonic() - self.started_at
+        rate = (done - self.start) / elapsed if elapsed else 0.0
+        print(f"{self.label}: {done} records ({rate:.0f}/s)", flush=True)
+
+
+def _as_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "да")
+
+
+def _as_utc_naive(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _batches(records: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _import(
+    path: str,
+    table,
+    prepare,
+    batch_size: int,
+    commit_every: int,
+    resume: bool,
+    tenant: Optional[str],
+) -> int:
+    """
+    Общий цикл импорта: пакетные INSERT ... ON CONFLICT DO NOTHING
+    (повтор безопасен), транзакция на commit_every записей, отметка
+    прогресса после каждого коммита
+    """
+    engine = get_engine(tenant)
+    checkpoint = Checkpoint(path, enabled=resume)
+    progress = Progress(f"import {os.path.basename(path)}", start=checkpoint.committed)
+    if checkpoint.committed:
+        print(f"Resuming after {checkpoint.committed} committed records")
+
+    records = iter_records(path)
+    for _ in range(checkpoint.committed):
+        next(records, None)
+
+    statement = sqlite_insert(table).on_conflict_do_nothing()
+    done = checkpoint.committed
+    batches = _batches(records, batch_size)
+    while True:
+        pending = 0
+        async with engine.begin() as conn:
+            for batch in batches:
+                rows = await prepare(conn, batch)
+                if rows:
+                    await conn.execute(statement, rows)
+                pending += len(batch)
+                if pending >= commit_every:
+                    break
+        if not pending:
+            break
+        done += pending
+        checkpoint.save(done)
+        progress.report(done)
+
+    checkpoint.finish()
+    return done
+
+
+async def import_teachers(
+    path: str,
+    batch_size: int = 500,
+    commit_every: int = 5000,
+    workers: Optional[int] = None,
+    resume: bool = True,
+    tenant: Optional[str] = None,
+) -> int:
+    """
+    Импорт преподавателей. Записи с password хешируются параллельно
+    в пуле потоков (argon2 отпускает GIL); записи с готовым
+    password_hash вставляются как есть
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count())
+
+    async def prepare(conn, batch: List[dict]) -> List[dict]:
+        to_hash = [record for record in batch if not record.get("password_hash")]
+        hashes = await asyncio.gather(
+            *(
+                loop.run_in_executor(executor, auth.get_password_hash, record["password"])
+                for record in to_hash
+            )
+        )
+        for record, password_hash in zip(to_hash, hashes):
+            record["password_hash"] = password_hash
+
+        rows = []
+        for record in batch:
+            # executemany требует одинаковый набор ключей во всех строках
+            row = {
+                "id": record.get("id") or models.generate_uuid(),
+                "username": record["username"],
+                "full_name": record["full_name"],
+                "subject": record["subject"],
+                "role": record.get("role") or ROLE_TEACHER,
+                "password_hash": record["password_hash"],
+            }
+            rows.append(row)
+        return rows
+
+    try:
+        return await _import(
+            path,
+            models.Teacher.__table__,
+            prepare,
+            batch_size,
+            commit_every,
+            resume,
+            tenant,
+        )
+    finally:
+        executor.shutdown()
+
+
+async def import_praises(
+    path: str,
+    batch_size: int = 2000,
+    commit_every: int = 50000,
+    resume: bool = True,
+    tenant: Optional[str] = None,
+) -> int:
+    """
+    Импорт истории благодарностей. Преподаватель ищется по
+    teacher_username, а teacher_id принимается, только если это id
+    существующего преподавателя: выгрузка другой школы ссылается на
+    чужие id. Сообщения проверяются той же схемой, что и в POST /praise
+    """
+    usernames: Dict[str, str] = {}
+    teacher_ids: Set[str] = set()
+    skipped = 0
+    invalid = 0
+
+    async def prepare(conn, batch: List[dict]) -> List[dict]:
+        nonlocal skipped, invalid
+        if not usernames:
+            result = await conn.execute(
+                select(models.Teacher.username, models.Teacher.id).where(
+                    models.Teacher.deleted_at.is_(None)
+                )
+            )
+            usernames.update(result.all())
+            teacher_ids.update(usernames.values())
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+        rows = []
+        for record in batch:
+            teacher_id = usernames.get(record.get("teacher_username") or "")
+            if teacher_id is None and record.get("teacher_id") in teacher_ids:
+                teacher_id = record["teacher_id"]
+            if teacher_id is None:
+                skipped += 1
+                continue
+            try:
+                praise = schemas.PraiseMessageCreate(
+                    teacher_id=teacher_id,
+                    message=record.get("message") or "",
+                    is_anonymous=_as_bool(record.get("is_anonymous", True)),
+                    user_name=record.get("user_name") or None,
+                )
+                praise_id = str(uuid.UUID(record["id"])) if record.get("id") else None
+            except (ValidationError, ValueError):
+                invalid += 1
+                continue
+            rows.append(
+                {
+                    "id": praise_id or models.generate_uuid(),
+                    "teacher_id": teacher_id,
+                    "message": praise.message,
+                    "fingerprint": spam.fingerprint(praise.message),
+                    "created_at": _as_utc_naive(record.get("created_at")) or now,
+                    "is_anonymous": praise.is_anonymous,
+                    "user_name": None if praise.is_anonymous else praise.user_name,
+                    "is_flagged": _as_bool(record.get("is_flagged", False)),
+                }
+            )
+        return rows
+
+    done = await _import(
+        path,
+        models.PraiseMessage.__table__,
+        prepare,
+        batch_size,
+        commit_every,
+        resume,
+        tenant,
+    )
+    if skipped:
+        logger.warning(f"Пропущено благодарностей без известного преподавателя: {skipped}")
+    if invalid:
+        logger.warning(f"Пропущено некорректных благодарностей: {invalid}")
+    return done
+
+
+async def _export(path: str, fields: List[str], statement, tenant: Optional[str]) -> int:
+    engine = get_engine(tenant)
+    writer = RecordWriter(path, fields)
+    progress = Progress(f"export {os.path.basename(path)}")
+    written = 0
+    try:
+        async with engine.connect() as conn:
+            result = await conn.stream(statement.execution_options(yield_per=5000))
+            async for partition in result.mappings().partitions():
+                for row in partition:
+                    writer.write({field: row[field] for field in fields})
+                written += len(partition)
+                progress.report(written)
+    finally:
+        writer.close()
+    return written
+
+
+async def export_teachers(path: str, tenant: Optional[str] = None) -> int:
+    """Выгрузка преподавателей с хешами паролей (для повторного импорта)"""
+    table = models.Teacher.__table__
+    statement = (
+        select(*(table.c[field] for field in TEACHER_FIELDS))
+        .where(table.c.deleted_at.is_(None))
+        .order_by(table.c.username)
+    )
+    return await _export(path, TEACHER_FIELDS, statement, tenant)
+
+
+async def export_praises(path: str, tenant: Optional[str] = None) -> int:
+    """
+    Выгрузка благодарностей в порядке создания вместе с архивными
+    полугодиями (python cli.py archive) и отметкой модерации
+    """
+    async with get_engine(tenant).connect() as conn:
+        sources = await conn.run_sync(archive.archive_sources)
+    praises = archive.praises_with_archive(sources)
+    teachers = models.Teacher.__table__
+    statement = (
+        select(
+            praises.c.id,
+            praises.c.teacher_id,
+            teachers.c.username.label("teacher_username"),
+            praises.c.message,
+            praises.c.created_at,
+            praises.c.is_anonymous,
+            praises.c.user_name,
+            praises.c.is_flagged,
+        )
+        .join(teachers, praises.c.teacher_id == teachers.c.id)
+        .where(teachers.c.deleted_at.is_(None))
+        .order_by(praises.c.created_at)
+    )
+    return await _export(path, PRAISE_FIELDS, statement, tenant)
+
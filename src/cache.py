@@ -0,0 +1,334 @@
+import asyncio
+import functools
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from pydantic import TypeAdapter
+
+from config import logger, settings
+
+
+def scoped(tenant: Optional[str], name: str) -> str:
+    """Ключ или тег кеша в пределах школы"""
+    return f"{tenant}:{name}" if tenant else name
+
+
+class CacheBackend(ABC):
+    """
+    Асинхронный интерфейс кеша. Значения - JSON-совместимые данные;
+    теги позволяют сбросить все записи, зависящие от изменившихся данных
+    """
+
+    enabled = True
+    # Сброс по тегу виден всем воркерам
+    shared = False
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def set(
+        self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()
+    ) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        ...
+
+    async def close(self) -> None:
+        pass
+
+
+class NullCache(CacheBackend):
+    """Кеш выключен (CACHE_BACKEND=none)"""
+
+    enabled = False
+
+    async def get(self, key: str) -> Optional[Any]:
+        return None
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()) -> None:
+        pass
+
+    async def delete(self, key: str) -> None:
+        pass
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """
+    LRU с TTL в памяти процесса. Значения хранятся сериализованными,
+    чтобы вызывающий код не мог изменить закешированный объект.
+    При нескольких воркерах сброс по тегу действует только в своем процессе
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+
+    def _remove(self, key: str) -> None:
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, payload, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return json.loads(payload)
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()) -> None:
+        if key in self._entries:
+            self._remove(key)
+        tags = tuple(tags)
+        self._entries[key] = (time.monotonic() + ttl, json.dumps(value), tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    async def delete(self, key: str) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Кеш в отдельном файле SQLite (WAL), общий для воркеров одной машины:
+    сброс по тегу в одном процессе виден остальным
+    """
+
+    shared = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS cache_tags (
+            tag TEXT NOT NULL,
+            key TEXT NOT NULL,
+            PRIMARY KEY (tag, key)
+        );
+        CREATE INDEX IF NOT EXISTS ix_cache_tags_key ON cache_tags (key);
+    """
+    # Просроченные записи удаляются раз в столько операций записи
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = asyncio.Lock()
+        self._writes = 0
+
+    async def _connection(self):
+        if self._conn is None:
+            async with self._lock:
+                if self._conn is None:
+                    import aiosqlite
+
+                    conn = await aiosqlite.connect(self.path, isolation_level=None)
+                    await conn.execute("PRAGMA journal_mode=WAL")
+                    await conn.execute("PRAGMA synchronous=NORMAL")
+                    await conn.execute("PRAGMA busy_timeout=2000")
+                    await conn.executescript(self.SCHEMA)
+                    self._conn = conn
+        return self._conn
+
+    async def get(self, key: str) -> Optional[Any]:
+        conn = await self._connection()
+        async with conn.execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ) as cursor:
+            row = await cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = ()) -> None:
+        conn = await self._connection()
+        async with self._lock:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                await conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) "
+                    "VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time() + ttl),
+                )
+                await conn.execute("DELETE FROM cache_tags WHERE key = ?", (key,))
+                await conn.executemany(
+                    "INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)",
+                    [(tag, key) for tag in tags],
+                )
+                self._writes += 1
+                if self._writes % self.PURGE_EVERY == 0:
+                    await self._purge_expired(conn)
+                await conn.execute("COMMIT")
+            except BaseException:
+                await conn.execute("ROLLBACK")
+                raise
+
+    async def _purge_expired(self, conn) -> None:
+        await conn.execute(
+            "DELETE FROM cache_tags WHERE key IN "
+            "(SELECT key FROM cache_entries WHERE expires_at <= ?)",
+            (time.time(),),
+        )
+        await conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+
+    async def delete(self, key: str) -> None:
+        await self.invalidate_keys([key])
+
+    async def invalidate_keys(self, keys: List[str]) -> None:
+        conn = await self._connection()
+        placeholders = ", ".join("?" for _ in keys)
+        async with self._lock:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                await conn.execute(
+                    f"DELETE FROM cache_entries WHERE key IN ({placeholders})", keys
+                )
+                await conn.execute(
+                    f"DELETE FROM cache_tags WHERE key IN ({placeholders})", keys
+                )
+                await conn.execute("COMMIT")
+            except BaseException:
+                await conn.execute("ROLLBACK")
+                raise
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        tags = list(tags)
+        if not tags:
+            return
+        conn = await self._connection()
+        placeholders = ", ".join("?" for _ in tags)
+        async with self._lock:
+            await conn.execute("BEGIN IMMEDIATE")
+            try:
+                await conn.execute(
+                    "DELETE FROM cache_entries WHERE key IN "
+                    f"(SELECT key FROM cache_tags WHERE tag IN ({placeholders}))",
+                    tags,
+                )
+                await conn.execute(
+                    f"DELETE FROM cache_tags WHERE tag IN ({placeholders})", tags
+                )
+                await conn.execute("COMMIT")
+            except BaseException:
+                await conn.execute("ROLLBACK")
+                raise
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+
+def make_backend() -> CacheBackend:
+    if settings.CACHE_BACKEND == "memory":
+        return MemoryCache(settings.CACHE_MAX_ENTRIES)
+    if settings.CACHE_BACKEND == "sqlite":
+        return SQLiteCache(settings.CACHE_SQLITE_PATH)
+    return NullCache()
+
+
+backend = make_backend()
+
+
+def cached(
+    key: Callable[..., Optional[str]],
+    tags: Callable[..., Iterable[str]] = lambda **kwargs: (),
+    ttl: Optional[float] = None,
+    model: Any = None,
+    load: Optional[Callable[[Any], Any]] = None,
+    shared_only: bool = False,
+):
+    """
+    Кеширование результата асинхронного обработчика или зависимости FastAPI.
+    key и tags получают те же именованные аргументы, что и функция;
+    key может вернуть None, чтобы не кешировать вызов. model - тип
+    pydantic для сериализации результата (например, ORM-объектов),
+    load - восстановление нужного вызывающему объекта из кеша.
+    shared_only - кешировать только в общем для воркеров кеше, когда
+    устаревшее значение после сброса в другом процессе недопустимо.
+    Сигнатура функции сохраняется, поэтому зависимости разрешаются как обычно
+    """
+    adapter = TypeAdapter(model) if model is not None else None
+
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            if not backend.enabled or (shared_only and not backend.shared):
+                return await func(**kwargs)
+            cache_key = key(**kwargs)
+            if cache_key is None:
+                return await func(**kwargs)
+
+            try:
+                value = await backend.get(cache_key)
+            except Exception as e:
+                logger.warning(f"Кеш недоступен: {e}")
+                return await func(**kwargs)
+            if value is not None:
+                return load(value) if load else value
+
+            result = await func(**kwargs)
+            if result is None:
+                return result
+            if adapter is not None:
+                data = adapter.dump_python(
+                    adapter.validate_python(result, from_attributes=True), mode="json"
+                )
+            else:
+                data = result
+            try:
+                await backend.set(
+                    cache_key,
+                    data,
+                    ttl if ttl is not None else settings.CACHE_TTL_SECONDS,
+                    tags(**kwargs),
+                )
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить значение в кеш: {e}")
+            return result
+
+        return wrapper
+
+    return decorate
+
+
+async def invalidate(tenant: Optional[str], *tags: str) -> None:
+    """Сброс записей по тегам школы; ошибки кеша не прерывают запрос"""
+    try:
+        await backend.invalidate_tags([scoped(tenant, tag) for tag in tags])
+    except Exception as e:
+        logger.warning(f"Не удалось сбросить кеш {tags}: {e}")
@@ -0,0 +1,411 @@
+import argparse
+import asyncio
+import os
+
+from config import settings
+
+
+async def cmd_convert_ids(args: argparse.Namespace) -> int:
+    """Конвертация хранимых UUID между текстом и 16-байтовым форматом"""
+    from database import convert_id_storage, get_engine
+
+    binary = args.to == "binary"
+    if settings.COMPACT_IDS != binary:
+        print(
+            f"Warning: COMPACT_IDS={settings.COMPACT_IDS}; "
+            f"set COMPACT_IDS={binary} before starting the API on this database"
+        )
+    converted = await convert_id_storage(
+        binary=binary, target_engine=get_engine(args.tenant)
+    )
+    print(f"Done: {converted} values converted to {args.to}")
+    return 0
+
+
+async def cmd_migrate(args: argparse.Namespace) -> int:
+    """Применение, просмотр и проверка миграций схемы"""
+    import migrations
+    import models
+    from database import create_tables, get_engine
+
+    engine = get_engine(args.tenant)
+    if args.action == "apply":
+        await create_tables(engine)
+        return 0
+
+    async with engine.begin() as conn:
+        if args.action == "list":
+            for row in await conn.run_sync(migrations.list_migrations):
+                state = row["applied_at"] or "pending"
+                print(f"{row['version']:>4}  {row['name']:<50} {state}")
+            return 0
+
+        if args.action == "verify":
+            problems = await conn.run_sync(migrations.verify)
+            for problem in problems:
+                print(f"FAIL {problem}")
+            if not problems:
+                print("OK schema matches models and all migrations are applied")
+            return 1 if problems else 0
+
+        # БД в памяти живет одно соединение: схема создается в нем же
+        if engine.url.database in (None, "", ":memory:"):
+            await conn.run_sync(models.Base.metadata.create_all)
+            await conn.run_sync(migrations.apply_pending)
+        if not await conn.run_sync(migrations.has_schema):
+            print("FAIL database has no tables, run: python cli.py migrate apply")
+            return 1
+        report = await conn.run_sync(migrations.check_indexes)
+        for name, plan in report.plans.items():
+            print(name)
+            for line in plan:
+                print(f"    {line}")
+        for name, scans in report.full_scans.items():
+            print(f"FULL SCAN {name}: {'; '.join(scans)}")
+        for name in report.temp_sorts:
+            print(f"TEMP SORT {name}")
+        for name in report.missing_indexes:
+            print(f"MISSING INDEX {name}")
+        for name in report.unused_indexes:
+            print(f"UNUSED INDEX {name}")
+        return 1 if report.full_scans or report.temp_sorts or report.missing_indexes else 0
+
+
+async def cmd_archive(args: argparse.Namespace) -> int:
+    """Перенос старых благодарностей в архивные таблицы полугодий"""
+    from archive import archive_old_praises
+
+    totals = await archive_old_praises(
+        older_than_days=args.older_than_days,
+        batch_size=args.batch_size,
+        tenant=args.tenant,
+    )
+    for term, count in sorted(totals.items()):
+        print(f"{term}: archived {count} praises")
+    print(f"Done: {sum(totals.values())} praises archived")
+    return 0
+
+
+async def cmd_spam_rescan(args: argparse.Namespace) -> int:
+    """Повторная проверка сохраненных благодарностей на волны спама"""
+    from spam import rescan
+
+    totals = await rescan(
+        since_days=args.since_days, batch_size=args.batch_size, tenant=args.tenant
+    )
+    print(
+        f"Scanned {totals['scanned']} praises: "
+        f"{totals['fingerprinted']} fingerprinted, {totals['flagged']} flagged"
+    )
+    return 0
+
+
+async def cmd_rollups(args: argparse.Namespace) -> int:
+    """Пересчет сводной таблицы аналитики по сохраненным благодарностям"""
+    from rollups import backfill
+
+    totals = await backfill(since_days=args.since_days, tenant=args.tenant)
+    for period, count in totals.items():
+        print(f"{period}: {count} buckets rebuilt")
+    return 0
+
+
+async def cmd_jobs(args: argparse.Namespace) -> int:
+    """Выполнение фоновых задач отдельным процессом или состояние очереди"""
+    import jobs
+
+    if args.action == "status":
+        stats = await jobs.queue.stats()
+        for status, count in sorted(stats["counts"].items()):
+            print(f"{status}: {count}")
+        for job in stats["failed"]:
+            print(f"FAILED #{job['id']} {job['kind']} ({job['tenant']}): {job['last_error']}")
+        await jobs.queue.close()
+        return 0
+
+    if not settings.TENANCY_ENABLED or args.tenant:
+        await jobs.schedule_recurring(args.tenant)
+    await jobs.runner.start()
+    try:
+        # До Ctrl+C; выполняемые задачи дорабатывают JOBS_DRAIN_SECONDS
+        await asyncio.Event().wait()
+    finally:
+        await jobs.runner.stop(settings.JOBS_DRAIN_SECONDS)
+        await jobs.queue.close()
+    return 0
+
+
+async def cmd_calibrate_hash(args: argparse.Namespace) -> int:
+    """Подбор параметров argon2 под целевое время проверки пароля"""
+    from auth import calibrate_argon2
+
+    parallelism = args.parallelism or min(os.cpu_count() or 1, 4)
+    params, elapsed = await asyncio.to_thread(
+        calibrate_argon2, args.target_ms, args.memory_kib, parallelism
+    )
+    print(f"Verify takes {elapsed:.0f} ms (target {args.target_ms:.0f} ms). Settings:")
+    for name, value in params.items():
+        print(f"{name}={value}")
+    return 0
+
+
+async def cmd_seed(args: argparse.Namespace) -> int:
+    """Однократное создание таблиц и заполнение преподавателями из файла состава"""
+    from database import create_tables, get_engine
+    from seed import seed_database
+
+    await create_tables(get_engine(args.tenant))
+    await seed_database(args.tenant)
+    return 0
+
+
+async def cmd_create_tenant(args: argparse.Namespace) -> int:
+    """Заведение школы: файл БД, таблицы и миграции. По HTTP школы не создаются"""
+    from database import TENANT_NAME_PATTERN, create_tables, get_engine, tenant_exists
+
+    tenant = args.name.strip().lower()
+    if not TENANT_NAME_PATTERN.match(tenant):
+        print(f"Invalid tenant name: {args.name}")
+        return 1
+    if tenant_exists(tenant):
+        print(f"Tenant {tenant} already exists")
+        return 1
+    await create_tables(get_engine(tenant))
+    if args.seed:
+        from seed import seed_database
+
+        await seed_database(tenant)
+    print(f"Created tenant {tenant}")
+    return 0
+
+
+async def cmd_build_roster(args: argparse.Namespace) -> int:
+    """Сборка файла состава: пароли хешируются здесь, а не при запуске сервера"""
+    from roster import build_roster
+
+    count = await asyncio.to_thread(build_roster, args.source, args.output, args.workers)
+    print(f"Wrote {count} accounts to {args.output}")
+    return 0
+
+
+async def cmd_purge_idempotency_keys(args: argparse.Namespace) -> int:
+    """Удаление просроченных ключей идемпотентности из таблицы"""
+    from idempotency import purge_expired
+
+    removed = await purge_expired(args.tenant)
+    print(f"Removed {removed} expired idempotency keys")
+    return 0
+
+
+async def cmd_purge_deleted_teachers(args: argparse.Namespace) -> int:
+    """Окончательное удаление мягко удаленных преподавателей"""
+    from purge import purge_deleted_teachers
+
+    totals = await purge_deleted_teachers(batch_size=args.batch_size, tenant=args.tenant)
+    print(f"Purged {len(totals)} teachers, {sum(totals.values())} praises")
+    return 0
+
+
+async def cmd_import(args: argparse.Namespace) -> int:
+    """Потоковый импорт преподавателей или благодарностей из CSV/NDJSON"""
+    import bulk
+
+    options = {"resume": not args.restart, "tenant": args.tenant}
+    if args.batch_size:
+        options["batch_size"] = args.batch_size
+    if args.commit_every:
+        options["commit_every"] = args.commit_every
+    if args.kind == "teachers":
+        count = await bulk.import_teachers(args.path, workers=args.workers, **options)
+    else:
+        from rollups import backfill
+
+        count = await bulk.import_praises(args.path, **options)
+        # Импорт пишет мимо обработчиков, сводную таблицу пересчитываем целиком
+        await backfill(tenant=args.tenant)
+    print(f"Done: {count} {args.kind} records processed")
+    return 0
+
+
+async def cmd_export(args: argparse.Namespace) -> int:
+    """Потоковая выгрузка преподавателей или благодарностей в CSV/NDJSON"""
+    import bulk
+
+    if args.kind == "teachers":
+        count = await bulk.export_teachers(args.path, tenant=args.tenant)
+    else:
+        count = await bulk.export_praises(args.path, tenant=args.tenant)
+    print(f"Done: {count} {args.kind} exported to {args.path}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="School Praise API management commands")
+    parser.add_argument(
+        "--tenant",
+        default=None,
+        help="school database to operate on (TENANT_DATABASE_URL); "
+        "default: DATABASE_URL",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert_ids = subparsers.add_parser(
+        "convert-ids", help="convert stored UUIDs between text and binary"
+    )
+    convert_ids.add_argument("--to", choices=["binary", "text"], required=True)
+    convert_ids.set_defaults(func=cmd_convert_ids)
+
+    migrate = subparsers.add_parser("migrate", help="manage schema migrations")
+    migrate.add_argument(
+        "action",
+        choices=["apply", "list", "verify", "check-indexes"],
+        help="apply pending migrations, list them, verify the schema "
+        "or check indexes against handler query plans",
+    )
+    migrate.set_defaults(func=cmd_migrate)
+
+    archive = subparsers.add_parser(
+        "archive", help="move old praises into per-term archive tables"
+    )
+    archive.add_argument(
+        "--older-than-days",
+        type=int,
+        default=None,
+        help=f"default: ARCHIVE_AFTER_DAYS ({settings.ARCHIVE_AFTER_DAYS})",
+    )
+    archive.add_argument("--batch-size", type=int, default=None)
+    archive.set_defaults(func=cmd_archive)
+
+    spam_rescan = subparsers.add_parser(
+        "spam-rescan", help="re-check stored praises for near-duplicate spam waves"
+    )
+    spam_rescan.add_argument(
+        "--since-days", type=int, default=None, help="default: all praises"
+    )
+    spam_rescan.add_argument("--batch-size", type=int, default=1000)
+    spam_rescan.set_defaults(func=cmd_spam_rescan)
+
+    rollups = subparsers.add_parser(
+        "rollups", help="rebuild hourly/daily praise rollups for /admin/analytics"
+    )
+    rollups.add_argument("action", choices=["backfill"])
+    rollups.add_argument(
+        "--since-days", type=int, default=None, help="default: rebuild everything"
+    )
+    rollups.set_defaults(func=cmd_rollups)
+
+    jobs = subparsers.add_parser(
+        "jobs", help="run background jobs in this process or show the queue"
+    )
+    jobs.add_argument("action", choices=["work", "status"])
+    jobs.set_defaults(func=cmd_jobs)
+
+    calibrate = subparsers.add_parser(
+        "calibrate-hash", help="pick argon2 parameters for a target verify time"
+    )
+    calibrate.add_argument("--target-ms", type=float, default=250.0)
+    calibrate.add_argument(
+        "--memory-kib",
+        type=int,
+        default=settings.ARGON2_MEMORY_COST,
+        help="starting memory cost (default: ARGON2_MEMORY_COST)",
+    )
+    calibrate.add_argument(
+        "--parallelism", type=int, default=None, help="default: CPU count, up to 4"
+    )
+    calibrate.set_defaults(func=cmd_calibrate_hash)
+
+    seed = subparsers.add_parser(
+        "seed", help="create tables and seed teachers/admins from ROSTER_PATH"
+    )
+    seed.set_defaults(func=cmd_seed)
+
+    create_tenant = subparsers.add_parser(
+        "create-tenant", help="provision a new school database (TENANT_DATABASE_URL)"
+    )
+    create_tenant.add_argument("name")
+    create_tenant.add_argument(
+        "--seed", action="store_true", help="also create accounts from ROSTER_PATH"
+    )
+    create_tenant.set_defaults(func=cmd_create_tenant)
+
+    build_roster = subparsers.add_parser(
+        "build-roster",
+        help="hash passwords from a .json/.csv/.ndjson roster into a ROSTER_PATH file",
+    )
+    build_roster.add_argument(
+        "source", help='{"admins": [...], "teachers": [...]} .json or .csv/.ndjson with role'
+    )
+    build_roster.add_argument(
+        "output", nargs="?", default=settings.ROSTER_PATH, help="default: ROSTER_PATH"
+    )
+    build_roster.add_argument(
+        "--workers", type=int, default=None, help="password hashing threads"
+    )
+    build_roster.set_defaults(func=cmd_build_roster)
+
+    purge_keys = subparsers.add_parser(
+        "purge-idempotency-keys",
+        help="delete expired Idempotency-Key responses (IDEMPOTENCY_PERSIST)",
+    )
+    purge_keys.set_defaults(func=cmd_purge_idempotency_keys)
+
+    purge_teachers = subparsers.add_parser(
+        "purge-deleted-teachers",
+        help="finish removing soft-deleted teachers and their praises",
+    )
+    purge_teachers.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help=f"default: PURGE_BATCH_SIZE ({settings.PURGE_BATCH_SIZE})",
+    )
+    purge_teachers.set_defaults(func=cmd_purge_deleted_teachers)
+
+    import_ = subparsers.add_parser(
+        "import", help="stream teachers or praises from a .csv/.ndjson file"
+    )
+    import_.add_argument("kind", choices=["teachers", "praises"])
+    import_.add_argument("path")
+    import_.add_argument("--batch-size", type=int, default=None)
+    import_.add_argument(
+        "--commit-every", type=int, default=None, help="records per transaction"
+    )
+    import_.add_argument(
+        "--workers", type=int, default=None, help="password hashing threads"
+    )
+    import_.add_argument(
+        "--restart",
+        action="store_true",
+        help="ignore the <path>.progress checkpoint and start from the beginning",
+    )
+    import_.set_defaults(func=cmd_import)
+
+    export = subparsers.add_parser(
+        "export", help="stream teachers or praises to a .csv/.ndjson file"
+    )
+    export.add_argument("kind", choices=["teachers", "praises"])
+    export.add_argument("path")
+    export.set_defaults(func=cmd_export)
+
+    return parser
+
+
+async def _run(args: argparse.Namespace) -> int:
+    import jobs
+
+    try:
+        return await args.func(args)
+    finally:
+        # Первое обращение к БД школы ставит ее регулярные задачи в очередь;
+        # открытое соединение очереди не дало бы процессу завершиться
+        await jobs.queue.close()
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
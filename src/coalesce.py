@@ -0,0 +1,115 @@
+import asyncio
+import functools
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from config import settings
+from database import get_sessionmaker
+
+
+@dataclass
+class KeyStats:
+    """Счетчики одного ключа: выполнения, присоединившиеся запросы, ошибки"""
+
+    executions: int = 0
+    shared: int = 0
+    errors: int = 0
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных вызовов: первый запрос по ключу
+    выполняет работу, остальные ждут его результата. Результат не
+    сохраняется после завершения - это не кеш
+    """
+
+    def __init__(self, max_tracked_keys: int):
+        self.max_tracked_keys = max_tracked_keys
+        self._calls: Dict[str, "asyncio.Task"] = {}
+        self._stats: "OrderedDict[str, KeyStats]" = OrderedDict()
+
+    def _stats_for(self, key: str) -> KeyStats:
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = KeyStats()
+            while len(self._stats) > self.max_tracked_keys:
+                self._stats.popitem(last=False)
+        self._stats.move_to_end(key)
+        return stats
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        stats = self._stats_for(key)
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(functools.partial(self._finish, key, stats))
+            stats.executions += 1
+        else:
+            stats.shared += 1
+        # Отмена одного ожидающего (клиент отключился) не отменяет
+        # общий вызов для остальных
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, stats: KeyStats, task: "asyncio.Task") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if task.cancelled() or task.exception() is not None:
+            stats.errors += 1
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def top(self, limit: int = 20) -> List[dict]:
+        """Ключи с наибольшим числом объединенных запросов"""
+        ranked = sorted(self._stats.items(), key=lambda item: item[1].shared, reverse=True)
+        return [{"key": key, **asdict(stats)} for key, stats in ranked[:limit]]
+
+
+flights = SingleFlight(max_tracked_keys=settings.COALESCE_TRACKED_KEYS)
+
+
+def request_key(request: Request, **_) -> str:
+    """Ключ по школе, пути и отсортированным параметрам запроса"""
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    key = f"{request.url.path}?{query}"
+    tenant = request.state.tenant
+    return f"{tenant}:{key}" if tenant else key
+
+
+def single_flight(model: Any, key: Callable[..., str] = request_key):
+    """
+    Объединение одинаковых одновременных запросов к обработчику FastAPI.
+    Результат сериализуется по model один раз и отдается всем ожидающим
+    готовым JSON. Обработчик должен принимать request: Request, а все
+    его аргументы, влияющие на результат, должны входить в key: общий
+    вызов получает аргументы первого запроса. Сессия БД не берется у
+    первого запроса - его отмена закрыла бы ее под остальными
+    ожидающими, - общий вызов открывает собственную, только для чтения
+    """
+    adapter = TypeAdapter(model)
+
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            async def run() -> bytes:
+                if "db" not in kwargs:
+                    result = await func(**kwargs)
+                else:
+                    sessionmaker = await get_sessionmaker(kwargs["request"].state.tenant)
+                    async with sessionmaker() as db:
+                        result = await func(**{**kwargs, "db": db})
+                return adapter.dump_json(
+                    adapter.validate_python(result, from_attributes=True)
+                )
+
+            body = await flights.do(key(**kwargs), run)
+            return Response(content=body, media_type="application/json")
+
+        return wrapper
+
+    return decorate
@@ -1,5 +1,5 @@
 import logging
-from typing import List
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -7,11 +7,41 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str
+    # Хранить UUID как 16 байт вместо текста (см. python cli.py convert-ids)
+    COMPACT_IDS: bool = False
+    # Версия UUID для новых записей: 4 (случайные) или 7 (упорядоченные по времени)
+    UUID_VERSION: int = 4
+
+    # Multi-tenancy: одна школа - один файл БД; новые школы заводятся
+    # только командой python cli.py create-tenant
+    TENANCY_ENABLED: bool = False
+    TENANT_DATABASE_URL: str = "sqlite+aiosqlite:///./tenants/{tenant}.db"
+    TENANT_HEADER: str = "X-Tenant"
+    # Суффикс хоста для определения школы по поддомену, например ".praise.example.ru"
+    TENANT_HOST_SUFFIX: Optional[str] = None
+    TENANT_ENGINE_CACHE_SIZE: int = 256
 
     # Security
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Refresh-токен продлевает сессию без ввода пароля; одноразовый,
+    # при каждом обновлении выдается новый
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    # Параметры argon2 для новых хешей; подобрать под сервер:
+    # python cli.py calibrate-hash. Старые хеши обновляются при входе
+    ARGON2_MEMORY_COST: int = 10240
+    ARGON2_TIME_COST: int = 6
+    ARGON2_PARALLELISM: int = 2
+    # Не больше стольких проверок пароля одновременно; ожидающие дольше
+    # LOGIN_QUEUE_TIMEOUT_SECONDS получают 503
+    LOGIN_MAX_CONCURRENT_VERIFIES: int = 4
+    LOGIN_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    # Блокировка логина после LOGIN_MAX_FAILURES ошибок за окно
+    LOGIN_MAX_FAILURES: int = 5
+    LOGIN_FAILURE_WINDOW_SECONDS: float = 900.0
+    LOGIN_LOCKOUT_SECONDS: float = 300.0
+    LOGIN_TRACKED_USERNAMES: int = 10000
 
     # CORS
     ALLOWED_ORIGIN: str
@@ -20,320 +50,104 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     RELOAD: bool = True
+    # Создавать преподавателей из файла состава ROSTER_PATH при запуске;
+    # при False заполнение выполняется отдельно: python cli.py seed
+    SEED_ON_STARTUP: bool = True
+
+    # Archive
+    # Сообщения старше этого возраста переносятся в архивные таблицы полугодий
+    ARCHIVE_AFTER_DAYS: int = 365
+    ARCHIVE_BATCH_SIZE: int = 1000
+
+    # Soft delete: благодарности удаленного преподавателя стираются
+    # порциями по столько строк, каждая - отдельной транзакцией
+    PURGE_BATCH_SIZE: int = 500
+
+    # Health checks
+    HEALTH_CACHE_SECONDS: float = 2.0
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = 1.0
+    HEALTH_DEGRADED_LATENCY_MS: float = 250.0
+    HEALTH_MAX_WRITER_QUEUE: int = 20
+
+    # Cache
+    # none, memory (в процессе) или sqlite (общий файл для воркеров одной машины)
+    CACHE_BACKEND: Literal["none", "memory", "sqlite"] = "memory"
+    CACHE_TTL_SECONDS: float = 30.0
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_SQLITE_PATH: str = "./cache.db"
+
+    # Объединение одинаковых одновременных чтений: число ключей со статистикой
+    COALESCE_TRACKED_KEYS: int = 1000
+
+    # Idempotency-Key для POST /praise
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_CACHE_SIZE: int = 10000
+    # Сохранять ответы в таблицу idempotency_keys: повторы распознаются
+    # после перезапуска и между воркерами
+    IDEMPOTENCY_PERSIST: bool = False
+
+    # Spam: волны похожих сообщений за скользящее окно
+    SPAM_WINDOW_SECONDS: float = 600.0
+    # Сообщение - спам, если похожих за окно уже было не меньше
+    SPAM_DUPLICATE_LIMIT: int = 3
+    # Максимальное расстояние Хэмминга между simhash похожих текстов (0-3)
+    SPAM_SIMHASH_DISTANCE: int = 3
+    # Более короткие тексты («Спасибо!») не проверяются
+    SPAM_MIN_LENGTH: int = 20
+    SPAM_WINDOW_MAX_ENTRIES: int = 10000
+    # flag - сохранить с is_flagged для модерации, reject - отклонить
+    SPAM_ACTION: Literal["flag", "reject"] = "flag"
+
+    # Server-sent events
+    SSE_BUFFER_SIZE: int = 100
+    SSE_HEARTBEAT_SECONDS: float = 15.0
+
+    # Background jobs: очередь в отдельном файле SQLite (WAL), общая
+    # для воркеров одной машины; задачи переживают перезапуск
+    JOBS_ENABLED: bool = True
+    JOBS_SQLITE_PATH: str = "./jobs.db"
+    # Одновременно выполняемых задач в одном воркере
+    JOBS_CONCURRENCY: int = 2
+    JOBS_POLL_SECONDS: float = 5.0
+    # Повторы с экспоненциальной задержкой: base * 2^(попытка-1), не больше max
+    JOBS_MAX_ATTEMPTS: int = 5
+    JOBS_RETRY_BASE_SECONDS: float = 5.0
+    JOBS_RETRY_MAX_SECONDS: float = 600.0
+    # Аренда выполняемой задачи; воркер продлевает ее каждую треть срока,
+    # а задача упавшего воркера выполняется заново после истечения
+    JOBS_LEASE_SECONDS: float = 600.0
+    # Сколько ждать выполняемые задачи при остановке
+    JOBS_DRAIN_SECONDS: float = 10.0
+    JOBS_KEEP_FINISHED_SECONDS: float = 7 * 86400
+    # Периодическое обслуживание: очистка просроченных токенов и ключей,
+    # удаленных преподавателей, сверка сводных таблиц за последние сутки
+    MAINTENANCE_INTERVAL_SECONDS: float = 3600.0
+
+    # Query profiling: счетчики и гистограмма времени по нормализованным
+    # SQL-запросам (GET /admin/queries)
+    QUERY_STATS_ENABLED: bool = True
+    QUERY_STATS_MAX_STATEMENTS: int = 500
+    # Запросы дольше порога пишутся в журнал медленных запросов
+    # вместе с EXPLAIN QUERY PLAN (один раз на запрос)
+    SLOW_QUERY_MS: float = 100.0
+    SLOW_QUERY_LOG_SIZE: int = 100
 
-    # Admin
-    ADMINS_DATA: List = [
-        {
-            "username": "Eliseeva",
-            "full_name": "Елисеева Надежда Павловна",
-            "subject": "Директор школы",
-            "password": "Eli_2b85v6"
-        },
-        {
-            "username": "Bolonenko",
-            "full_name": "Болоненко Анастасия Владимировна",
-            "subject": "Заместитель директора по УВР",
-            "password": "Bol_*&^b1"
-        },
-        {
-            "username": "Linkova",
-            "full_name": "Линькова Людмила Александровна",
-            "subject": "Заместитель директора по УВР",
-            "password": "Lin_(g21)#"
-        },
-        {
-            "username": "Karelina",
-            "full_name": "Карелина Наталья Александровна",
-            "subject": "Учитель математики, информатики",
-            "password": "Kar_TuP5ul",
-        },
-    ]
+    # Profiling (только для администратора, выключено по умолчанию):
+    # выборочный профилировщик стеков GET /admin/profile
+    PROFILING_ENABLED: bool = False
+    PROFILE_MAX_SECONDS: float = 30.0
+    PROFILE_DEFAULT_INTERVAL_MS: float = 5.0
+    # Монитор задержки цикла событий: если цикл не отвечает дольше
+    # порога, в лог пишется стек, на котором он занят
+    LOOP_LAG_MONITOR_ENABLED: bool = False
+    LOOP_LAG_THRESHOLD_MS: float = 100.0
+    LOOP_LAG_CHECK_MS: float = 20.0
+    LOOP_LAG_HISTORY_SIZE: int = 50
 
-    # Teachers
-    TEACHERS_DATA: List = [
-        {
-            "username": "Antipova",
-            "full_name": "Антипова Елена Анатольевна",
-            "subject": "Учитель математики",
-            "password": "Ant_rvpG8O",
-        },
-        {
-            "username": "Astarkina",
-            "full_name": "Астаркина Марина Вячеславовна",
-            "subject": "Социальный педагог/учитель истории и права",
-            "password": "Ast_b$Kv*Y",
-        },
-        {
-            "username": "Belyaeva",
-            "full_name": "Беляева Ольга Михайловна",
-            "subject": "Учитель физической культуры",
-            "password": "Bel_&8pcn0",
-        },
-        {
-            "username": "Bobileva",
-            "full_name": "Бобылева Светлана Валерьевна",
-            "subject": "Учитель начальных классов",
-            "password": "Bob_9E@WR8",
-        },
-        {
-            "username": "Bordacheva",
-            "full_name": "Бордачева Ирина Николаевна",
-            "subject": "Учитель начальных классов",
-            "password": "Bor_ELzALT",
-        },
-        {
-            "username": "Vilgelm",
-            "full_name": "Вильгельм Елена Геннадьевна",
-            "subject": "Учитель химии",
-            "password": "Vil_2G8Sr4",
-        },
-        {
-            "username": "Vinyukova",
-            "full_name": "Винюкова Анна Николаевна",
-            "subject": "Учитель начальных классов",
-            "password": "Vin_%0Zejm",
-        },
-        {
-            "username": "Goncharova",
-            "full_name": "Гончарова Ирина Владимировна",
-            "subject": "Учитель начальных классов",
-            "password": "Gon_AV2?ei",
-        },
-        {
-            "username": "Gordeev",
-            "full_name": "Гордеев Дмитрий Александрович",
-            "subject": "Учитель физики",
-            "password": "Gor_zM40de",
-        },
-        {
-            "username": "Grishenko",
-            "full_name": "Гришенко Галина Вячеславовна",
-            "subject": "Учитель начальных классов",
-            "password": "Gri_ZxsQoN",
-        },
-        {
-            "username": "Egorushkina",
-            "full_name": "Егорушкина Татьяна Григорьевна",
-            "subject": "Учитель начальных классов",
-            "password": "Ego_n7EAFx",
-        },
-        {
-            "username": "Zhelacskaya",
-            "full_name": "Желавская Светлана  Александровна",
-            "subject": "Учитель начальных классов",
-            "password": "Zhe_#yDGgi",
-        },
-        {
-            "username": "Zhigunkova",
-            "full_name": "Жигункова Нина Геннадьевна",
-            "subject": "Учитель английского языка",
-            "password": "Zhi_HJBkqR",
-        },
-        {
-            "username": "Ivanova",
-            "full_name": "Иванова Галина Анатольевна",
-            "subject": "Учитель истории, обществознания",
-            "password": "Iva_Hsrt^M",
-        },
-        {
-            "username": "Koldashova",
-            "full_name": "Колдашова Елена Николаевна",
-            "subject": "Учитель русского языка и литературы",
-            "password": "Kol_258T0E",
-        },
-        {
-            "username": "Kolina",
-            "full_name": "Колина Тамара Николаевна",
-            "subject": "Учитель начальных классов",
-            "password": "Kol_PTC@yt",
-        },
-        {
-            "username": "Kondrushina",
-            "full_name": "Кондрушина Алла Викторовна",
-            "subject": "Учитель начальных классов",
-            "password": "Kon_lqt!wS",
-        },
-        {
-            "username": "Korshunova",
-            "full_name": "Коршунова Ольга Викторовна",
-            "subject": "Учитель английского языка",
-            "password": "Kor_wr@4U2",
-        },
-        {
-            "username": "Kostina",
-            "full_name": "Костина Наталья Александровна",
-            "subject": "Учитель математики",
-            "password": "Kos_oIPsT4",
-        },
-        {
-            "username": "Kryuchokva",
-            "full_name": "Крючкова Елена Викторовна",
-            "subject": "Учитель начальных классов",
-            "password": "Kry_G*$J5@",
-        },
-        {
-            "username": "Kuznetsova",
-            "full_name": "Кузнецова Марина Викторовна",
-            "subject": "Учитель начальных классов",
-            "password": "Kuz_*yqgL2",
-        },
-        {
-            "username": "Kotkova",
-            "full_name": "Коткова Виктория Викторовна",
-            "subject": "Учитель русского языка и литературы",
-            "password": "Kot_FdT8^L",
-        },
-        {
-            "username": "Kuptsova",
-            "full_name": "Купцова Ольга Николаевна",
-            "subject": "Учитель начальных классов",
-            "password": "Kup_%41^DD",
-        },
-        {
-            "username": "Kagutina",
-            "full_name": "Лагутина Наталия Михайловна",
-            "subject": "Учитель английского языка",
-            "password": "Kag_yqk8z%",
-        },
-        {
-            "username": "Liseva",
-            "full_name": "Лисева Галина Викторовна",
-            "subject": "Учитель начальных классов",
-            "password": "Lis_7eYeDD",
-        },
-        {
-            "username": "Loresh",
-            "full_name": "Лореш Екатерина Михайловна",
-            "subject": "Заместитель директора по ВР",
-            "password": "Lor_ayw232",
-        },
-        {
-            "username": "Matyushkina",
-            "full_name": "Матюшкина Ольга Вячеславовна",
-            "subject": "Учитель, руководитель хорового коллектива",
-            "password": "Mat_%TkYfJ",
-        },
-        {
-            "username": "Mihailova",
-            "full_name": "Михайлова Юлия Игоревна",
-            "subject": "Воспитатель",
-            "password": "Mih_Z32!G@",
-        },
-        {
-            "username": "Misina",
-            "full_name": "Мысина Олеся Васильевна",
-            "subject": "Учитель истории, обществознания",
-            "password": "Mis_deJjvN",
-        },
-        {
-            "username": "Nazarova",
-            "full_name": "Назарова Оксана Александровна",
-            "subject": "Учитель информатики",
-            "password": "Naz_C@46pR",
-        },
-        {
-            "username": "Seliverstova",
-            "full_name": "Селиверстова Светлана Михайловна",
-            "subject": "Учитель физической культуры",
-            "password": "Sel_hRKzMC",
-        },
-        {
-            "username": "Soroka",
-            "full_name": "Сорока Юрий Григорьевич",
-            "subject": "Преподаватель-организатор ОБЗР",
-            "password": "Sor_tXsMq@",
-        },
-        {
-            "username": "Stenina",
-            "full_name": "Стенина Любовь Владимировна",
-            "subject": "Учитель начальных классов",
-            "password": "Ste_NG46Vo",
-        },
-        {
-            "username": "Strochkova",
-            "full_name": "Строчкова Людмила Викторовна",
-            "subject": "Учитель математики, физики",
-            "password": "Str_99Th9c",
-        },
-        {
-            "username": "Suslova",
-            "full_name": "Суслова Оксана Вячеславовна",
-            "subject": "Учитель русского языка и литературы",
-            "password": "Sus_4QX&X@",
-        },
-        {
-            "username": "Komarov",
-            "full_name": "Комарова Оксана Сергеевна",
-            "subject": "Учитель технологии",
-            "password": "Kom_QbMH6b",
-        },
-        {
-            "username": "Titova",
-            "full_name": "Титова Ольга Сергеевна",
-            "subject": "Педагог дополнительного образования",
-            "password": "Tit_JkAULh",
-        },
-        {
-            "username": "Fadeeva",
-            "full_name": "Фадеева Александра Вячеславовна",
-            "subject": "Учитель английского языка",
-            "password": "Fad_#0Wz3s",
-        },
-        {
-            "username": "Fetisova",
-            "full_name": "Фетисова Елена Ивановна",
-            "subject": "Учитель биологии",
-            "password": "Fet_#NcxEx",
-        },
-        {
-            "username": "Filatov",
-            "full_name": "Филатов  Александр Владимирович",
-            "subject": "Учитель технологии",
-            "password": "Fil_zI#wjP",
-        },
-        {
-            "username": "Chernechkova",
-            "full_name": "Чернечкова Наталья Валерьевна",
-            "subject": "Учитель математики",
-            "password": "Che_Hk*VIK",
-        },
-        {
-            "username": "Chestnih",
-            "full_name": "Честных Евгения Ивановна",
-            "subject": "Учитель русского языка и литературы",
-            "password": "Che_Gc!2j*",
-        },
-        {
-            "username": "Yarotskaya",
-            "full_name": "Яроцкая Татьяна Викторовна",
-            "subject": "Учитель математики",
-            "password": "Yar_Uq1%nr",
-        },
-        {
-            "username": "Vyushina",
-            "full_name": "Вьюшина Наталья Александровна",
-            "subject": "Учитель иностранного языка",
-            "password": "Vyu_kNshRp",
-        },
-        {
-            "username": "Buyankina",
-            "full_name": "Буянкина Надежда Валерьевна",
-            "subject": "Советник по воспитанию",
-            "password": "Buy_wT8@Mw",
-        },
-        {
-            "username": "Kotina",
-            "full_name": "Котина Марина Владимировна",
-            "subject": "Учитель ИЗО",
-            "password": "Kot_rYB07K",
-        },
-        {
-            "username": "Zhuravleva",
-            "full_name": "Журавлева Виктория Вячеславовна",
-            "subject": "Учитель русского языка и литературы",
-            "password": "Zhu_32KbUY",
-        },
-    ]
+    # Roster
+    # Файл состава с готовыми хешами паролей (python cli.py build-roster);
+    # читается только при заполнении БД, пароли в настройках не хранятся
+    ROSTER_PATH: str = "./data/roster.json"
 
     model_config = SettingsConfigDict(
         env_file=".env", case_sensitive=True, env_file_encoding="utf-8"
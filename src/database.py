@@ -1,51 +1,305 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+import asyncio
+import os
+import re
+import uuid
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy import event, func, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session
 from sqlalchemy.pool import NullPool
-from config import settings
-from typing import AsyncGenerator
+from config import logger, settings
+from datetime import datetime, timezone
+from typing import AsyncGenerator, Optional
 from contextlib import asynccontextmanager
-from models import Base
-
-# Создаем асинхронный движок
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=False,
-    poolclass=NullPool,
-    connect_args=(
-        {"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-    ),
-)
+import jobs
+import migrations
+from models import GUID, Base
+
+
+def make_engine(url: str) -> AsyncEngine:
+    """Асинхронный движок с общими для всех БД настройками"""
+    return create_async_engine(
+        url,
+        echo=False,
+        poolclass=NullPool,
+        connect_args=({"check_same_thread": False} if "sqlite" in url else {}),
+    )
+
+
+def make_sessionmaker(bind: AsyncEngine) -> async_sessionmaker:
+    """Фабрика асинхронных сессий для движка"""
+    return async_sessionmaker(
+        bind,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False,
+    )
+
+
+# Основной движок и фабрика сессий создаются при первом обращении,
+# чтобы импорт модуля не открывал БД
+_engine: Optional[AsyncEngine] = None
+_sessionmaker: Optional[async_sessionmaker] = None
+
+
+def _default_engine() -> AsyncEngine:
+    global _engine
+    if _engine is None:
+        _engine = make_engine(settings.DATABASE_URL)
+    return _engine
+
+
+def _default_sessionmaker() -> async_sessionmaker:
+    global _sessionmaker
+    if _sessionmaker is None:
+        _sessionmaker = make_sessionmaker(_default_engine())
+    return _sessionmaker
+
+
+def __getattr__(name: str):
+    # Совместимость с прежними атрибутами модуля
+    if name == "engine":
+        return _default_engine()
+    if name == "AsyncSessionLocal":
+        return _default_sessionmaker()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Мультиарендность: у каждой школы свой файл БД
+TENANT_NAME_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+
+class TenantDatabase:
+    """Движок, фабрика сессий и состояние схемы одной школы"""
+
+    def __init__(self, tenant: str):
+        self.tenant = tenant
+        self.url = settings.TENANT_DATABASE_URL.format(tenant=tenant)
+        _ensure_sqlite_directory(self.url)
+        self.engine = make_engine(self.url)
+        self.sessionmaker = make_sessionmaker(self.engine)
+        self.schema_ready = False
+        self.schema_lock = asyncio.Lock()
+
+    async def ensure_schema(self) -> None:
+        """Создание таблиц и миграции при первом обращении к школе"""
+        if self.schema_ready:
+            return
+        async with self.schema_lock:
+            if not self.schema_ready:
+                await create_tables(self.engine)
+                await jobs.schedule_recurring(self.tenant)
+                self.schema_ready = True
+
+
+class EngineRegistry:
+    """
+    Лениво заполняемый LRU-реестр БД школ. Ограничение размера держит
+    число открытых движков постоянным при сотнях школ в одном процессе
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._databases: "OrderedDict[str, TenantDatabase]" = OrderedDict()
+
+    def get(self, tenant: str) -> TenantDatabase:
+        database = self._databases.get(tenant)
+        if database is not None:
+            self._databases.move_to_end(tenant)
+            return database
+
+        database = TenantDatabase(tenant)
+        self._databases[tenant] = database
+        while len(self._databases) > self.max_size:
+            _, evicted = self._databases.popitem(last=False)
+            logger.info(f"Закрываем БД школы {evicted.tenant}")
+            # Сессии, уже взявшие соединение, дорабатывают: NullPool
+            # закрывает соединения при возврате
+            asyncio.get_running_loop().create_task(evicted.engine.dispose())
+        return database
+
+    def __len__(self) -> int:
+        return len(self._databases)
+
+    def __contains__(self, tenant: str) -> bool:
+        return tenant in self._databases
+
+
+tenant_registry = EngineRegistry(max_size=settings.TENANT_ENGINE_CACHE_SIZE)
+
+
+def _ensure_sqlite_directory(url: str) -> None:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database:
+        directory = os.path.dirname(parsed.database)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+
+def validate_tenant(tenant: str) -> str:
+    tenant = tenant.strip().lower()
+    if not TENANT_NAME_PATTERN.match(tenant):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный идентификатор школы",
+        )
+    return tenant
+
+
+def tenant_exists(tenant: str) -> bool:
+    """
+    Школа заведена (python cli.py create-tenant): ее БД уже открыта
+    в процессе или файл БД существует. Для не-SQLite URL проверки нет
+    """
+    if tenant in tenant_registry:
+        return True
+    parsed = make_url(settings.TENANT_DATABASE_URL.format(tenant=tenant))
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        return True
+    return os.path.exists(parsed.database)
+
+
+def resolve_tenant(request: Request) -> Optional[str]:
+    """
+    Школа запроса: из заголовка TENANT_HEADER или из поддомена
+    TENANT_HOST_SUFFIX. None, если мультиарендность выключена.
+    Неизвестная школа - 404: запросы не создают новые БД
+    """
+    if not settings.TENANCY_ENABLED:
+        return None
+
+    tenant = request.headers.get(settings.TENANT_HEADER)
+    if not tenant and settings.TENANT_HOST_SUFFIX:
+        host = request.headers.get("host", "").split(":")[0].lower()
+        if host.endswith(settings.TENANT_HOST_SUFFIX):
+            tenant = host[: -len(settings.TENANT_HOST_SUFFIX)]
+    if not tenant:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Не указана школа",
+        )
+    tenant = validate_tenant(tenant)
+    if not tenant_exists(tenant):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Школа не найдена",
+        )
+    return tenant
+
+
+def get_engine(tenant: Optional[str] = None) -> AsyncEngine:
+    """Движок школы или основной движок в однотенантном режиме"""
+    if tenant is None:
+        return _default_engine()
+    return tenant_registry.get(validate_tenant(tenant)).engine
+
+
+async def get_sessionmaker(tenant: Optional[str] = None) -> async_sessionmaker:
+    if tenant is None:
+        return _default_sessionmaker()
+    database = tenant_registry.get(tenant)
+    await database.ensure_schema()
+    return database.sessionmaker
+
+
+class DatabaseStats:
+    """
+    Счетчики нагрузки на БД для проверок здоровья: открытые сессии
+    и транзакции с записью, ожидающие коммита (очередь писателей SQLite)
+    """
+
+    def __init__(self):
+        self.sessions_in_use = 0
+        self.writes_in_flight = 0
+
+
+db_stats = DatabaseStats()
 
-# Фабрика асинхронных сессий
-AsyncSessionLocal = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autocommit=False,
-    autoflush=False,
-)
 
+@event.listens_for(Session, "before_flush")
+def _track_write_start(session, flush_context, instances):
+    if not session.info.get("writing") and (session.new or session.dirty or session.deleted):
+        session.info["writing"] = True
+        db_stats.writes_in_flight += 1
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_dml_start(orm_execute_state):
+    # INSERT/UPDATE/DELETE через session.execute минуют flush
+    session = orm_execute_state.session
+    if not session.info.get("writing") and (
+        orm_execute_state.is_insert
+        or orm_execute_state.is_update
+        or orm_execute_state.is_delete
+    ):
+        session.info["writing"] = True
+        db_stats.writes_in_flight += 1
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _track_write_end(session):
+    if session.info.pop("writing", False):
+        db_stats.writes_in_flight -= 1
+
+
+def sql_datetime(value: datetime):
+    """
+    Параметр-время, сравнимый со значениями created_at в БД.
+    SQLite хранит CURRENT_TIMESTAMP как текст 'YYYY-MM-DD HH:MM:SS' в UTC,
+    поэтому параметр приводится к тому же виду (индекс при этом используется)
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    if "sqlite" in settings.DATABASE_URL:
+        return func.datetime(value)
+    return value
+
+
+async def get_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
     """
     Асинхронная зависимость для получения сессии БД
     """
-    async with AsyncSessionLocal() as session:
+    tenant = resolve_tenant(request)
+    request.state.tenant = tenant
+    sessionmaker = await get_sessionmaker(tenant)
+    db_stats.sessions_in_use += 1
+    # Единица работы на запрос: одна сессия (FastAPI кеширует зависимость,
+    # поэтому get_current_teacher и обработчик получают ее же) и один
+    # коммит, который делает обработчик записи до отправки ответа.
+    # Здесь коммитятся только забытые записи (флаг writing ставят flush
+    # и DML через session.execute); чтение завершается закрытием сессии
+    # без лишнего COMMIT
+    async with sessionmaker() as session:
         try:
             yield session
-            await session.commit()
+            if session.new or session.dirty or session.deleted or session.info.get("writing"):
+                await session.commit()
         except Exception:
             await session.rollback()
             raise
         finally:
             await session.close()
+            db_stats.sessions_in_use -= 1
 
 
 @asynccontextmanager
-async def get_db_context():
+async def get_db_context(tenant: Optional[str] = None):
     """
     Контекстный менеджер для работы с БД
     """
-    async with AsyncSessionLocal() as session:
+    sessionmaker = await get_sessionmaker(tenant)
+    db_stats.sessions_in_use += 1
+    async with sessionmaker() as session:
         try:
             yield session
             await session.commit()
@@ -54,17 +308,81 @@ async def get_db_context():
             raise
         finally:
             await session.close()
+            db_stats.sessions_in_use -= 1
 
 
-async def create_tables():
+async def create_tables(target_engine: Optional[AsyncEngine] = None):
     """
     Асинхронное создание таблиц
     """
     print("Creating tables...")
-    async with engine.begin() as conn:
+    async with (target_engine or _default_engine()).begin() as conn:
         # Удаляем существующие таблицы для тестирования (опционально)
         # await conn.run_sync(Base.metadata.drop_all)
 
         # Создаем таблицы
         await conn.run_sync(Base.metadata.create_all)
+
+        # Доводим существующую БД до текущей схемы (индексы, новые колонки)
+        applied = await conn.run_sync(migrations.apply_pending)
+        for migration in applied:
+            print(f"Applied migration {migration.version}: {migration.name}")
     print("Tables created successfully")
+
+
+async def convert_id_storage(
+    binary: bool, batch_size: int = 1000, target_engine: Optional[AsyncEngine] = None
+) -> int:
+    """
+    Перевод всех UUID-колонок существующей БД в бинарный (16 байт)
+    или текстовый формат. Выполняется одной транзакцией; возвращает
+    число измененных значений. Уже сконвертированные значения пропускаются.
+    Архивные таблицы полугодий конвертируются вместе с основными: иначе
+    их строки перестали бы совпадать с id преподавателей
+    """
+    import archive
+
+    def convert(value):
+        if binary and isinstance(value, str):
+            return uuid.UUID(value).bytes
+        if not binary and isinstance(value, bytes):
+            return str(uuid.UUID(bytes=value))
+        return None
+
+    converted = 0
+    async with (target_engine or _default_engine()).begin() as conn:
+        existing_tables = set(
+            await conn.run_sync(lambda sync_conn: sync_conn.dialect.get_table_names(sync_conn))
+        )
+        archive_tables = [
+            archive.archive_table(name[len(archive.ARCHIVE_TABLE_PREFIX) :])
+            for name in await conn.run_sync(archive.archive_sources)
+        ]
+        id_columns = [
+            (table.name, column.name)
+            for table in Base.metadata.sorted_tables + archive_tables
+            for column in table.columns
+            if isinstance(column.type, GUID)
+        ]
+        for table_name, column_name in id_columns:
+            if table_name not in existing_tables:
+                continue
+            result = await conn.execute(
+                text(f'SELECT DISTINCT "{column_name}" FROM "{table_name}"')
+            )
+            updates = []
+            for (value,) in result:
+                new_value = convert(value)
+                if new_value is not None:
+                    updates.append({"old": value, "new": new_value})
+
+            update = text(
+                f'UPDATE "{table_name}" SET "{column_name}" = :new '
+                f'WHERE "{column_name}" = :old'
+            )
+            for start in range(0, len(updates), batch_size):
+                await conn.execute(update, updates[start : start + batch_size])
+            converted += len(updates)
+            print(f"{table_name}.{column_name}: converted {len(updates)} values")
+
+    return converted
@@ -0,0 +1,95 @@
+import asyncio
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+from config import logger, settings
+
+
+@dataclass(frozen=True)
+class PraiseEvent:
+    """Событие о новой благодарности"""
+
+    id: str
+    data: str
+    event: str = "praise"
+
+
+def format_sse(event: PraiseEvent) -> str:
+    """Сериализация события в формат text/event-stream"""
+    lines = [f"id: {event.id}", f"event: {event.event}"]
+    lines.extend(f"data: {line}" for line in event.data.splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
+
+
+def format_heartbeat() -> str:
+    """Комментарий SSE, поддерживающий соединение открытым"""
+    return ": heartbeat\n\n"
+
+
+def topic(tenant: Optional[str], teacher_id: str) -> str:
+    """Ключ подписки: id преподавателей уникальны только в пределах школы"""
+    return f"{tenant}:{teacher_id}" if tenant else teacher_id
+
+
+class Subscription:
+    """Подписка на события одного преподавателя с ограниченным буфером"""
+
+    def __init__(self, topic: str, buffer_size: int):
+        self.topic = topic
+        self.queue: "asyncio.Queue[PraiseEvent]" = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def push(self, event: PraiseEvent) -> None:
+        # Медленный подписчик не должен задерживать отправителя:
+        # при переполнении вытесняем самое старое событие
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> Optional[PraiseEvent]:
+        """Ожидание следующего события; None, если истек таймаут"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class PraiseHub:
+    """Внутрипроцессный pub/sub для новых благодарностей"""
+
+    def __init__(self, buffer_size: int):
+        self.buffer_size = buffer_size
+        self._subscriptions: Dict[str, Set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(topic, self.buffer_size)
+        self._subscriptions[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.topic)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.topic]
+        if subscription.dropped:
+            logger.warning(
+                f"Подписчик {subscription.topic} "
+                f"пропустил {subscription.dropped} событий"
+            )
+
+    def publish(self, topic: str, event: PraiseEvent) -> int:
+        """Рассылка события подписчикам; возвращает число получателей"""
+        subscriptions = self._subscriptions.get(topic, ())
+        for subscription in subscriptions:
+            subscription.push(event)
+        return len(subscriptions)
+
+    def subscriber_count(self) -> int:
+        return sum(len(subs) for subs in self._subscriptions.values())
+
+
+hub = PraiseHub(buffer_size=settings.SSE_BUFFER_SIZE)
@@ -2,6 +2,7 @@ from fastapi import APIRouter
 
 from .admin import router as admin_router
 from .auth import router as auth_router
+from .health import router as health_router
 from .praise import router as praise_router
 from .teacher import router as teacher_router
 
@@ -10,3 +11,4 @@ main_router.include_router(auth_router)
 main_router.include_router(admin_router)
 main_router.include_router(praise_router)
 main_router.include_router(teacher_router)
+main_router.include_router(health_router)
@@ -1,47 +1,76 @@
-from datetime import datetime, timedelta
-from typing import List
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func, select
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, status
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import delete, func, select
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+import archive
 import auth
+import cache
+import coalesce
+import jobs
+import login_guard
 import models
+import purge
+import rollups
 import schemas
-from config import logger
-from database import get_db
-from utils import get_current_admin
+from config import logger, settings
+from database import get_db, sql_datetime
+from praise_filters import PraiseFilters, admin_praises_statement
+from profiler import ProfilerBusy, loop_monitor, profiler, render_collapsed
+from query_stats import query_stats
+from utils import PRAISES_TAG, TEACHERS_TAG, get_current_admin
 
 router = APIRouter()
 
 
 # Admin endpoints
 @router.get("/admin/stats", response_model=schemas.AdminStats)
+@cache.cached(
+    key=lambda request, **_: cache.scoped(request.state.tenant, "admin:stats"),
+    tags=lambda request, **_: [
+        cache.scoped(request.state.tenant, TEACHERS_TAG),
+        cache.scoped(request.state.tenant, PRAISES_TAG),
+    ],
+    model=schemas.AdminStats,
+)
 async def get_admin_stats(
+    request: Request,
     current_admin: models.Teacher = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db),
 ):
     """Получение статистики для администратора"""
     try:
-        # Общее количество учителей
-        total_teachers_result = await db.execute(
-            select(func.count()).select_from(models.Teacher)
-        )
-        total_teachers = total_teachers_result.scalar()
-
-        # Общее количество благодарностей
-        total_praises_result = await db.execute(
-            select(func.count()).select_from(models.PraiseMessage)
-        )
-        total_praises = total_praises_result.scalar()
-
-        # Благодарности за последнюю неделю
-        week_ago = datetime.now() - timedelta(days=7)
-        praises_last_week_result = await db.execute(
-            select(func.count()).where(models.PraiseMessage.created_at >= week_ago)
+        # Все счетчики одним запросом; благодарности удаленных
+        # преподавателей, ожидающие очистки, не учитываются
+        deleted = purge.deleted_teacher_ids()
+        week_ago = sql_datetime(datetime.now(timezone.utc) - timedelta(days=7))
+        result = await db.execute(
+            select(
+                select(func.count())
+                .select_from(models.Teacher)
+                .where(models.Teacher.deleted_at.is_(None))
+                .scalar_subquery()
+                .label("total_teachers"),
+                select(func.count())
+                .select_from(models.PraiseMessage)
+                .where(models.PraiseMessage.teacher_id.notin_(deleted))
+                .scalar_subquery()
+                .label("total_praises"),
+                select(func.count())
+                .where(
+                    models.PraiseMessage.created_at >= week_ago,
+                    models.PraiseMessage.teacher_id.notin_(deleted),
+                )
+                .scalar_subquery()
+                .label("praises_last_week"),
+            )
         )
-        praises_last_week = praises_last_week_result.scalar()
+        total_teachers, total_praises, praises_last_week = result.one()
 
         return schemas.AdminStats(
             total_teachers=total_teachers,
@@ -57,9 +86,156 @@ async def get_admin_stats(
         )
 
 
+@router.get("/admin/analytics", response_model=schemas.PraiseAnalytics)
+async def get_praise_analytics(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: Literal["hour", "day", "week", "month"] = "day",
+    group_by: Literal["teacher", "subject"] = "teacher",
+    teacher_id: Optional[schemas.ID] = None,
+    subject: Optional[str] = Query(None, max_length=100),
+    current_admin: models.Teacher = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Динамика благодарностей по преподавателям или предметам
+    (только для администратора). По умолчанию - последние 30 дней
+    """
+    # Время без часового пояса считается UTC, как created_at в БД
+    if start is not None and start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end is not None and end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Начало периода должно быть раньше конца",
+        )
+
+    try:
+        result = await db.execute(
+            rollups.analytics_statement(
+                start, end, granularity, group_by, teacher_id, subject
+            )
+        )
+
+        series = {}
+        for row in result:
+            item = series.get(row.key)
+            if item is None:
+                item = series[row.key] = schemas.AnalyticsSeries(
+                    key=row.key, label=row.label, total=0, points=[]
+                )
+            item.points.append(schemas.AnalyticsPoint(bucket=row.bucket, count=row.count))
+            item.total += row.count
+
+        return schemas.PraiseAnalytics(
+            granularity=granularity,
+            group_by=group_by,
+            start=start,
+            end=end,
+            series=list(series.values()),
+        )
+
+    except SQLAlchemyError as e:
+        logger.error(f"Ошибка при получении аналитики: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при получении статистики",
+        )
+
+
+@router.get("/admin/coalescing")
+async def get_coalescing_stats(
+    limit: int = Query(20, ge=1, le=1000),
+    current_admin: models.Teacher = Depends(get_current_admin),
+):
+    """Статистика объединения одинаковых одновременных запросов"""
+    return {"in_flight": coalesce.flights.in_flight(), "keys": coalesce.flights.top(limit)}
+
+
+@router.get("/admin/jobs")
+async def get_job_stats(
+    limit: int = Query(20, ge=1, le=1000),
+    current_admin: models.Teacher = Depends(get_current_admin),
+):
+    """Состояние очереди фоновых задач и последние неудавшиеся задачи"""
+    stats = await jobs.queue.stats(failed_limit=limit)
+    return {"running": jobs.runner.running, "active": jobs.runner.active, **stats}
+
+
+@router.get("/admin/queries")
+async def get_query_stats(
+    limit: int = Query(20, ge=1, le=500),
+    order_by: Literal["total_ms", "mean_ms", "p95_ms", "max_ms", "count"] = "total_ms",
+    current_admin: models.Teacher = Depends(get_current_admin),
+):
+    """
+    Самые дорогие SQL-запросы процесса и журнал медленных запросов
+    с планами выполнения. Время включает ожидание событийного цикла,
+    поэтому его стоит сверять с GET /admin/loop-lag
+    """
+    return {
+        "since": query_stats.started_at,
+        "slow_query_ms": query_stats.slow_ms,
+        "statements": query_stats.top(limit, order_by),
+        "slow": list(query_stats.slow_log)[-limit:],
+    }
+
+
+@router.delete("/admin/queries")
+async def reset_query_stats(current_admin: models.Teacher = Depends(get_current_admin)):
+    """Сброс статистики SQL-запросов"""
+    query_stats.reset()
+    return {"success": True}
+
+
+@router.get("/admin/profile")
+async def get_profile(
+    seconds: float = Query(5.0, gt=0, le=settings.PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(settings.PROFILE_DEFAULT_INTERVAL_MS, ge=1, le=1000),
+    format: Literal["collapsed", "json"] = "collapsed",
+    current_admin: models.Teacher = Depends(get_current_admin),
+):
+    """
+    Выборка стеков всех потоков воркера за seconds секунд (PROFILING_ENABLED).
+    collapsed - свернутые стеки для flamegraph.pl/speedscope
+    """
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Профилирование выключено"
+        )
+    try:
+        stacks = await asyncio.to_thread(profiler.sample, seconds, interval_ms / 1000)
+    except ProfilerBusy:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Профилирование уже выполняется",
+        )
+
+    if format == "collapsed":
+        return PlainTextResponse(render_collapsed(stacks))
+    return {
+        "samples": sum(stacks.values()),
+        "stacks": [
+            {"stack": stack.split(";"), "count": count}
+            for stack, count in stacks.most_common()
+        ],
+    }
+
+
+@router.get("/admin/loop-lag")
+async def get_loop_lag(current_admin: models.Teacher = Depends(get_current_admin)):
+    """Блокировки цикла событий и стеки, на которых они случились"""
+    return loop_monitor.stats()
+
+
 @router.post("/admin/teachers", response_model=schemas.Teacher)
 async def create_teacher(
     teacher_data: schemas.TeacherCreate,
+    request: Request,
     current_admin: models.Teacher = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db),
 ):
@@ -84,28 +260,27 @@ async def create_teacher(
             username=teacher_data.username,
             full_name=teacher_data.full_name,
             subject=teacher_data.subject,
-            password_hash=auth.get_password_hash(teacher_data.password),
+            password_hash=await login_guard.run_hashing(
+                auth.get_password_hash, teacher_data.password
+            ),
             role=teacher_data.role,
         )
 
         db.add(new_teacher)
         await db.commit()
-        await db.refresh(new_teacher)
+        await cache.invalidate(request.state.tenant, TEACHERS_TAG)
 
         return new_teacher
 
     except HTTPException:
-        await db.rollback()
         raise
     except IntegrityError as e:
-        await db.rollback()
         logger.error(f"Ошибка целостности данных: {e}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Ошибка при создании пользователя",
         )
     except Exception as e:
-        await db.rollback()
         logger.error(f"Ошибка при создании преподавателя: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -115,20 +290,18 @@ async def create_teacher(
 
 @router.put("/admin/teachers/{teacher_id}", response_model=schemas.Teacher)
 async def update_teacher(
-    teacher_id: str,
+    teacher_id: Annotated[schemas.ID, Path()],
     teacher_update: schemas.TeacherUpdate,
+    request: Request,
     current_admin: models.Teacher = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db),
 ):
     """Обновление информации о преподавателе (только для администратора)"""
     try:
-        # Находим преподавателя
-        result = await db.execute(
-            select(models.Teacher).where(models.Teacher.id == teacher_id)
-        )
-        teacher = result.scalar_one_or_none()
+        # Находим преподавателя (без запроса, если он уже в сессии)
+        teacher = await db.get(models.Teacher, teacher_id)
 
-        if not teacher:
+        if not teacher or not teacher.is_active:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Преподаватель не найден",
@@ -140,18 +313,24 @@ async def update_teacher(
         if teacher_update.subject is not None:
             teacher.subject = teacher_update.subject
         if teacher_update.password is not None:
-            teacher.password_hash = auth.get_password_hash(teacher_update.password)
+            teacher.password_hash = await login_guard.run_hashing(
+                auth.get_password_hash, teacher_update.password
+            )
+            # Входы со старым паролем больше не продлеваются
+            await db.execute(
+                purge.revoke_refresh_tokens_statement(
+                    teacher_id, datetime.now(timezone.utc)
+                )
+            )
 
         await db.commit()
-        await db.refresh(teacher)
+        await cache.invalidate(request.state.tenant, TEACHERS_TAG)
 
         return teacher
 
     except HTTPException:
-        await db.rollback()
         raise
     except Exception as e:
-        await db.rollback()
         logger.error(f"Ошибка при обновлении преподавателя: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -161,7 +340,8 @@ async def update_teacher(
 
 @router.delete("/admin/teachers/{teacher_id}")
 async def delete_teacher(
-    teacher_id: str,
+    teacher_id: Annotated[schemas.ID, Path()],
+    request: Request,
     current_admin: models.Teacher = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db),
 ):
@@ -174,28 +354,34 @@ async def delete_teacher(
                 detail="Нельзя удалить собственную учетную запись",
             )
 
-        # Находим преподавателя
-        result = await db.execute(
-            select(models.Teacher).where(models.Teacher.id == teacher_id)
-        )
-        teacher = result.scalar_one_or_none()
+        # Находим преподавателя (без запроса, если он уже в сессии)
+        teacher = await db.get(models.Teacher, teacher_id)
 
-        if not teacher:
+        if not teacher or not teacher.is_active:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Преподаватель не найден",
             )
 
-        await db.delete(teacher)
+        # Мягкое удаление: преподаватель сразу исчезает из всех выборок,
+        # а его благодарности удаляет порциями фоновая задача
+        teacher.deleted_at = datetime.now(timezone.utc)
+        await db.execute(
+            purge.revoke_refresh_tokens_statement(teacher_id, teacher.deleted_at)
+        )
         await db.commit()
+        await cache.invalidate(request.state.tenant, TEACHERS_TAG, PRAISES_TAG)
+        try:
+            await jobs.enqueue("purge_teacher", request.state.tenant, teacher_id=teacher_id)
+        except Exception as e:
+            # Преподаватель уже скрыт; его подберет периодическая очистка
+            logger.error(f"Не удалось поставить очистку преподавателя {teacher_id}: {e}")
 
         return {"success": True, "message": "Преподаватель деактивирован"}
 
     except HTTPException:
-        await db.rollback()
         raise
     except Exception as e:
-        await db.rollback()
         logger.error(f"Ошибка при удалении преподавателя: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -207,20 +393,20 @@ async def delete_teacher(
 async def get_all_praises(
     current_admin: models.Teacher = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db),
+    filters: PraiseFilters = Depends(),
     limit: int = 100,
     offset: int = 0,
+    include_archived: bool = False,
 ):
-    """Получение всех благодарностей (только для администратора)"""
+    """
+    Получение всех благодарностей (только для администратора) с фильтрами
+    по преподавателю, предмету, дате, анонимности, имени автора и метке спама
+    """
     try:
-        result = await db.execute(
-            select(
-                models.PraiseMessage, models.Teacher.full_name, models.Teacher.subject
-            )
-            .join(models.Teacher, models.PraiseMessage.teacher_id == models.Teacher.id)
-            .order_by(models.PraiseMessage.created_at.desc())
-            .limit(limit)
-            .offset(offset)
-        )
+        if include_archived:
+            return await _get_praises_with_archive(db, filters, limit, offset)
+
+        result = await db.execute(admin_praises_statement(filters, limit, offset))
         rows = result.all()
 
         praises = []
@@ -242,37 +428,68 @@ async def get_all_praises(
         )
 
 
+async def _get_praises_with_archive(
+    db: AsyncSession, filters: PraiseFilters, limit: int, offset: int
+) -> List[schemas.PraiseMessageDetail]:
+    """Выгрузка благодарностей вместе с архивными таблицами полугодий"""
+    sources = await db.run_sync(
+        lambda session: archive.archive_sources(session.connection())
+    )
+    # Горячие строки мягко удаленных ждут очистки и скрыты, как без архивов
+    praises = archive.praises_with_archive(
+        sources,
+        hot_conditions=[models.PraiseMessage.teacher_id.notin_(purge.deleted_teacher_ids())],
+    )
+    result = await db.execute(
+        admin_praises_statement(filters, limit, offset, source=praises)
+    )
+    return [
+        schemas.PraiseMessageDetail(
+            **row._mapping,
+            teacher_full_name=row.full_name,
+            teacher_subject=row.subject,
+        )
+        for row in result.all()
+    ]
+
+
 @router.delete("/admin/praises/{praise_id}")
 async def delete_praise_message(
-    praise_id: str,
+    praise_id: Annotated[schemas.ID, Path()],
+    request: Request,
     current_admin: models.Teacher = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db),
 ):
     """Удаление благодарности (только для администратора)"""
     try:
-        # Находим сообщение
+        # Удаляем сообщение одним запросом, получая данные для сводной таблицы
         result = await db.execute(
-            select(models.PraiseMessage).where(models.PraiseMessage.id == praise_id)
+            delete(models.PraiseMessage)
+            .where(models.PraiseMessage.id == praise_id)
+            .returning(
+                models.PraiseMessage.teacher_id,
+                models.PraiseMessage.created_at,
+                models.PraiseMessage.is_flagged,
+            )
         )
-        praise_message = result.scalar_one_or_none()
+        deleted = result.one_or_none()
 
-        if not praise_message:
+        if deleted is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Сообщение не найдено",
             )
 
-        # Удаляем сообщение
-        await db.delete(praise_message)
+        if not deleted.is_flagged:
+            await rollups.forget_praise(db, deleted.teacher_id, deleted.created_at)
         await db.commit()
+        await cache.invalidate(request.state.tenant, PRAISES_TAG)
 
         return {"success": True, "message": "Сообщение удалено"}
 
     except HTTPException:
-        await db.rollback()
         raise
     except SQLAlchemyError as e:
-        await db.rollback()
         logger.error(f"Ошибка при удалении сообщения: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
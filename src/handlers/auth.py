@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import auth
+import login_guard
 import models
 import schemas
-from config import logger
-from database import get_db
+from config import logger, settings
+from database import get_db, get_engine
 from utils import get_current_teacher
 
 router = APIRouter()
@@ -15,30 +19,58 @@ router = APIRouter()
 # Auth endpoints
 @router.post("/auth/login", response_model=schemas.LoginResponse)
 async def teacher_login(
-    credentials: schemas.LoginCredentials, db: AsyncSession = Depends(get_db)
+    credentials: schemas.LoginCredentials,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
 ):
-    """Аутентификация преподавателя"""
+    """
+    Аутентификация преподавателя. Число одновременных проверок пароля
+    ограничено, заблокированный логин отклоняется без проверки
+    """
     try:
+        lockout_key = login_guard.lockout_key(request.state.tenant, credentials.username)
+        login_guard.check_lockout(lockout_key)
 
         result = await db.execute(
             select(models.Teacher).where(
-                models.Teacher.username == credentials.username
+                models.Teacher.username == credentials.username,
+                models.Teacher.deleted_at.is_(None),
             )
         )
         teacher = result.scalar_one_or_none()
 
-        if not teacher or not auth.verify_password(
-            credentials.password, teacher.password_hash
-        ):
+        async with login_guard.verify_slot():
+            verified = await login_guard.verify(
+                credentials.password, teacher.password_hash if teacher else None
+            )
+
+        if not verified:
+            login_guard.lockouts.failure(lockout_key)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Неверное имя пользователя или пароль",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        login_guard.lockouts.success(lockout_key)
 
-        access_token = auth.create_access_token(data={"sub": teacher.id})
+        # Хеш со старыми параметрами пересчитывается уже после ответа
+        if auth.needs_rehash(teacher.password_hash):
+            background_tasks.add_task(
+                _rehash_password,
+                request.state.tenant,
+                teacher.id,
+                teacher.password_hash,
+                credentials.password,
+            )
+
+        access_token = auth.create_access_token(
+            data={"sub": teacher.id, "tenant": request.state.tenant}
+        )
+        refresh_token = _issue_refresh_token(db, teacher.id)
+        await db.commit()
 
-        return {"teacher": teacher, "token": access_token}
+        return {"teacher": teacher, "token": access_token, "refresh_token": refresh_token}
 
     except HTTPException:
         raise
@@ -50,6 +82,150 @@ async def teacher_login(
         )
 
 
+async def _rehash_password(
+    tenant: Optional[str], teacher_id: str, old_hash: str, password: str
+) -> None:
+    """
+    Запись хеша с текущими параметрами. Обновление условное: если пароль
+    успели сменить, новый хеш не затирается
+    """
+    try:
+        new_hash = await login_guard.run_hashing(auth.get_password_hash, password)
+        table = models.Teacher.__table__
+        async with get_engine(tenant).begin() as conn:
+            await conn.execute(
+                update(table)
+                .where(table.c.id == teacher_id, table.c.password_hash == old_hash)
+                .values(password_hash=new_hash)
+            )
+        logger.info(f"Хеш пароля преподавателя {teacher_id} обновлен")
+    except Exception as e:
+        logger.error(f"Не удалось обновить хеш пароля {teacher_id}: {e}")
+
+
+def _issue_refresh_token(
+    db: AsyncSession, teacher_id: str, family_id: Optional[str] = None
+) -> str:
+    """Новый refresh-токен; строка с его HMAC коммитится обработчиком"""
+    token, token_hash = auth.create_refresh_token()
+    db.add(
+        models.RefreshToken(
+            teacher_id=teacher_id,
+            family_id=family_id or models.generate_uuid(),
+            token_hash=token_hash,
+            expires_at=datetime.now(timezone.utc)
+            + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+        )
+    )
+    return token
+
+
+async def _revoke_family(db: AsyncSession, family_id: str) -> None:
+    await db.execute(
+        update(models.RefreshToken)
+        .where(
+            models.RefreshToken.family_id == family_id,
+            models.RefreshToken.revoked_at.is_(None),
+        )
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
+
+
+def _invalid_refresh_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Недействительный refresh-токен",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+@router.post("/auth/refresh", response_model=schemas.TokenPair)
+async def refresh_tokens(
+    body: schemas.RefreshRequest, request: Request, db: AsyncSession = Depends(get_db)
+):
+    """
+    Обновление access-токена без проверки пароля. Refresh-токен
+    одноразовый: вместе с access-токеном выдается новый. Повторное
+    предъявление уже использованного токена означает его утечку,
+    и вся цепочка токенов этого входа отзывается
+    """
+    try:
+        result = await db.execute(
+            select(models.RefreshToken).where(
+                models.RefreshToken.token_hash
+                == auth.hash_refresh_token(body.refresh_token)
+            )
+        )
+        stored = result.scalar_one_or_none()
+        if stored is None:
+            raise _invalid_refresh_token()
+
+        if stored.revoked_at is not None:
+            logger.warning(
+                f"Повторное использование refresh-токена преподавателя "
+                f"{stored.teacher_id}, цепочка отозвана"
+            )
+            await _revoke_family(db, stored.family_id)
+            await db.commit()
+            raise _invalid_refresh_token()
+
+        now = datetime.now(timezone.utc)
+        if stored.expires_at.replace(tzinfo=timezone.utc) <= now:
+            raise _invalid_refresh_token()
+
+        # Условный отзыв: из двух одновременных обновлений проходит одно
+        revoked = await db.execute(
+            update(models.RefreshToken)
+            .where(
+                models.RefreshToken.id == stored.id,
+                models.RefreshToken.revoked_at.is_(None),
+            )
+            .values(revoked_at=now)
+        )
+        if revoked.rowcount == 0:
+            await _revoke_family(db, stored.family_id)
+            await db.commit()
+            raise _invalid_refresh_token()
+
+        teacher = await db.get(models.Teacher, stored.teacher_id)
+        if teacher is None or not teacher.is_active:
+            raise _invalid_refresh_token()
+
+        refresh_token = _issue_refresh_token(db, stored.teacher_id, stored.family_id)
+        await db.commit()
+
+        return {
+            "token": auth.create_access_token(
+                data={"sub": stored.teacher_id, "tenant": request.state.tenant}
+            ),
+            "refresh_token": refresh_token,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при обновлении токена: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при обновлении токена",
+        )
+
+
+@router.post("/auth/logout")
+async def logout(body: schemas.RefreshRequest, db: AsyncSession = Depends(get_db)):
+    """Завершение сессии: отзыв refresh-токена и всей его цепочки"""
+    result = await db.execute(
+        select(models.RefreshToken.family_id).where(
+            models.RefreshToken.token_hash == auth.hash_refresh_token(body.refresh_token)
+        )
+    )
+    family_id = result.scalar_one_or_none()
+    if family_id is not None:
+        await _revoke_family(db, family_id)
+        await db.commit()
+    return {"success": True, "message": "Сессия завершена"}
+
+
 @router.get("/auth/me", response_model=schemas.Teacher)
 async def get_current_user(
     current_teacher: models.Teacher = Depends(get_current_teacher),
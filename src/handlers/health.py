@@ -0,0 +1,47 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+
+from health import probe
+from startup import startup
+
+router = APIRouter()
+
+
+# Health check
+@router.get("/health")
+async def health_check():
+    """Проверка здоровья приложения"""
+    return {"status": "healthy", "service": "school-praise-api", "version": "1.0.0"}
+
+
+@router.get("/health/ready")
+async def readiness_check():
+    """
+    Готовность воркера принимать трафик: 503, пока не завершен прогрев
+    или если БД не отвечает за отведенное время
+    """
+    if not startup.ready:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "starting", "startup_ms": startup.phases},
+        )
+
+    result = await probe.get()
+    if result["status"] == "unhealthy":
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "unhealthy", "database": result["database"]},
+        )
+    return {"status": "ready", "startup_ms": startup.phases}
+
+
+@router.get("/health/deep")
+async def deep_health_check():
+    """Подробная проверка: задержка БД, пул соединений, очередь записи"""
+    result = await probe.get()
+    content = {**result, "ready": startup.ready}
+    if result["status"] == "unhealthy":
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=content
+        )
+    return content
@@ -1,15 +1,32 @@
-from typing import List
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Annotated, AsyncGenerator, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import select
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Path,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, case, func, select, true
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+import cache
+import idempotency
 import models
+import rollups
 import schemas
-from config import logger
-from database import get_db
-from utils import get_current_teacher
+import spam
+from config import logger, settings
+from database import get_db, get_db_context, sql_datetime
+from events import PraiseEvent, format_heartbeat, format_sse, hub, topic
+from utils import PRAISES_TAG, get_current_teacher
 
 router = APIRouter()
 
@@ -17,59 +34,130 @@ router = APIRouter()
 # Praise endpoints
 @router.post("/praise", response_model=dict)
 async def send_praise(
-    praise: schemas.PraiseMessageCreate, db: AsyncSession = Depends(get_db)
+    praise: schemas.PraiseMessageCreate,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(
+        None, alias=idempotency.IDEMPOTENCY_HEADER, min_length=1, max_length=255
+    ),
 ):
-    """Отправка благодарности преподавателю"""
+    """
+    Отправка благодарности преподавателю. Повтор запроса с тем же
+    Idempotency-Key возвращает сохраненный ответ без новой записи
+    """
+    if idempotency_key is None:
+        return await _create_praise(praise, request, db)
+
+    tenant = request.state.tenant
+    request_fingerprint = idempotency.fingerprint(praise.model_dump(mode="json"))
+    async with idempotency.store.hold(idempotency.scoped_key(tenant, idempotency_key)):
+        stored = await idempotency.lookup(db, tenant, idempotency_key)
+        if stored is None:
+            try:
+                return await _create_praise(
+                    praise, request, db, idempotency_key, request_fingerprint
+                )
+            except idempotency.IdempotencyConflict:
+                # Ключ успел сохранить другой воркер
+                stored = await idempotency.lookup(db, tenant, idempotency_key)
+                if stored is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Ошибка при сохранении данных",
+                    )
+
+        if stored.fingerprint != request_fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Ключ идемпотентности уже использован с другим запросом",
+            )
+        response.headers[idempotency.REPLAYED_HEADER] = "true"
+        return stored.body
+
+
+async def _create_praise(
+    praise: schemas.PraiseMessageCreate,
+    request: Request,
+    db: AsyncSession,
+    idempotency_key: Optional[str] = None,
+    request_fingerprint: Optional[str] = None,
+) -> dict:
+    """Запись благодарности и, если задан ключ, ответа для повторов"""
+    tenant = request.state.tenant
     try:
-        # Проверка существования преподавателя
+        # Проверка на волну одинаковых сообщений до обращения к БД
+        verdict = spam.detector.check(praise.message, tenant)
+        if verdict.is_spam and settings.SPAM_ACTION == "reject":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Похожее сообщение уже отправлялось",
+            )
 
-        result = await db.execute(
-            select(models.Teacher).where(models.Teacher.id == praise.teacher_id)
-        )
-        teacher = result.scalar_one_or_none()
+        # Проверка существования преподавателя
+        teacher = await db.get(models.Teacher, praise.teacher_id)
 
-        if not teacher:
+        if not teacher or not teacher.is_active:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Преподаватель не найден"
             )
 
-        # Создание сообщения благодарности
+        # Создание сообщения благодарности; id задается заранее,
+        # чтобы ответ можно было сохранить в той же транзакции
         db_praise = models.PraiseMessage(
+            id=models.generate_uuid(),
             teacher_id=praise.teacher_id,
             message=praise.message,
             is_anonymous=praise.is_anonymous,
             user_name=praise.user_name if not praise.is_anonymous else None,
+            fingerprint=verdict.fingerprint,
+            is_flagged=verdict.is_spam,
         )
-
         db.add(db_praise)
-        await db.commit()
-        await db.refresh(db_praise)
 
-        return {
+        body = {
             "success": True,
             "message": "Благодарность отправлена успешно",
             "praise_id": db_praise.id,
         }
+        if idempotency_key is not None:
+            stored = idempotency.StoredResponse(request_fingerprint, body)
+            idempotency.record(db, idempotency_key, stored)
+
+        if not db_praise.is_flagged:
+            # created_at известен после INSERT ... RETURNING
+            await db.flush()
+            await rollups.record_praise(db, db_praise.teacher_id, db_praise.created_at)
+
+        await db.commit()
+        # Счетчики /admin/stats
+        await cache.invalidate(tenant, PRAISES_TAG)
+
+        spam.detector.observe(verdict, tenant)
+        if idempotency_key is not None:
+            idempotency.remember(tenant, idempotency_key, stored)
+        hub.publish(topic(tenant, db_praise.teacher_id), _praise_event(db_praise))
+
+        return body
 
     except HTTPException:
-        await db.rollback()
         raise
     except IntegrityError as e:
-        await db.rollback()
+        if idempotency_key is not None and settings.IDEMPOTENCY_PERSIST:
+            await db.rollback()
+            raise idempotency.IdempotencyConflict(idempotency_key) from e
         logger.error(f"Ошибка целостности данных: {e}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Ошибка при сохранении данных",
         )
     except SQLAlchemyError as e:
-        await db.rollback()
         logger.error(f"Ошибка базы данных: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ошибка при сохранении данных",
         )
     except Exception as e:
-        await db.rollback()
         logger.error(f"Непредвиденная ошибка: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -77,24 +165,71 @@ async def send_praise(
         )
 
 
+def _check_inbox_access(current_teacher: models.Teacher, teacher_id: str) -> None:
+    """Преподаватель может читать только собственные сообщения"""
+    if current_teacher.id != teacher_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Нет доступа к данным другого преподавателя",
+        )
+
+
+async def _incremental_filters(
+    db: AsyncSession,
+    teacher_id: str,
+    since: Optional[datetime] = None,
+    after_id: Optional[str] = None,
+) -> Optional[list]:
+    """
+    Условия выборки только новых сообщений преподавателя.
+    Возвращает None, если after_id не найден среди его сообщений
+    """
+    filters = [models.PraiseMessage.teacher_id == teacher_id]
+    if since is not None:
+        filters.append(models.PraiseMessage.created_at > sql_datetime(since))
+    if after_id is not None:
+        anchor_created_at = (
+            select(models.PraiseMessage.created_at)
+            .where(
+                models.PraiseMessage.id == after_id,
+                models.PraiseMessage.teacher_id == teacher_id,
+            )
+            .scalar_subquery()
+        )
+        anchor_exists = await db.execute(select(anchor_created_at.isnot(None)))
+        if not anchor_exists.scalar():
+            return None
+        # created_at хранится с точностью до секунды, а id случайны,
+        # поэтому сообщения той же секунды отдаются повторно:
+        # лучше дубликат, чем потерянная благодарность
+        filters.append(models.PraiseMessage.created_at >= anchor_created_at)
+        filters.append(models.PraiseMessage.id != after_id)
+    return filters
+
+
 @router.get("/praise/teacher/{teacher_id}", response_model=List[schemas.PraiseMessage])
 async def get_teacher_praise(
-    teacher_id: str,
+    teacher_id: Annotated[schemas.ID, Path()],
     current_teacher: models.Teacher = Depends(get_current_teacher),
     db: AsyncSession = Depends(get_db),
+    since: Optional[datetime] = None,
+    after_id: Optional[schemas.ID] = None,
 ):
     """Получение сообщений для конкретного преподавателя"""
     try:
         # Проверка авторизации
-        if current_teacher.id != teacher_id:
+        _check_inbox_access(current_teacher, teacher_id)
+
+        filters = await _incremental_filters(db, teacher_id, since, after_id)
+        if filters is None:
             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Нет доступа к данным другого преподавателя",
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Сообщение after_id не найдено",
             )
 
         result = await db.execute(
             select(models.PraiseMessage)
-            .where(models.PraiseMessage.teacher_id == teacher_id)
+            .where(*filters)
             .order_by(models.PraiseMessage.created_at.desc())
         )
         praise_messages = result.scalars().all()
@@ -109,3 +244,178 @@ async def get_teacher_praise(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ошибка при получении данных",
         )
+
+
+async def _inbox_summary(
+    db: AsyncSession,
+    teacher_id: str,
+    since: Optional[datetime],
+    after_id: Optional[str],
+) -> schemas.PraiseInboxSummary:
+    """Сводка по входящим одним запросом по индексу (teacher_id, created_at)"""
+    filters = await _incremental_filters(db, teacher_id, since, after_id)
+    if filters is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Сообщение after_id не найдено",
+        )
+
+    # Все условия кроме первого (teacher_id) отбирают непрочитанные
+    unread_condition = and_(true(), *filters[1:])
+    result = await db.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(case((unread_condition, 1), else_=0)), 0),
+            func.max(models.PraiseMessage.created_at),
+        ).where(models.PraiseMessage.teacher_id == teacher_id)
+    )
+    total, unread, latest_created_at = result.one()
+    return schemas.PraiseInboxSummary(
+        total=total, unread=unread, latest_created_at=latest_created_at
+    )
+
+
+@router.get(
+    "/praise/teacher/{teacher_id}/summary", response_model=schemas.PraiseInboxSummary
+)
+async def get_teacher_praise_summary(
+    teacher_id: Annotated[schemas.ID, Path()],
+    current_teacher: models.Teacher = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db),
+    since: Optional[datetime] = None,
+    after_id: Optional[schemas.ID] = None,
+):
+    """Количество сообщений, непрочитанных с since/after_id, и время последнего"""
+    try:
+        _check_inbox_access(current_teacher, teacher_id)
+        return await _inbox_summary(db, teacher_id, since, after_id)
+
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        logger.error(f"Ошибка при получении сводки благодарностей: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при получении данных",
+        )
+
+
+@router.head("/praise/teacher/{teacher_id}")
+async def head_teacher_praise(
+    teacher_id: Annotated[schemas.ID, Path()],
+    current_teacher: models.Teacher = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db),
+    since: Optional[datetime] = None,
+    after_id: Optional[schemas.ID] = None,
+):
+    """Сводка по входящим в заголовках ответа без тела"""
+    try:
+        _check_inbox_access(current_teacher, teacher_id)
+        summary = await _inbox_summary(db, teacher_id, since, after_id)
+
+    except HTTPException:
+        raise
+    except SQLAlchemyError as e:
+        logger.error(f"Ошибка при получении сводки благодарностей: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Ошибка при получении данных",
+        )
+
+    headers = {
+        "X-Total-Count": str(summary.total),
+        "X-Unread-Count": str(summary.unread),
+    }
+    if summary.latest_created_at is not None:
+        latest = summary.latest_created_at
+        if latest.tzinfo is None:
+            latest = latest.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(latest, usegmt=True)
+    return Response(headers=headers)
+
+
+def _praise_event(praise: models.PraiseMessage) -> PraiseEvent:
+    """Событие SSE для сообщения благодарности"""
+    payload = schemas.PraiseMessage.model_validate(praise)
+    return PraiseEvent(id=praise.id, data=payload.model_dump_json())
+
+
+async def _active_password_hash(tenant: Optional[str], teacher_id: str) -> Optional[str]:
+    """Хеш пароля преподавателя; None, если преподаватель удален"""
+    async with get_db_context(tenant) as db:
+        return await db.scalar(
+            select(models.Teacher.password_hash).where(
+                models.Teacher.id == teacher_id, models.Teacher.deleted_at.is_(None)
+            )
+        )
+
+
+async def _praise_event_stream(
+    tenant: Optional[str], teacher_id: str, last_event_id: Optional[str]
+) -> AsyncGenerator[str, None]:
+    """
+    Поток событий SSE: досылка пропущенного, затем новые сообщения.
+    На каждом heartbeat доступ проверяется заново: поток закрывается,
+    если преподавателя удалили или сменили ему пароль
+    """
+    password_hash = await _active_password_hash(tenant, teacher_id)
+    if password_hash is None:
+        return
+    # Подписываемся до чтения истории, чтобы не потерять сообщения,
+    # отправленные во время досылки
+    subscription = hub.subscribe(topic(tenant, teacher_id))
+    try:
+        replayed = set()
+        if last_event_id:
+            async with get_db_context(tenant) as db:
+                filters = await _incremental_filters(
+                    db, teacher_id, after_id=last_event_id
+                )
+                missed = []
+                if filters is not None:
+                    result = await db.execute(
+                        select(models.PraiseMessage)
+                        .where(*filters)
+                        .order_by(
+                            models.PraiseMessage.created_at, models.PraiseMessage.id
+                        )
+                    )
+                    missed = result.scalars().all()
+            for praise in missed:
+                replayed.add(praise.id)
+                yield format_sse(_praise_event(praise))
+
+        while True:
+            event = await subscription.get(timeout=settings.SSE_HEARTBEAT_SECONDS)
+            if event is None:
+                if await _active_password_hash(tenant, teacher_id) != password_hash:
+                    logger.info(f"Поток SSE преподавателя {teacher_id} закрыт: доступ отозван")
+                    return
+                yield format_heartbeat()
+            elif event.id not in replayed:
+                yield format_sse(event)
+    finally:
+        hub.unsubscribe(subscription)
+
+
+@router.get("/praise/teacher/{teacher_id}/stream")
+async def stream_teacher_praise(
+    teacher_id: Annotated[schemas.ID, Path()],
+    request: Request,
+    current_teacher: models.Teacher = Depends(get_current_teacher),
+    db: AsyncSession = Depends(get_db),
+    last_event_id: Optional[schemas.ID] = Header(None, alias="Last-Event-ID"),
+):
+    """Поток новых благодарностей преподавателя (Server-Sent Events)"""
+    # Проверка авторизации
+    _check_inbox_access(current_teacher, teacher_id)
+
+    # Сессия нужна только для авторизации; не держим соединение с БД,
+    # пока открыт поток
+    await db.close()
+
+    return StreamingResponse(
+        _praise_event_stream(request.state.tenant, teacher_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
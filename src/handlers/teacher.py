@@ -1,25 +1,36 @@
-from typing import List
+from typing import Annotated, List
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, status
 from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+import cache
+import coalesce
 import models
 import schemas
 from config import logger
 from database import get_db
+from utils import TEACHERS_TAG
 
 router = APIRouter()
 # Teacher endpoints
 
 
 @router.get("/teachers", response_model=List[schemas.Teacher])
-async def get_teachers(db: AsyncSession = Depends(get_db)):
+@coalesce.single_flight(List[schemas.Teacher])
+@cache.cached(
+    key=lambda request, **_: cache.scoped(request.state.tenant, "teachers:list"),
+    tags=lambda request, **_: [cache.scoped(request.state.tenant, TEACHERS_TAG)],
+    model=List[schemas.Teacher],
+)
+async def get_teachers(request: Request, db: AsyncSession = Depends(get_db)):
     """Получение списка всех преподавателей"""
     try:
 
-        result = await db.execute(select(models.Teacher))
+        result = await db.execute(
+            select(models.Teacher).where(models.Teacher.deleted_at.is_(None))
+        )
         teachers = result.scalars().all()
         return teachers
     except SQLAlchemyError as e:
@@ -31,12 +42,26 @@ async def get_teachers(db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/teachers/{teacher_id}", response_model=schemas.Teacher)
-async def get_teacher(teacher_id: str, db: AsyncSession = Depends(get_db)):
+@coalesce.single_flight(schemas.Teacher)
+@cache.cached(
+    key=lambda teacher_id, request, **_: cache.scoped(
+        request.state.tenant, f"teacher:{teacher_id}"
+    ),
+    tags=lambda request, **_: [cache.scoped(request.state.tenant, TEACHERS_TAG)],
+    model=schemas.Teacher,
+)
+async def get_teacher(
+    teacher_id: Annotated[schemas.ID, Path()],
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+):
     """Получение информации о конкретном преподавателе"""
     try:
 
         result = await db.execute(
-            select(models.Teacher).where(models.Teacher.id == teacher_id)
+            select(models.Teacher).where(
+                models.Teacher.id == teacher_id, models.Teacher.deleted_at.is_(None)
+            )
         )
         teacher = result.scalar_one_or_none()
 
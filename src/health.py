@@ -0,0 +1,95 @@
+import asyncio
+import time
+from typing import Optional
+
+from sqlalchemy import text
+
+from config import settings
+from database import db_stats, get_engine, tenant_registry
+
+
+class HealthProbe:
+    """
+    Проверка БД с ограничением по времени и кешированием результата.
+    Частые запросы балансировщика и параллельные проверки разделяют
+    один результат, поэтому сами проверки не создают нагрузку
+    """
+
+    def __init__(self, ttl: float, timeout: float):
+        self.ttl = ttl
+        self.timeout = timeout
+        self._result: Optional[dict] = None
+        self._checked_at = 0.0
+        self._in_flight: Optional[asyncio.Task] = None
+
+    async def get(self) -> dict:
+        if self._result is not None and time.monotonic() - self._checked_at < self.ttl:
+            return self._result
+        if self._in_flight is None:
+            self._in_flight = asyncio.create_task(self._run())
+        try:
+            # shield: отмена одного запроса не прерывает общую проверку
+            return await asyncio.shield(self._in_flight)
+        finally:
+            if self._in_flight is not None and self._in_flight.done():
+                self._in_flight = None
+
+    async def _run(self) -> dict:
+        result = {
+            "database": await self._probe_database(),
+            "pool": self._pool_status(),
+            "sessions_in_use": db_stats.sessions_in_use,
+            "writer_queue_depth": db_stats.writes_in_flight,
+        }
+        database = result["database"]
+        if database["status"] != "ok":
+            result["status"] = "unhealthy"
+        elif (
+            database.get("latency_ms", 0) > settings.HEALTH_DEGRADED_LATENCY_MS
+            or db_stats.writes_in_flight > settings.HEALTH_MAX_WRITER_QUEUE
+        ):
+            result["status"] = "degraded"
+        else:
+            result["status"] = "ok"
+        self._result = result
+        self._checked_at = time.monotonic()
+        return result
+
+    async def _probe_database(self) -> dict:
+        if settings.TENANCY_ENABLED:
+            # БД школ открываются по запросу; проверять заранее нечего
+            return {"status": "ok", "tenant_databases": len(tenant_registry)}
+
+        started_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._select_one(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            return {"status": "timeout", "timeout_ms": self.timeout * 1000}
+        except Exception as e:
+            return {"status": "error", "error": str(e)}
+        latency_ms = (time.perf_counter() - started_at) * 1000
+        return {"status": "ok", "latency_ms": round(latency_ms, 2)}
+
+    @staticmethod
+    async def _select_one() -> None:
+        async with get_engine().connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    @staticmethod
+    def _pool_status() -> dict:
+        pool = get_engine().pool
+        status = {"class": type(pool).__name__}
+        # У NullPool нет ограничения размера: насыщение видно
+        # по sessions_in_use и writer_queue_depth
+        if hasattr(pool, "checkedout"):
+            status.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        return status
+
+
+probe = HealthProbe(
+    ttl=settings.HEALTH_CACHE_SECONDS, timeout=settings.HEALTH_PROBE_TIMEOUT_SECONDS
+)
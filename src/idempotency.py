@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from config import logger, settings
+from database import get_engine, sql_datetime
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+class IdempotencyConflict(Exception):
+    """Ключ уже сохранен в таблице параллельным запросом другого воркера"""
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    """Ответ на первый запрос с данным ключом"""
+
+    fingerprint: str
+    body: dict
+
+
+def fingerprint(payload: dict) -> str:
+    """Хеш тела запроса для сравнения повторов"""
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def scoped_key(tenant: Optional[str], key: str) -> str:
+    """Ключ в памяти: ключи разных школ не должны совпадать"""
+    return f"{tenant}:{key}" if tenant else key
+
+
+class IdempotencyStore:
+    """
+    Ограниченный LRU-кеш ответов с TTL и блокировками по ключу:
+    одновременные повторы ждут завершения первого запроса
+    и получают его ответ
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._holders: Dict[str, int] = {}
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, stored = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return stored
+
+    def put(self, key: str, stored: StoredResponse) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, stored)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._holders[key] = self._holders.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._holders[key] -= 1
+            if not self._holders[key]:
+                del self._holders[key]
+                del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+store = IdempotencyStore(
+    max_entries=settings.IDEMPOTENCY_CACHE_SIZE,
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+)
+
+
+def _cutoff() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+
+
+async def lookup(
+    db: AsyncSession, tenant: Optional[str], key: str
+) -> Optional[StoredResponse]:
+    """
+    Поиск сохраненного ответа: сначала в памяти, затем (при
+    IDEMPOTENCY_PERSIST) в таблице. Просроченная запись из таблицы
+    удаляется в той же транзакции, что и новый ответ
+    """
+    stored = store.get(scoped_key(tenant, key))
+    if stored is not None or not settings.IDEMPOTENCY_PERSIST:
+        return stored
+
+    row = await db.get(models.IdempotencyKey, key)
+    if row is None:
+        return None
+    if row.created_at.replace(tzinfo=timezone.utc) < _cutoff():
+        await db.execute(
+            delete(models.IdempotencyKey).where(models.IdempotencyKey.key == key)
+        )
+        db.expunge(row)
+        return None
+    stored = StoredResponse(row.fingerprint, json.loads(row.response))
+    store.put(scoped_key(tenant, key), stored)
+    return stored
+
+
+def record(db: AsyncSession, key: str, stored: StoredResponse) -> None:
+    """
+    Запись ответа в таблицу (при IDEMPOTENCY_PERSIST): строка
+    добавляется в сессию и коммитится вместе с благодарностью
+    """
+    if settings.IDEMPOTENCY_PERSIST:
+        db.add(
+            models.IdempotencyKey(
+                key=key,
+                fingerprint=stored.fingerprint,
+                response=json.dumps(stored.body, ensure_ascii=False),
+            )
+        )
+
+
+def remember(tenant: Optional[str], key: str, stored: StoredResponse) -> None:
+    """Запоминание ответа в памяти; вызывается после успешного коммита"""
+    store.put(scoped_key(tenant, key), stored)
+
+
+async def purge_expired(tenant: Optional[str] = None) -> int:
+    """Удаление просроченных ключей из таблицы idempotency_keys"""
+    table = models.IdempotencyKey.__table__
+    async with get_engine(tenant).begin() as conn:
+        result = await conn.execute(
+            delete(table).where(table.c.created_at < sql_datetime(_cutoff()))
+        )
+    if result.rowcount:
+        logger.info(f"Удалено просроченных ключей идемпотентности: {result.rowcount}")
+    return result.rowcount
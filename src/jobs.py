@@ -0,0 +1,424 @@
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import logger, settings
+
+JobHandler = Callable[..., Awaitable[Any]]
+
+# Обработчики по виду задачи и интервалы периодических задач
+HANDLERS: Dict[str, JobHandler] = {}
+RECURRING: Dict[str, float] = {}
+
+
+def job(kind: str, every: Optional[float] = None):
+    """
+    Регистрация обработчика задачи. Обработчик получает tenant и поля
+    payload именованными аргументами. every - интервал периодической
+    задачи: следующий запуск планируется после завершения предыдущего
+    """
+
+    def register(func: JobHandler) -> JobHandler:
+        HANDLERS[kind] = func
+        if every is not None:
+            RECURRING[kind] = every
+        return func
+
+    return register
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    tenant: Optional[str]
+    payload: Dict[str, Any]
+    attempts: int
+
+
+class JobQueue:
+    """
+    Очередь задач в отдельном файле SQLite (WAL), общая для воркеров
+    одной машины. Задача забирается одним UPDATE ... RETURNING, поэтому
+    два воркера не получат одну и ту же. У выполняемой задачи run_after -
+    срок аренды, который воркер продлевает, пока выполняет задачу: если
+    воркер упал, задача снова станет доступной
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            tenant TEXT,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            run_after REAL NOT NULL,
+            unique_key TEXT UNIQUE,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            finished_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS ix_jobs_status_run_after ON jobs (status, run_after);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = asyncio.Lock()
+
+    async def _connection(self):
+        if self._conn is None:
+            async with self._lock:
+                if self._conn is None:
+                    import aiosqlite
+
+                    conn = await aiosqlite.connect(self.path, isolation_level=None)
+                    await conn.execute("PRAGMA journal_mode=WAL")
+                    await conn.execute("PRAGMA synchronous=NORMAL")
+                    await conn.execute("PRAGMA busy_timeout=5000")
+                    await conn.executescript(self.SCHEMA)
+                    self._conn = conn
+        return self._conn
+
+    async def enqueue(
+        self,
+        kind: str,
+        tenant: Optional[str],
+        payload: Dict[str, Any],
+        delay: float = 0.0,
+        unique_key: Optional[str] = None,
+    ) -> Optional[int]:
+        """
+        Добавление задачи. С unique_key задача не добавляется, пока
+        предыдущая с тем же ключом не завершена; тогда возвращается None
+        """
+        conn = await self._connection()
+        now = time.time()
+        cursor = await conn.execute(
+            "INSERT OR IGNORE INTO jobs "
+            "(kind, tenant, payload, run_after, unique_key, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, tenant, json.dumps(payload), now + delay, unique_key, now),
+        )
+        return cursor.lastrowid if cursor.rowcount else None
+
+    async def claim(self, lease: float) -> Optional[Job]:
+        """Следующая готовая задача (или задача с истекшей арендой)"""
+        conn = await self._connection()
+        now = time.time()
+        async with conn.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, run_after = ? "
+            "WHERE id = ("
+            "  SELECT id FROM jobs WHERE status IN ('pending', 'running') "
+            "  AND run_after <= ? ORDER BY run_after LIMIT 1"
+            ") RETURNING id, kind, tenant, payload, attempts",
+            (now + lease, now),
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        return Job(row[0], row[1], row[2], json.loads(row[3]), row[4])
+
+    async def renew(self, job: Job, lease: float) -> bool:
+        """
+        Продление аренды выполняемой задачи. False, если задачу уже
+        забрал другой воркер (аренда успела истечь)
+        """
+        conn = await self._connection()
+        cursor = await conn.execute(
+            "UPDATE jobs SET run_after = ? "
+            "WHERE id = ? AND status = 'running' AND attempts = ?",
+            (time.time() + lease, job.id, job.attempts),
+        )
+        return cursor.rowcount > 0
+
+    async def complete(self, job: Job) -> None:
+        await self._finish(job, "done", None)
+
+    async def fail(self, job: Job, error: str) -> None:
+        await self._finish(job, "failed", error)
+
+    async def _finish(self, job: Job, status: str, error: Optional[str]) -> None:
+        # unique_key освобождается, чтобы можно было поставить следующую
+        conn = await self._connection()
+        await conn.execute(
+            "UPDATE jobs SET status = ?, last_error = ?, finished_at = ?, "
+            "unique_key = NULL WHERE id = ?",
+            (status, error, time.time(), job.id),
+        )
+
+    async def retry(self, job: Job, error: str, delay: float) -> None:
+        conn = await self._connection()
+        await conn.execute(
+            "UPDATE jobs SET status = 'pending', last_error = ?, run_after = ? WHERE id = ?",
+            (error, time.time() + delay, job.id),
+        )
+
+    async def release(self, job: Job) -> None:
+        """Возврат прерванной остановкой задачи без учета попытки"""
+        conn = await self._connection()
+        await conn.execute(
+            "UPDATE jobs SET status = 'pending', attempts = attempts - 1, run_after = ? "
+            "WHERE id = ?",
+            (time.time(), job.id),
+        )
+
+    async def purge_finished(self, older_than: float) -> int:
+        conn = await self._connection()
+        cursor = await conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (time.time() - older_than,),
+        )
+        return cursor.rowcount
+
+    async def stats(self, failed_limit: int = 20) -> dict:
+        conn = await self._connection()
+        async with conn.execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+        ) as cursor:
+            counts = dict(await cursor.fetchall())
+        async with conn.execute(
+            "SELECT id, kind, tenant, attempts, last_error, finished_at FROM jobs "
+            "WHERE status = 'failed' ORDER BY finished_at DESC LIMIT ?",
+            (failed_limit,),
+        ) as cursor:
+            columns = [column[0] for column in cursor.description]
+            failed = [dict(zip(columns, row)) for row in await cursor.fetchall()]
+        return {"counts": counts, "failed": failed}
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+
+def retry_delay(attempts: int) -> float:
+    """Экспоненциальная задержка перед повтором после attempts попыток"""
+    return min(
+        settings.JOBS_RETRY_BASE_SECONDS * 2 ** (attempts - 1),
+        settings.JOBS_RETRY_MAX_SECONDS,
+    )
+
+
+class JobRunner:
+    """
+    Воркеры задач внутри процесса приложения: не больше concurrency
+    задач одновременно. Новые задачи будят воркеров сразу, задачи
+    других процессов и отложенные повторы находятся опросом очереди
+    """
+
+    def __init__(self, queue: JobQueue, concurrency: int, poll_interval: float):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._workers: List["asyncio.Task"] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.active: Dict[int, str] = {}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self) -> None:
+        if self._workers:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        try:
+            removed = await self.queue.purge_finished(settings.JOBS_KEEP_FINISHED_SECONDS)
+            if removed:
+                logger.info(f"Удалено завершенных задач: {removed}")
+        except Exception as e:
+            logger.error(f"Очередь задач недоступна: {e}")
+        self._workers = [
+            asyncio.create_task(self._work(), name=f"job-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        logger.info(f"Запущено воркеров фоновых задач: {self.concurrency}")
+
+    def notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _idle(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _work(self) -> None:
+        while not self._stopping:
+            try:
+                job = await self.queue.claim(settings.JOBS_LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f"Очередь задач недоступна: {e}")
+                job = None
+            if job is None:
+                await self._idle()
+                continue
+            self.active[job.id] = job.kind
+            try:
+                await self._run(job)
+            except Exception as e:
+                logger.error(f"Не удалось обновить состояние задачи {job.id}: {e}")
+            finally:
+                self.active.pop(job.id, None)
+
+    async def _run(self, job: Job) -> None:
+        handler = HANDLERS.get(job.kind)
+        if handler is None:
+            await self.queue.fail(job, f"unknown job kind {job.kind}")
+            return
+        if job.attempts > settings.JOBS_MAX_ATTEMPTS:
+            # Аренда истекла на последней попытке (воркер упал)
+            await self._give_up(job, "lease expired on the last attempt")
+            return
+
+        keeper = asyncio.create_task(self._keep_lease(job))
+        try:
+            await handler(tenant=job.tenant, **job.payload)
+        except asyncio.CancelledError:
+            await self.queue.release(job)
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job.attempts >= settings.JOBS_MAX_ATTEMPTS:
+                await self._give_up(job, error)
+            else:
+                delay = retry_delay(job.attempts)
+                logger.warning(
+                    f"Задача {job.kind} #{job.id} (попытка {job.attempts}) "
+                    f"завершилась ошибкой, повтор через {delay:.0f} с: {error}"
+                )
+                await self.queue.retry(job, error, delay)
+            return
+        finally:
+            keeper.cancel()
+
+        await self.queue.complete(job)
+        await self._reschedule(job)
+
+    async def _keep_lease(self, job: Job) -> None:
+        """Продление аренды втрое чаще ее срока, пока выполняется задача"""
+        lease = settings.JOBS_LEASE_SECONDS
+        while True:
+            await asyncio.sleep(lease / 3)
+            try:
+                renewed = await self.queue.renew(job, lease)
+            except Exception as e:
+                logger.error(f"Не удалось продлить аренду задачи {job.id}: {e}")
+                continue
+            if not renewed:
+                logger.warning(f"Задача {job.kind} #{job.id} выполняется дольше аренды")
+                return
+
+    async def _give_up(self, job: Job, error: str) -> None:
+        logger.error(f"Задача {job.kind} #{job.id} отменена после {job.attempts} попыток: {error}")
+        await self.queue.fail(job, error)
+        await self._reschedule(job)
+
+    async def _reschedule(self, job: Job) -> None:
+        every = RECURRING.get(job.kind)
+        if every is not None:
+            await self.queue.enqueue(
+                job.kind,
+                job.tenant,
+                job.payload,
+                delay=every,
+                unique_key=_recurring_key(job.kind, job.tenant),
+            )
+
+    async def stop(self, drain_timeout: float) -> None:
+        """
+        Остановка: новые задачи не забираются, выполняемые получают
+        drain_timeout секунд; незавершенные возвращаются в очередь
+        """
+        if not self._workers:
+            return
+        self._stopping = True
+        self.notify()
+        _, pending = await asyncio.wait(self._workers, timeout=drain_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if pending:
+            logger.warning(f"Прервано задач при остановке: {len(pending)}")
+        self._workers = []
+        self._wakeup = None
+
+
+def _recurring_key(kind: str, tenant: Optional[str]) -> str:
+    return f"{tenant}:{kind}" if tenant else kind
+
+
+queue = JobQueue(settings.JOBS_SQLITE_PATH)
+runner = JobRunner(
+    queue, concurrency=settings.JOBS_CONCURRENCY, poll_interval=settings.JOBS_POLL_SECONDS
+)
+
+
+async def enqueue(
+    kind: str, tenant: Optional[str] = None, delay: float = 0.0, **payload: Any
+) -> Optional[int]:
+    """Постановка задачи в очередь; воркеры этого процесса будятся сразу"""
+    if kind not in HANDLERS:
+        raise KeyError(f"unknown job kind {kind}")
+    job_id = await queue.enqueue(kind, tenant, payload, delay=delay)
+    runner.notify()
+    return job_id
+
+
+async def schedule_recurring(tenant: Optional[str] = None) -> None:
+    """
+    Постановка периодических задач школы, если их еще нет в очереди.
+    Ошибка очереди не мешает работе с БД школы
+    """
+    try:
+        for kind in RECURRING:
+            await queue.enqueue(kind, tenant, {}, unique_key=_recurring_key(kind, tenant))
+    except Exception as e:
+        logger.error(f"Не удалось запланировать обслуживание: {e}")
+    runner.notify()
+
+
+# Задачи приложения
+@job("purge_teacher")
+async def _purge_teacher(tenant: Optional[str], teacher_id: str) -> None:
+    import purge
+
+    await purge.purge_teacher(teacher_id, tenant=tenant)
+
+
+@job("purge_deleted_teachers", every=settings.MAINTENANCE_INTERVAL_SECONDS)
+async def _purge_deleted_teachers(tenant: Optional[str]) -> None:
+    import purge
+
+    await purge.purge_deleted_teachers(tenant=tenant)
+
+
+@job("purge_refresh_tokens", every=settings.MAINTENANCE_INTERVAL_SECONDS)
+async def _purge_refresh_tokens(tenant: Optional[str]) -> None:
+    import purge
+
+    await purge.purge_expired_refresh_tokens(tenant)
+
+
+@job("purge_idempotency_keys", every=settings.MAINTENANCE_INTERVAL_SECONDS)
+async def _purge_idempotency_keys(tenant: Optional[str]) -> None:
+    import idempotency
+
+    await idempotency.purge_expired(tenant)
+
+
+@job("rollups_reconcile", every=settings.MAINTENANCE_INTERVAL_SECONDS)
+async def _rollups_reconcile(tenant: Optional[str]) -> None:
+    # Сверка последних суток исправляет расхождения, если запись
+    # в сводную таблицу когда-то не удалась
+    import rollups
+
+    await rollups.backfill(since_days=1, tenant=tenant)
@@ -0,0 +1,134 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException, status
+
+import auth
+from config import settings
+
+# Хеширование выполняется в отдельном пуле, а не в пуле asyncio.to_thread,
+# чтобы поток входов не занимал потоки остальных обработчиков
+hash_executor = ThreadPoolExecutor(
+    max_workers=settings.LOGIN_MAX_CONCURRENT_VERIFIES, thread_name_prefix="hash"
+)
+verify_semaphore = asyncio.Semaphore(settings.LOGIN_MAX_CONCURRENT_VERIFIES)
+
+
+async def run_hashing(func, *args):
+    """Выполнение функции хеширования в пуле хеширования"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hash_executor, func, *args)
+
+
+@asynccontextmanager
+async def verify_slot() -> AsyncIterator[None]:
+    """
+    Место для проверки пароля. Если за LOGIN_QUEUE_TIMEOUT_SECONDS место
+    не освободилось, запрос отклоняется с 503, а не копится в очереди
+    """
+    try:
+        await asyncio.wait_for(
+            verify_semaphore.acquire(), timeout=settings.LOGIN_QUEUE_TIMEOUT_SECONDS
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервер перегружен, повторите вход позже",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        yield
+    finally:
+        verify_semaphore.release()
+
+
+async def verify(plain_password: str, hashed_password: Optional[str]) -> bool:
+    """
+    Проверка пароля в пуле хеширования. Для неизвестного пользователя
+    (hashed_password=None) проверяется фиктивный хеш с теми же
+    параметрами, чтобы время ответа не выдавало существование логина
+    """
+    if hashed_password is None:
+        await run_hashing(auth.verify_password, plain_password, auth.dummy_hash())
+        return False
+    return await run_hashing(auth.verify_password, plain_password, hashed_password)
+
+
+@dataclass
+class _Failures:
+    first_at: float
+    count: int = 0
+    locked_until: float = 0.0
+
+
+class LockoutTracker:
+    """
+    Счетчики неудачных входов по логину в памяти процесса. После
+    max_failures ошибок за window секунд логин блокируется на lockout
+    секунд. Неизвестные логины учитываются так же, как существующие
+    """
+
+    def __init__(
+        self, max_failures: int, window: float, lockout: float, max_entries: int
+    ):
+        self.max_failures = max_failures
+        self.window = window
+        self.lockout = lockout
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Failures]" = OrderedDict()
+
+    def locked_for(self, key: str, now: Optional[float] = None) -> float:
+        """Сколько секунд логин еще заблокирован (0 - не заблокирован)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return 0.0
+        now = now if now is not None else time.monotonic()
+        return max(entry.locked_until - now, 0.0)
+
+    def failure(self, key: str, now: Optional[float] = None) -> None:
+        now = now if now is not None else time.monotonic()
+        entry = self._entries.get(key)
+        if entry is None or now - entry.first_at > self.window:
+            entry = _Failures(first_at=now)
+            self._entries[key] = entry
+        self._entries.move_to_end(key)
+        entry.count += 1
+        if entry.count >= self.max_failures:
+            entry.locked_until = now + self.lockout
+            entry.first_at = now
+            entry.count = 0
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def success(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+
+lockouts = LockoutTracker(
+    max_failures=settings.LOGIN_MAX_FAILURES,
+    window=settings.LOGIN_FAILURE_WINDOW_SECONDS,
+    lockout=settings.LOGIN_LOCKOUT_SECONDS,
+    max_entries=settings.LOGIN_TRACKED_USERNAMES,
+)
+
+
+def lockout_key(tenant: Optional[str], username: str) -> str:
+    key = username.lower()
+    return f"{tenant}:{key}" if tenant else key
+
+
+def check_lockout(key: str) -> None:
+    """429 без проверки пароля, пока логин заблокирован"""
+    remaining = lockouts.locked_for(key)
+    if remaining:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Слишком много неудачных попыток входа, повторите позже",
+            headers={"Retry-After": str(math.ceil(remaining))},
+        )
@@ -0,0 +1,555 @@
+import itertools
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    delete,
+    func,
+    inspect,
+    select,
+)
+from sqlalchemy.engine import Connection
+
+import models
+
+# Таблица учета примененных миграций живет вне Base.metadata,
+# чтобы create_all и служебные команды не трогали ее
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    Версионированная миграция. Шаги должны быть идемпотентными:
+    на новой БД create_all уже создал все объекты, и миграция
+    только отмечается примененной
+    """
+
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+def create_index(ddl: str) -> Callable[[Connection], None]:
+    """Шаг миграции: CREATE INDEX IF NOT EXISTS с зафиксированным текстом"""
+
+    def upgrade(conn: Connection) -> None:
+        conn.exec_driver_sql(ddl.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1))
+
+    return upgrade
+
+
+def drop_index(index_name: str) -> Callable[[Connection], None]:
+    """Шаг миграции: удаление индекса, если он есть"""
+
+    def upgrade(conn: Connection) -> None:
+        conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{index_name}"')
+
+    return upgrade
+
+
+def create_table(table: Table) -> Callable[[Connection], None]:
+    """Шаг миграции: создание зафиксированной таблицы вместе с ее индексами"""
+
+    def upgrade(conn: Connection) -> None:
+        table.create(conn, checkfirst=True)
+
+    return upgrade
+
+
+def add_column(table_name: str, column_name: str, ddl: str) -> Callable[[Connection], None]:
+    """Шаг миграции: добавление колонки, если ее еще нет"""
+
+    def upgrade(conn: Connection) -> None:
+        existing = {column["name"] for column in inspect(conn).get_columns(table_name)}
+        if column_name in existing:
+            return
+        conn.exec_driver_sql(f'ALTER TABLE "{table_name}" ADD COLUMN "{column_name}" {ddl}')
+
+    return upgrade
+
+
+def steps(*upgrades: Callable[[Connection], None]) -> Callable[[Connection], None]:
+    """Несколько шагов в одной миграции"""
+
+    def upgrade(conn: Connection) -> None:
+        for step in upgrades:
+            step(conn)
+
+    return upgrade
+
+
+# Таблицы в том виде, в каком их создали миграции. Схема не берется из
+# models: переименование или удаление там не должно менять уже выпущенные
+# миграции. Типы идентификаторов по-прежнему зависят от COMPACT_IDS
+frozen_metadata = MetaData()
+Table(
+    "teachers",
+    frozen_metadata,
+    Column("id", models.id_type(), primary_key=True),
+)
+idempotency_keys_v3 = Table(
+    "idempotency_keys",
+    frozen_metadata,
+    Column("key", String(255), primary_key=True),
+    Column("fingerprint", String(64), nullable=False),
+    Column("response", Text, nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Index("ix_idempotency_keys_created_at", "created_at"),
+)
+praise_rollups_v6 = Table(
+    "praise_rollups",
+    frozen_metadata,
+    Column("period", String(4), primary_key=True),
+    Column("bucket_start", DateTime, primary_key=True),
+    Column("teacher_id", models.id_type(), primary_key=True),
+    Column("praise_count", Integer, nullable=False),
+    Index(
+        "ix_praise_rollups_period_teacher_id_bucket_start",
+        "period",
+        "teacher_id",
+        "bucket_start",
+    ),
+)
+refresh_tokens_v7 = Table(
+    "refresh_tokens",
+    frozen_metadata,
+    Column("id", models.id_type(), primary_key=True),
+    Column(
+        "teacher_id",
+        models.id_type(),
+        ForeignKey("teachers.id", ondelete="CASCADE"),
+        nullable=False,
+    ),
+    Column("family_id", models.id_type(), nullable=False),
+    Column("token_hash", String(64), unique=True, nullable=False),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("expires_at", DateTime(timezone=True), nullable=False),
+    Column("revoked_at", DateTime(timezone=True), nullable=True),
+    Index("ix_refresh_tokens_family_id", "family_id"),
+    Index("ix_refresh_tokens_expires_at", "expires_at"),
+)
+
+# Индекс исходной схемы, замененный составным (teacher_id, created_at)
+_drop_teacher_id_index = drop_index("ix_praise_messages_teacher_id")
+
+
+def _create_rollups(conn: Connection) -> None:
+    """Создание сводной таблицы и заполнение ее по существующим сообщениям"""
+    import rollups
+
+    create_table(praise_rollups_v6)(conn)
+    for period in rollups.PERIOD_FORMATS:
+        rollups.backfill_period(conn, period)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1,
+        "praise_messages_teacher_id_created_at_index",
+        steps(
+            create_index(
+                "CREATE INDEX ix_praise_messages_teacher_id_created_at "
+                "ON praise_messages (teacher_id, created_at)"
+            ),
+            _drop_teacher_id_index,
+        ),
+    ),
+    Migration(
+        2,
+        "praise_messages_created_at_index",
+        create_index(
+            "CREATE INDEX ix_praise_messages_created_at ON praise_messages (created_at)"
+        ),
+    ),
+    Migration(3, "idempotency_keys_table", create_table(idempotency_keys_v3)),
+    Migration(
+        4,
+        "praise_messages_fingerprint",
+        add_column("praise_messages", "fingerprint", "VARCHAR(16)"),
+    ),
+    Migration(
+        5,
+        "praise_messages_is_flagged",
+        add_column("praise_messages", "is_flagged", "BOOLEAN DEFAULT '0' NOT NULL"),
+    ),
+    Migration(6, "praise_rollups_table", _create_rollups),
+    Migration(7, "refresh_tokens_table", create_table(refresh_tokens_v7)),
+    Migration(
+        8,
+        "teachers_subject_index",
+        create_index("CREATE INDEX ix_teachers_subject ON teachers (subject)"),
+    ),
+    Migration(
+        9,
+        "praise_messages_is_anonymous_created_at_index",
+        create_index(
+            "CREATE INDEX ix_praise_messages_is_anonymous_created_at "
+            "ON praise_messages (is_anonymous, created_at)"
+        ),
+    ),
+    Migration(
+        10,
+        "praise_messages_named_created_at_index",
+        create_index(
+            "CREATE INDEX ix_praise_messages_named_created_at "
+            "ON praise_messages (created_at) WHERE user_name IS NOT NULL"
+        ),
+    ),
+    Migration(
+        11,
+        "praise_messages_flagged_created_at_index",
+        create_index(
+            "CREATE INDEX ix_praise_messages_flagged_created_at "
+            "ON praise_messages (created_at) WHERE is_flagged = 1"
+        ),
+    ),
+    Migration(12, "teachers_deleted_at", add_column("teachers", "deleted_at", "DATETIME")),
+    Migration(
+        13,
+        "teachers_deleted_at_index",
+        create_index(
+            "CREATE INDEX ix_teachers_deleted_at "
+            "ON teachers (deleted_at) WHERE deleted_at IS NOT NULL"
+        ),
+    ),
+    # Для БД, где миграция 1 применена до того, как в нее добавили удаление
+    Migration(14, "praise_messages_teacher_id_index_drop", _drop_teacher_id_index),
+    Migration(
+        15,
+        "refresh_tokens_teacher_id_index",
+        create_index(
+            "CREATE INDEX ix_refresh_tokens_teacher_id ON refresh_tokens (teacher_id)"
+        ),
+    ),
+]
+
+
+def applied_versions(conn: Connection) -> Dict[int, str]:
+    migration_metadata.create_all(conn)
+    rows = conn.execute(select(schema_migrations.c.version, schema_migrations.c.name))
+    return {version: name for version, name in rows}
+
+
+def pending_migrations(conn: Connection) -> List[Migration]:
+    applied = applied_versions(conn)
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+def apply_pending(conn: Connection) -> List[Migration]:
+    """Применение непримененных миграций по порядку версий"""
+    applied = []
+    for migration in sorted(pending_migrations(conn), key=lambda m: m.version):
+        migration.upgrade(conn)
+        conn.execute(
+            schema_migrations.insert().values(
+                version=migration.version,
+                name=migration.name,
+                applied_at=datetime.now(timezone.utc),
+            )
+        )
+        applied.append(migration)
+    return applied
+
+
+def list_migrations(conn: Connection) -> List[dict]:
+    applied = {}
+    if inspect(conn).has_table("schema_migrations"):
+        for row in conn.execute(select(schema_migrations)):
+            applied[row.version] = row.applied_at
+    return [
+        {
+            "version": m.version,
+            "name": m.name,
+            "applied_at": applied.get(m.version),
+        }
+        for m in MIGRATIONS
+    ]
+
+
+def verify(conn: Connection) -> List[str]:
+    """
+    Проверка схемы: все миграции применены, имена совпадают,
+    а объявленные в models таблицы, колонки и индексы существуют в БД
+    """
+    problems = []
+    applied = applied_versions(conn)
+    known = {m.version: m for m in MIGRATIONS}
+    for version, name in sorted(applied.items()):
+        if version not in known:
+            problems.append(f"applied migration {version} ({name}) is unknown")
+        elif known[version].name != name:
+            problems.append(
+                f"migration {version} applied as {name}, defined as {known[version].name}"
+            )
+    for migration in MIGRATIONS:
+        if migration.version not in applied:
+            problems.append(f"migration {migration.version} ({migration.name}) is pending")
+
+    inspector = inspect(conn)
+    for table in models.Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            problems.append(f"table {table.name} is missing")
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                problems.append(f"column {table.name}.{column.name} is missing")
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                problems.append(f"index {index.name} is missing")
+    return problems
+
+
+# Проверка индексов по планам запросов
+@dataclass
+class PlannedQuery:
+    """
+    Запрос, который выполняют обработчики. full_scan_ok отмечает запросы,
+    которым полный просмотр таблицы нужен по смыслу (например, весь список),
+    temp_sort_ok - сортирующие уже небольшой результат (группы сводной таблицы)
+    """
+
+    name: str
+    build: Callable[[], object]
+    full_scan_ok: bool = False
+    temp_sort_ok: bool = False
+
+
+def _query(name: str, full_scan_ok: bool = False, temp_sort_ok: bool = False):
+    def register(build):
+        PLANNED_QUERIES.append(PlannedQuery(name, build, full_scan_ok, temp_sort_ok))
+        return build
+
+    return register
+
+
+PLANNED_QUERIES: List[PlannedQuery] = []
+
+_SAMPLE_ID = "00000000-0000-4000-8000-000000000000"
+_SAMPLE_TIME = datetime(2000, 1, 1, tzinfo=timezone.utc)
+# Поля praise_filters.PraiseFilters и значения для планов; у флагов
+# планируются оба значения - частичные индексы подходят только одному
+_PRAISE_FILTERS = {
+    "teacher_id": (_SAMPLE_ID,),
+    "subject": ("subject",),
+    "created_from": (_SAMPLE_TIME,),
+    "created_to": (_SAMPLE_TIME,),
+    "is_anonymous": (True, False),
+    "has_user_name": (True, False),
+    "is_flagged": (True, False),
+}
+
+
+@_query("teachers.list", full_scan_ok=True)
+def _teachers_list():
+    return select(models.Teacher).where(models.Teacher.deleted_at.is_(None))
+
+
+@_query("teachers.by_id")
+def _teachers_by_id():
+    return select(models.Teacher).where(
+        models.Teacher.id == _SAMPLE_ID, models.Teacher.deleted_at.is_(None)
+    )
+
+
+@_query("auth.login")
+def _auth_login():
+    return select(models.Teacher).where(
+        models.Teacher.username == "username", models.Teacher.deleted_at.is_(None)
+    )
+
+
+@_query("auth.refresh")
+def _auth_refresh():
+    return select(models.RefreshToken).where(models.RefreshToken.token_hash == "hash")
+
+
+@_query("auth.revoke_family")
+def _auth_revoke_family():
+    return (
+        models.RefreshToken.__table__.update()
+        .where(models.RefreshToken.family_id == _SAMPLE_ID)
+        .values(revoked_at=_SAMPLE_TIME)
+    )
+
+
+@_query("auth.revoke_teacher")
+def _auth_revoke_teacher():
+    import purge
+
+    return purge.revoke_refresh_tokens_statement(_SAMPLE_ID, _SAMPLE_TIME)
+
+
+@_query("auth.purge_refresh_tokens")
+def _auth_purge_refresh_tokens():
+    import purge
+
+    return purge.expired_refresh_tokens_statement(_SAMPLE_TIME)
+
+
+@_query("praise.inbox")
+def _praise_inbox():
+    return (
+        select(models.PraiseMessage)
+        .where(models.PraiseMessage.teacher_id == _SAMPLE_ID)
+        .order_by(models.PraiseMessage.created_at.desc())
+    )
+
+
+@_query("praise.inbox_since")
+def _praise_inbox_since():
+    return (
+        select(models.PraiseMessage)
+        .where(
+            models.PraiseMessage.teacher_id == _SAMPLE_ID,
+            models.PraiseMessage.created_at > _SAMPLE_TIME,
+        )
+        .order_by(models.PraiseMessage.created_at.desc())
+    )
+
+
+def _admin_praises(values):
+    def build():
+        from praise_filters import PraiseFilters, admin_praises_statement
+
+        return admin_praises_statement(PraiseFilters(**values))
+
+    return build
+
+
+def _filter_label(name: str, value) -> str:
+    return f"{name}={str(value).lower()}" if isinstance(value, bool) else name
+
+
+# Выгрузка администратора - по плану на каждое сочетание фильтров и значений
+for _count in range(len(_PRAISE_FILTERS) + 1):
+    for _active in itertools.combinations(_PRAISE_FILTERS, _count):
+        for _values in itertools.product(*(_PRAISE_FILTERS[name] for name in _active)):
+            _labels = ",".join(map(_filter_label, _active, _values))
+            _name = f"admin.praises[{_labels}]" if _active else "admin.praises"
+            _query(_name)(_admin_praises(dict(zip(_active, _values))))
+
+
+@_query("admin.stats_last_week")
+def _admin_stats_last_week():
+    import purge
+
+    return select(func.count()).where(
+        models.PraiseMessage.created_at >= _SAMPLE_TIME,
+        models.PraiseMessage.teacher_id.notin_(purge.deleted_teacher_ids()),
+    )
+
+
+@_query("purge.pending")
+def _purge_pending():
+    import purge
+
+    return purge.deleted_teacher_ids()
+
+
+@_query("purge.batch")
+def _purge_batch():
+    import purge
+
+    return purge.purge_batch_statement(_SAMPLE_ID, 500)
+
+
+@_query("admin.analytics", temp_sort_ok=True)
+def _admin_analytics():
+    import rollups
+
+    return rollups.analytics_statement(_SAMPLE_TIME, _SAMPLE_TIME)
+
+
+@_query("admin.analytics_teacher", temp_sort_ok=True)
+def _admin_analytics_teacher():
+    import rollups
+
+    return rollups.analytics_statement(
+        _SAMPLE_TIME, _SAMPLE_TIME, "week", teacher_id=_SAMPLE_ID
+    )
+
+
+@_query("idempotency.purge")
+def _idempotency_purge():
+    table = models.IdempotencyKey.__table__
+    return delete(table).where(table.c.created_at < _SAMPLE_TIME)
+
+
+def explain(conn: Connection, statement) -> List[str]:
+    """Строки EXPLAIN QUERY PLAN (SQLite) для выражения SQLAlchemy"""
+    compiled = statement.compile(
+        dialect=conn.dialect, compile_kwargs={"render_postcompile": True}
+    )
+    # План не зависит от значений параметров, поэтому подставляем NULL
+    params = tuple(None for _ in compiled.positiontup or ())
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+    return [row[-1] for row in rows]
+
+
+@dataclass
+class IndexReport:
+    plans: Dict[str, List[str]] = field(default_factory=dict)
+    full_scans: Dict[str, List[str]] = field(default_factory=dict)
+    temp_sorts: List[str] = field(default_factory=list)
+    unused_indexes: List[str] = field(default_factory=list)
+    missing_indexes: List[str] = field(default_factory=list)
+
+
+def has_schema(conn: Connection) -> bool:
+    """Таблицы моделей созданы (python cli.py migrate apply)"""
+    inspector = inspect(conn)
+    return all(inspector.has_table(table.name) for table in models.Base.metadata.sorted_tables)
+
+
+def check_indexes(
+    conn: Connection, queries: Optional[List[PlannedQuery]] = None
+) -> IndexReport:
+    """
+    Отчет по индексам: запросы обработчиков, читающие таблицу целиком
+    или сортирующие во временном B-дереве, индексы из models, отсутствующие в БД, и индексы БД,
+    не используемые ни одним планом
+    """
+    report = IndexReport()
+    for query in queries or PLANNED_QUERIES:
+        plan = explain(conn, query.build())
+        report.plans[query.name] = plan
+        scans = [line for line in plan if line.startswith("SCAN") and "USING" not in line]
+        if scans and not query.full_scan_ok:
+            report.full_scans[query.name] = scans
+        sorts = any(line.startswith("USE TEMP B-TREE") for line in plan)
+        if sorts and not query.temp_sort_ok:
+            report.temp_sorts.append(query.name)
+
+    inspector = inspect(conn)
+    used = " ".join(line for plan in report.plans.values() for line in plan)
+    for table in models.Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                report.missing_indexes.append(index.name)
+        for name in sorted(existing):
+            if f"INDEX {name} " not in used + " ":
+                report.unused_indexes.append(name)
+    return report
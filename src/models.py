@@ -1,46 +1,226 @@
+import os
+import time
 import uuid
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, String, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, true
+from sqlalchemy.types import TypeDecorator
+
+from config import settings
+
+
+def uuid7() -> uuid.UUID:
+    """UUID версии 7: 48 бит времени в мс и 74 случайных бита (RFC 9562)"""
+    timestamp_ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (timestamp_ms & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76
+    value |= (rand >> 62 & 0xFFF) << 64
+    value |= 0b10 << 62
+    value |= rand & 0x3FFF_FFFF_FFFF_FFFF
+    return uuid.UUID(int=value)
 
 
 def generate_uuid():
+    # UUIDv7 растут со временем, поэтому новые строки дописываются
+    # в конец B-дерева вместо вставки в случайные страницы
+    if settings.UUID_VERSION == 7:
+        return str(uuid7())
     return str(uuid.uuid4())
 
 
+class GUID(TypeDecorator):
+    """
+    Идентификатор UUID. В приложении всегда строка вида
+    xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx; в БД хранится как текст (36 байт)
+    или, при binary=True, как компактные 16 байт
+    """
+
+    impl = String(36)
+    cache_ok = True
+
+    def __init__(self, binary: bool = False):
+        super().__init__()
+        self.binary = binary
+
+    def load_dialect_impl(self, dialect):
+        if self.binary:
+            return dialect.type_descriptor(LargeBinary(16))
+        return dialect.type_descriptor(String(36))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or not self.binary:
+            return value
+        if isinstance(value, uuid.UUID):
+            return value.bytes
+        # Некорректный id - ошибка: любые 16 байт совпали бы с чужим ключом.
+        # Идентификаторы из запросов проверяются раньше (schemas.ID)
+        return uuid.UUID(value).bytes
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            return str(uuid.UUID(bytes=value))
+        return value
+
+
+def id_type() -> GUID:
+    """Тип колонок-идентификаторов с учетом настройки COMPACT_IDS"""
+    return GUID(binary=settings.COMPACT_IDS)
+
+
 Base = declarative_base()
 
 
 class Teacher(Base):
     __tablename__ = "teachers"
 
-    id = Column(String(36), primary_key=True, default=generate_uuid)
+    id = Column(id_type(), primary_key=True, default=generate_uuid)
     username = Column(String(50), unique=True, nullable=False, index=True)
     full_name = Column(String(100), nullable=False)
-    subject = Column(String(100), nullable=False)
+    # Фильтр выгрузки администратора по предмету
+    subject = Column(String(100), nullable=False, index=True)
     password_hash = Column(String(255), nullable=False)
     role = Column(String(20), default="teacher", nullable=False)
+    # Мягкое удаление: строка и ее благодарности удаляются позже
+    # порциями (purge.purge_deleted_teachers)
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
 
+    # passive_deletes: удаление преподавателя через ORM не загружает
+    # его благодарности - их заранее удаляет очистка
     praise_messages = relationship(
-        "PraiseMessage", back_populates="teacher", cascade="all, delete-orphan"
+        "PraiseMessage",
+        back_populates="teacher",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
+    __table_args__ = (
+        # Очередь очистки и исключение удаленных из счетчиков
+        Index(
+            "ix_teachers_deleted_at",
+            "deleted_at",
+            sqlite_where=deleted_at.isnot(None),
+        ),
+    )
+
+    @property
+    def is_active(self) -> bool:
+        return self.deleted_at is None
+
 
 class PraiseMessage(Base):
     __tablename__ = "praise_messages"
 
-    id = Column(String(36), primary_key=True, default=generate_uuid)
+    id = Column(id_type(), primary_key=True, default=generate_uuid)
     teacher_id = Column(
-        String(36),
+        id_type(),
         ForeignKey("teachers.id", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
     message = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     is_anonymous = Column(Boolean, default=True)
     user_name = Column(String(100), nullable=True)
+    # Хеш нормализованного текста (см. spam.fingerprint)
+    fingerprint = Column(String(16), nullable=True)
+    is_flagged = Column(Boolean, default=False, server_default="0", nullable=False)
 
     teacher = relationship("Teacher", back_populates="praise_messages")
+
+    # created_at (server_default) возвращается тем же INSERT ... RETURNING,
+    # без отдельного SELECT после коммита
+    __mapper_args__ = {"eager_defaults": True}
+
+    __table_args__ = (
+        # Лента преподавателя и инкрементальная синхронизация читают
+        # только свежий хвост по этому индексу
+        Index("ix_praise_messages_teacher_id_created_at", "teacher_id", "created_at"),
+        # Общая лента администратора и недельная статистика
+        Index("ix_praise_messages_created_at", "created_at"),
+        # Фильтры выгрузки администратора (praise_filters); частичные
+        # индексы покрывают редкие значения, частые читаются по created_at
+        Index("ix_praise_messages_is_anonymous_created_at", "is_anonymous", "created_at"),
+        Index(
+            "ix_praise_messages_named_created_at",
+            "created_at",
+            sqlite_where=user_name.isnot(None),
+        ),
+        Index(
+            "ix_praise_messages_flagged_created_at",
+            "created_at",
+            sqlite_where=is_flagged == true(),
+        ),
+    )
+
+
+class PraiseRollup(Base):
+    """
+    Число благодарностей преподавателю за час или сутки (UTC).
+    Поддерживается при записи и пересчитывается cli.py rollups backfill
+    """
+
+    __tablename__ = "praise_rollups"
+
+    period = Column(String(4), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    teacher_id = Column(id_type(), primary_key=True)
+    praise_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Динамика одного преподавателя; общая выборка по диапазону
+        # идет по первичному ключу (period, bucket_start, teacher_id)
+        Index(
+            "ix_praise_rollups_period_teacher_id_bucket_start",
+            "period",
+            "teacher_id",
+            "bucket_start",
+        ),
+    )
+
+
+class RefreshToken(Base):
+    """
+    Выданный refresh-токен. Хранится только HMAC токена; family_id
+    объединяет цепочку ротаций одного входа
+    """
+
+    __tablename__ = "refresh_tokens"
+
+    id = Column(id_type(), primary_key=True, default=generate_uuid)
+    teacher_id = Column(
+        id_type(),
+        ForeignKey("teachers.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    family_id = Column(id_type(), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class IdempotencyKey(Base):
+    """Сохраненный ответ POST /praise для повторов с тем же Idempotency-Key"""
+
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(255), primary_key=True)
+    # Хеш тела запроса: тот же ключ с другим телом - ошибка клиента
+    fingerprint = Column(String(64), nullable=False)
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
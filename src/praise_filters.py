@@ -0,0 +1,104 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import false, select, true
+from sqlalchemy.sql.elements import UnaryExpression
+from sqlalchemy.sql.operators import custom_op
+
+import models
+import schemas
+from database import sql_datetime
+
+
+@dataclass
+class PraiseFilters:
+    """
+    Фильтры выгрузки благодарностей администратора. Используется как
+    зависимость FastAPI: поля становятся параметрами запроса
+    """
+
+    teacher_id: Optional[schemas.ID] = None
+    subject: Optional[str] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    is_anonymous: Optional[bool] = None
+    has_user_name: Optional[bool] = None
+    is_flagged: Optional[bool] = None
+
+
+def _without_index(column):
+    """
+    Унарный плюс SQLite: колонка в условии не используется для поиска
+    по индексу, и план выбирается по остальным условиям и ORDER BY
+    """
+    return UnaryExpression(column, operator=custom_op("+"), type_=column.type)
+
+
+def praise_conditions(columns, filters: PraiseFilters) -> list:
+    """
+    Условия WHERE для колонок горячей таблицы или подзапроса с архивами.
+    Условия записаны так, чтобы SQLite мог использовать индексы
+    PraiseMessage: точное равенство teacher_id и is_anonymous, диапазон
+    created_at через datetime(?), а для частичных индексов - те же
+    выражения, что в их WHERE. Предмет проверяется при проходе по индексу
+    created_at: поиск по преподавателям предмета потребовал бы сортировки
+    всех их сообщений ради одной страницы
+    """
+    conditions = []
+    if filters.teacher_id is not None:
+        conditions.append(columns.teacher_id == filters.teacher_id)
+    if filters.subject is not None:
+        conditions.append(
+            _without_index(columns.teacher_id).in_(
+                select(models.Teacher.id).where(models.Teacher.subject == filters.subject)
+            )
+        )
+    if filters.created_from is not None:
+        conditions.append(columns.created_at >= sql_datetime(filters.created_from))
+    if filters.created_to is not None:
+        conditions.append(columns.created_at < sql_datetime(filters.created_to))
+    if filters.is_anonymous is not None:
+        conditions.append(columns.is_anonymous == filters.is_anonymous)
+    if filters.has_user_name is not None:
+        conditions.append(
+            columns.user_name.isnot(None)
+            if filters.has_user_name
+            else columns.user_name.is_(None)
+        )
+    if filters.is_flagged is not None:
+        # Литерал, а не параметр: иначе частичный индекс не применяется
+        conditions.append(columns.is_flagged == (true() if filters.is_flagged else false()))
+    return conditions
+
+
+def admin_praises_statement(
+    filters: PraiseFilters, limit: int = 100, offset: int = 0, source=None
+):
+    """
+    Страница благодарностей с именем и предметом преподавателя, новые
+    первыми. source - подзапрос с архивами (archive.praises_with_archive);
+    по умолчанию читается горячая таблица. Архив переживает удаление
+    преподавателя, поэтому с source преподаватель присоединяется внешним
+    соединением: у окончательно удаленных имя и предмет - NULL
+    """
+    if source is None:
+        statement = select(
+            models.PraiseMessage, models.Teacher.full_name, models.Teacher.subject
+        ).join(
+            models.Teacher,
+            (models.PraiseMessage.teacher_id == models.Teacher.id)
+            & models.Teacher.deleted_at.is_(None),
+        )
+        columns = models.PraiseMessage.__table__.c
+    else:
+        statement = select(
+            source, models.Teacher.full_name, models.Teacher.subject
+        ).outerjoin(models.Teacher, source.c.teacher_id == models.Teacher.id)
+        columns = source.c
+    return (
+        statement.where(*praise_conditions(columns, filters))
+        .order_by(columns.created_at.desc())
+        .limit(limit)
+        .offset(offset)
+    )
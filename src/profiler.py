@@ -0,0 +1,165 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Deque, List, Optional
+
+from config import logger, settings
+
+
+class ProfilerBusy(Exception):
+    """Выборка уже идет: одновременно выполняется только одна"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def stack_labels(frame) -> List[str]:
+    """Функции стека от корня к вершине"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class SamplingProfiler:
+    """
+    Выборочный профилировщик: отдельный поток каждые interval секунд
+    снимает стеки всех потоков процесса (sys._current_frames). Поток
+    выборки работает и тогда, когда цикл событий заблокирован
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def sample(self, duration: float, interval: float) -> Counter:
+        """Свернутые стеки "поток;f1;f2" с числом попаданий"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            own = threading.get_ident()
+            stacks: Counter = Counter()
+            deadline = time.monotonic() + duration
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    thread = names.get(ident, str(ident)).replace(";", "_")
+                    stacks[";".join([thread, *stack_labels(frame)])] += 1
+                time.sleep(interval)
+            return stacks
+        finally:
+            self._lock.release()
+
+
+def render_collapsed(stacks: Counter) -> str:
+    """Формат свернутых стеков для flamegraph.pl, speedscope и inferno"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+profiler = SamplingProfiler()
+
+
+class LoopLagMonitor:
+    """
+    Монитор задержки цикла событий. Задача в цикле обновляет отметку
+    каждые check секунд; сторожевой поток замечает, что отметка не
+    обновлялась дольше порога, и снимает стек потока цикла - то место,
+    где цикл занят синхронной работой
+    """
+
+    def __init__(self, threshold: float, check: float, history_size: int):
+        self.threshold = threshold
+        self.check = check
+        self.stalls = 0
+        self.max_lag_ms = 0.0
+        self.recent: Deque[dict] = deque(maxlen=history_size)
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        """Запуск из работающего цикла событий"""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-lag", daemon=True)
+        self._thread.start()
+
+    async def _beat(self) -> None:
+        while True:
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.check)
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stop.wait(self.check):
+            heartbeat = self._heartbeat
+            lag = time.monotonic() - heartbeat - self.check
+            if lag < self.threshold:
+                continue
+            lag_ms = lag * 1000
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if reported == heartbeat:
+                # Та же блокировка продолжается: обновляем ее длительность
+                self.recent[-1]["lag_ms"] = round(lag_ms, 1)
+                continue
+            reported = heartbeat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            self.recent.append(
+                {
+                    "at": datetime.now(timezone.utc).isoformat(),
+                    "lag_ms": round(lag_ms, 1),
+                    "stack": stack,
+                }
+            )
+            logger.warning(f"Цикл событий заблокирован дольше {lag_ms:.0f} мс:\n{stack}")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._stop.set()
+        await asyncio.to_thread(self._thread.join, self.check * 5)
+        self._task = None
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "threshold_ms": self.threshold * 1000,
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "recent": list(self.recent),
+        }
+
+
+loop_monitor = LoopLagMonitor(
+    threshold=settings.LOOP_LAG_THRESHOLD_MS / 1000,
+    check=settings.LOOP_LAG_CHECK_MS / 1000,
+    history_size=settings.LOOP_LAG_HISTORY_SIZE,
+)
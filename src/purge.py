@@ -0,0 +1,121 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.engine import Connection
+
+import models
+from config import logger, settings
+from database import get_engine, sql_datetime
+
+
+def deleted_teacher_ids():
+    """Подзапрос id мягко удаленных преподавателей (частичный индекс)"""
+    return select(models.Teacher.id).where(models.Teacher.deleted_at.isnot(None))
+
+
+def expired_refresh_tokens_statement(now: datetime):
+    """Refresh-токены с истекшим сроком (отозванные хранятся до него же)"""
+    table = models.RefreshToken.__table__
+    return delete(table).where(table.c.expires_at < sql_datetime(now))
+
+
+def revoke_refresh_tokens_statement(teacher_id: str, now: datetime):
+    """
+    Отзыв всех действующих refresh-токенов преподавателя (все семейства):
+    при смене пароля и удалении выданные ранее входы перестают работать
+    """
+    table = models.RefreshToken.__table__
+    return (
+        update(table)
+        .where(table.c.teacher_id == teacher_id, table.c.revoked_at.is_(None))
+        .values(revoked_at=now)
+    )
+
+
+def purge_batch_statement(teacher_id: str, batch_size: int):
+    """
+    Одна порция благодарностей преподавателя: DELETE ... WHERE id IN
+    (SELECT ... LIMIT) по индексу teacher_id_created_at
+    """
+    praises = models.PraiseMessage.__table__
+    return delete(praises).where(
+        praises.c.id.in_(
+            select(praises.c.id)
+            .where(praises.c.teacher_id == teacher_id)
+            .limit(batch_size)
+        )
+    )
+
+
+def purge_batch(conn: Connection, teacher_id: str, batch_size: int) -> int:
+    """Удаление одной порции внутри транзакции; возвращает число строк"""
+    return conn.execute(purge_batch_statement(teacher_id, batch_size)).rowcount
+
+
+def purge_teacher_row(conn: Connection, teacher_id: str) -> bool:
+    """
+    Удаление оставшихся зависимых строк и самого преподавателя.
+    Архивные таблицы полугодий не трогаются
+    """
+    for table in (models.PraiseRollup.__table__, models.RefreshToken.__table__):
+        conn.execute(delete(table).where(table.c.teacher_id == teacher_id))
+    teachers = models.Teacher.__table__
+    result = conn.execute(
+        delete(teachers).where(
+            teachers.c.id == teacher_id, teachers.c.deleted_at.isnot(None)
+        )
+    )
+    return result.rowcount > 0
+
+
+async def purge_teacher(
+    teacher_id: str, batch_size: Optional[int] = None, tenant: Optional[str] = None
+) -> int:
+    """
+    Окончательное удаление мягко удаленного преподавателя: благодарности
+    порциями, каждая - отдельная короткая транзакция, чтобы не держать
+    блокировку записи SQLite. Прерванная очистка продолжается со следующего
+    запуска. Возвращает число удаленных благодарностей
+    """
+    size = batch_size or settings.PURGE_BATCH_SIZE
+    engine = get_engine(tenant)
+    removed = 0
+    while True:
+        async with engine.begin() as conn:
+            count = await conn.run_sync(purge_batch, teacher_id, size)
+        removed += count
+        if count < size:
+            break
+
+    async with engine.begin() as conn:
+        purged = await conn.run_sync(purge_teacher_row, teacher_id)
+    if purged:
+        logger.info(f"Преподаватель {teacher_id} удален, благодарностей: {removed}")
+    return removed
+
+
+async def purge_deleted_teachers(
+    batch_size: Optional[int] = None, tenant: Optional[str] = None
+) -> Dict[str, int]:
+    """Очистка всех мягко удаленных преподавателей школы"""
+    async with get_engine(tenant).connect() as conn:
+        teacher_ids: List[str] = (await conn.execute(deleted_teacher_ids())).scalars().all()
+    return {
+        teacher_id: await purge_teacher(teacher_id, batch_size, tenant)
+        for teacher_id in teacher_ids
+    }
+
+
+async def purge_expired_refresh_tokens(tenant: Optional[str] = None) -> int:
+    """
+    Удаление истекших refresh-токенов. Отозванные токены нужны до
+    истечения срока: по ним распознается повторное использование
+    """
+    async with get_engine(tenant).begin() as conn:
+        result = await conn.execute(
+            expired_refresh_tokens_statement(datetime.now(timezone.utc))
+        )
+    if result.rowcount:
+        logger.info(f"Удалено истекших refresh-токенов: {result.rowcount}")
+    return result.rowcount
@@ -0,0 +1,214 @@
+import bisect
+import hashlib
+import re
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Deque, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import logger, settings
+
+# Верхние границы интервалов гистограммы, мс; последний - все остальное
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(statement: str) -> str:
+    """
+    SQL без значений: литералы заменяются на ?, раскрытые списки IN
+    сворачиваются в (?, ...), пробелы схлопываются
+    """
+    text = _LITERAL.sub("?", statement)
+    text = _IN_LIST.sub("IN (?, ...)", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+
+
+@dataclass
+class StatementStats:
+    """Число выполнений и распределение времени одного запроса"""
+
+    fingerprint: str
+    statement: str
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(BUCKETS_MS) + 1))
+    plan: Optional[List[str]] = None
+
+    def add(self, elapsed_ms: float) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+
+    def percentile(self, q: float) -> float:
+        """Оценка перцентиля сверху: граница интервала гистограммы"""
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS + (None,), self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return self.max_ms if bound is None else min(bound, self.max_ms)
+        return self.max_ms
+
+    def as_dict(self) -> dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "statement": self.statement,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.5), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "p99_ms": round(self.percentile(0.99), 3),
+            "max_ms": round(self.max_ms, 3),
+            "histogram": dict(
+                zip([f"le_{bound}" for bound in BUCKETS_MS] + ["inf"], self.buckets)
+            ),
+            "plan": self.plan,
+        }
+
+
+class QueryStats:
+    """
+    Статистика SQL-запросов процесса по отпечаткам нормализованного
+    текста. Хранится не больше max_statements запросов (LRU);
+    медленные запросы дополнительно попадают в журнал с планом
+    """
+
+    def __init__(self, max_statements: int, slow_ms: float, slow_log_size: int):
+        self.max_statements = max_statements
+        self.slow_ms = slow_ms
+        self._stats: "OrderedDict[str, StatementStats]" = OrderedDict()
+        # Нормализация по сырому тексту: SQLAlchemy повторяет одни и те же строки
+        self._fingerprints: "OrderedDict[str, tuple]" = OrderedDict()
+        self.slow_log: Deque[dict] = deque(maxlen=slow_log_size)
+        self.started_at = datetime.now(timezone.utc)
+
+    def _identify(self, statement: str) -> tuple:
+        known = self._fingerprints.get(statement)
+        if known is None:
+            normalized = normalize(statement)
+            known = self._fingerprints[statement] = (fingerprint(normalized), normalized)
+            while len(self._fingerprints) > self.max_statements * 4:
+                self._fingerprints.popitem(last=False)
+        return known
+
+    def record(self, statement: str, elapsed_ms: float) -> StatementStats:
+        key, normalized = self._identify(statement)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = StatementStats(key, normalized)
+            while len(self._stats) > self.max_statements:
+                self._stats.popitem(last=False)
+        self._stats.move_to_end(key)
+        stats.add(elapsed_ms)
+        return stats
+
+    def record_slow(self, stats: StatementStats, elapsed_ms: float) -> None:
+        self.slow_log.append(
+            {
+                "at": datetime.now(timezone.utc).isoformat(),
+                "fingerprint": stats.fingerprint,
+                "statement": stats.statement,
+                "elapsed_ms": round(elapsed_ms, 3),
+                "plan": stats.plan,
+            }
+        )
+        plan = "; ".join(stats.plan or ())
+        logger.warning(
+            f"Медленный запрос {elapsed_ms:.1f} мс [{stats.fingerprint}]: "
+            f"{stats.statement} | план: {plan}"
+        )
+
+    def top(self, limit: int = 20, order_by: str = "total_ms") -> List[dict]:
+        items = [stats.as_dict() for stats in self._stats.values()]
+        items.sort(key=lambda item: item[order_by], reverse=True)
+        return items[:limit]
+
+    def reset(self) -> None:
+        self._stats.clear()
+        self.slow_log.clear()
+        self.started_at = datetime.now(timezone.utc)
+
+
+query_stats = QueryStats(
+    max_statements=settings.QUERY_STATS_MAX_STATEMENTS,
+    slow_ms=settings.SLOW_QUERY_MS,
+    slow_log_size=settings.SLOW_QUERY_LOG_SIZE,
+)
+
+_NOT_EXPLAINABLE = (
+    "EXPLAIN",
+    "PRAGMA",
+    "BEGIN",
+    "COMMIT",
+    "ROLLBACK",
+    "SAVEPOINT",
+    "RELEASE",
+)
+
+
+def _explain(conn, statement: str, parameters, executemany: bool) -> Optional[List[str]]:
+    """
+    EXPLAIN QUERY PLAN (SQLite) отдельным курсором того же соединения,
+    минуя события движка, чтобы не учитывать сам EXPLAIN
+    """
+    if conn.dialect.name != "sqlite" or statement.lstrip().upper().startswith(
+        _NOT_EXPLAINABLE
+    ):
+        return None
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    try:
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            return [row[-1] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+
+
+# Время меряется в потоке событийного цикла. С aiosqlite запрос выполняется
+# в потоке драйвера, а между событиями цикл успевает выполнить другие задачи,
+# поэтому в замер входит и ожидание цикла: при перегруженном цикле (см.
+# GET /admin/loop-lag) быстрые запросы тоже выглядят медленными
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = getattr(context, "_query_started_at", None)
+    if started_at is None:
+        return
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    stats = query_stats.record(statement, elapsed_ms)
+    if elapsed_ms >= query_stats.slow_ms:
+        if stats.plan is None:
+            stats.plan = _explain(conn, statement, parameters, executemany)
+        query_stats.record_slow(stats, elapsed_ms)
+
+
+def install() -> None:
+    """Подписка на события всех движков, включая БД школ"""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+if settings.QUERY_STATS_ENABLED:
+    install()
@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from sqlalchemy import DateTime, func, literal, select, type_coerce
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import archive
+import models
+from config import logger
+from database import get_engine, sql_datetime
+
+# Формат начала интервала в том же текстовом виде, что и CURRENT_TIMESTAMP
+PERIOD_FORMATS = {"hour": "%Y-%m-%d %H:00:00", "day": "%Y-%m-%d 00:00:00"}
+GRANULARITIES = ("hour", "day", "week", "month")
+
+
+def _bucket(period: str, created_at):
+    return func.strftime(PERIOD_FORMATS[period], created_at)
+
+
+async def record_praise(db: AsyncSession, teacher_id: str, created_at: datetime) -> None:
+    """
+    Учет новой благодарности в часовом и суточном интервалах одним
+    INSERT ... ON CONFLICT DO UPDATE в транзакции обработчика
+    """
+    table = models.PraiseRollup.__table__
+    statement = sqlite_insert(table).values(
+        [
+            {
+                "period": period,
+                "bucket_start": _bucket(period, created_at),
+                "teacher_id": teacher_id,
+                "praise_count": 1,
+            }
+            for period in PERIOD_FORMATS
+        ]
+    )
+    await db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[table.c.period, table.c.bucket_start, table.c.teacher_id],
+            set_={"praise_count": table.c.praise_count + 1},
+        )
+    )
+
+
+async def forget_praise(db: AsyncSession, teacher_id: str, created_at: datetime) -> None:
+    """Вычитание удаленной благодарности из ее интервалов"""
+    table = models.PraiseRollup.__table__
+    for period in PERIOD_FORMATS:
+        await db.execute(
+            table.update()
+            .where(
+                table.c.period == period,
+                table.c.bucket_start == _bucket(period, created_at),
+                table.c.teacher_id == teacher_id,
+            )
+            .values(praise_count=table.c.praise_count - 1)
+        )
+
+
+def backfill_period(conn: Connection, period: str, since: Optional[datetime] = None) -> int:
+    """
+    Пересчет интервалов одного периода по горячей таблице и архивам
+    начиная с суток, содержащих since (по умолчанию - все). Отмеченные
+    как спам сообщения не учитываются. Возвращает число интервалов
+    """
+    table = models.PraiseRollup.__table__
+    praises = archive.praises_with_archive(archive.archive_sources(conn))
+    bucket = _bucket(period, praises.c.created_at)
+
+    source_conditions = [praises.c.is_flagged.isnot(True)]
+    rollup_conditions = [table.c.period == period]
+    if since is not None:
+        day_start = sql_datetime(since.replace(hour=0, minute=0, second=0, microsecond=0))
+        source_conditions.append(praises.c.created_at >= day_start)
+        rollup_conditions.append(table.c.bucket_start >= day_start)
+
+    conn.execute(table.delete().where(*rollup_conditions))
+    result = conn.execute(
+        table.insert().from_select(
+            ["period", "bucket_start", "teacher_id", "praise_count"],
+            select(literal(period), bucket, praises.c.teacher_id, func.count())
+            .where(*source_conditions)
+            .group_by(bucket, praises.c.teacher_id),
+        )
+    )
+    return result.rowcount
+
+
+async def backfill(
+    since_days: Optional[int] = None,
+    tenant: Optional[str] = None,
+    since: Optional[datetime] = None,
+) -> Dict[str, int]:
+    """
+    Пересчет сводных таблиц за последние since_days дней или начиная
+    с момента since; каждый период - отдельная транзакция
+    """
+    if since is None and since_days is not None:
+        since = datetime.now(timezone.utc) - timedelta(days=since_days)
+
+    engine = get_engine(tenant)
+    totals = {}
+    for period in PERIOD_FORMATS:
+        async with engine.begin() as conn:
+            totals[period] = await conn.run_sync(backfill_period, period, since)
+    logger.info(f"Пересчитаны сводные интервалы благодарностей: {totals}")
+    return totals
+
+
+def analytics_statement(
+    start: datetime,
+    end: datetime,
+    granularity: str = "day",
+    group_by: str = "teacher",
+    teacher_id: Optional[str] = None,
+    subject: Optional[str] = None,
+):
+    """
+    Запрос динамики по сводной таблице: часы читаются из часовых
+    интервалов, сутки/недели/месяцы - из суточных. Недели начинаются
+    с понедельника; все интервалы в UTC
+    """
+    rollup = models.PraiseRollup
+    teacher = models.Teacher
+    period = "hour" if granularity == "hour" else "day"
+
+    if granularity in ("hour", "day"):
+        bucket = rollup.bucket_start
+    elif granularity == "week":
+        bucket = type_coerce(
+            func.strftime(
+                "%Y-%m-%d 00:00:00",
+                func.date(rollup.bucket_start, "-6 days", "weekday 1"),
+            ),
+            DateTime,
+        )
+    else:
+        bucket = type_coerce(func.strftime("%Y-%m-01 00:00:00", rollup.bucket_start), DateTime)
+
+    if group_by == "teacher":
+        keys = (rollup.teacher_id, teacher.full_name)
+    else:
+        keys = (teacher.subject, teacher.subject)
+
+    statement = (
+        select(
+            keys[0].label("key"),
+            keys[1].label("label"),
+            bucket.label("bucket"),
+            func.sum(rollup.praise_count).label("count"),
+        )
+        .join(teacher, teacher.id == rollup.teacher_id)
+        .where(
+            rollup.period == period,
+            rollup.bucket_start >= sql_datetime(start),
+            rollup.bucket_start < sql_datetime(end),
+            rollup.praise_count > 0,
+            teacher.deleted_at.is_(None),
+        )
+        .group_by(keys[0], bucket)
+        .order_by(keys[0], bucket)
+    )
+    if teacher_id is not None:
+        statement = statement.where(rollup.teacher_id == teacher_id)
+    if subject is not None:
+        statement = statement.where(teacher.subject == subject)
+    return statement
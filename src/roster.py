@@ -0,0 +1,103 @@
+import asyncio
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+
+import auth
+from config import ROLE_ADMIN, ROLE_TEACHER
+
+ROSTER_VERSION = 1
+
+
+def checksum(entries: List[dict]) -> str:
+    """Контрольная сумма записей: обрезанный или измененный файл не загрузится"""
+    canonical = json.dumps(entries, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def load_roster(path: str) -> List[dict]:
+    """
+    Чтение файла состава с готовыми хешами паролей (cli.py build-roster).
+    Пароли открытым текстом не принимаются
+    """
+    with open(path, encoding="utf-8") as source:
+        manifest = json.load(source)
+    if manifest.get("version") != ROSTER_VERSION:
+        raise ValueError(f"{path}: unsupported roster version {manifest.get('version')}")
+    entries = manifest["entries"]
+    if manifest.get("checksum") != checksum(entries):
+        raise ValueError(f"{path}: checksum mismatch")
+    for entry in entries:
+        if "password" in entry or not entry.get("password_hash"):
+            raise ValueError(f"{path}: {entry.get('username')} has no password hash")
+    return entries
+
+
+async def read_roster(path: str) -> List[dict]:
+    """Чтение и проверка файла состава вне цикла событий"""
+    return await asyncio.to_thread(load_roster, path)
+
+
+def iter_source(path: str) -> Iterator[dict]:
+    """
+    Записи исходного состава с паролями: .json вида
+    {"admins": [...], "teachers": [...]} или .csv/.ndjson с колонкой role
+    """
+    if os.path.splitext(path)[1].lower() == ".json":
+        with open(path, encoding="utf-8") as source:
+            sections = json.load(source)
+        for role, key in ((ROLE_ADMIN, "admins"), (ROLE_TEACHER, "teachers")):
+            for record in sections.get(key, []):
+                yield {**record, "role": role}
+        return
+
+    from bulk import iter_records
+
+    for record in iter_records(path):
+        yield {**record, "role": record.get("role") or ROLE_TEACHER}
+
+
+def build_roster(source_path: str, output_path: str, workers: Optional[int] = None) -> int:
+    """
+    Сборка файла состава: пароли хешируются параллельно (argon2 отпускает
+    GIL) текущими параметрами ARGON2_*, открытый текст в результат не
+    попадает. Файл записывается атомарно; возвращает число записей
+    """
+    records = list(iter_source(source_path))
+    usernames = [record["username"] for record in records]
+    duplicates = sorted({name for name in usernames if usernames.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"{source_path}: duplicate usernames {', '.join(duplicates)}")
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        hashes = list(
+            executor.map(
+                lambda record: record.get("password_hash")
+                or auth.get_password_hash(record["password"]),
+                records,
+            )
+        )
+
+    entries = [
+        {
+            "username": record["username"],
+            "full_name": record["full_name"],
+            "subject": record["subject"],
+            "role": record["role"],
+            "password_hash": password_hash,
+        }
+        for record, password_hash in zip(records, hashes)
+    ]
+    manifest = {"version": ROSTER_VERSION, "checksum": checksum(entries), "entries": entries}
+
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as target:
+        json.dump(manifest, target, ensure_ascii=False, indent=2)
+        target.write("\n")
+    os.replace(tmp_path, output_path)
+    return len(entries)
@@ -1,8 +1,26 @@
 import re
+import uuid
 from datetime import datetime
-from typing import Optional
+from typing import Annotated, List, Optional
 
-from pydantic import BaseModel, EmailStr, Field, validator
+from pydantic import (
+    AfterValidator,
+    BaseModel,
+    EmailStr,
+    Field,
+    field_validator,
+    model_validator,
+)
+
+
+def _check_id(value: str) -> str:
+    # Некорректный id отклоняется до обращения к БД (422), остальные
+    # приводятся к каноническому виду, как их хранит текстовый режим
+    return str(uuid.UUID(value))
+
+
+# Идентификатор из пути, параметров запроса или заголовков
+ID = Annotated[str, AfterValidator(_check_id)]
 
 
 class Role:
@@ -54,6 +72,9 @@ class Teacher(TeacherBase):
 
 
 # Praise schemas
+FORBIDDEN_MESSAGE_CHARS = re.compile(r"[<>{}[\]]")
+
+
 class PraiseMessageBase(BaseModel):
     message: str = Field(
         ...,
@@ -66,27 +87,30 @@ class PraiseMessageBase(BaseModel):
         None, min_length=2, max_length=100, description="Имя отправителя"
     )
 
-    @validator("message")
-    def validate_message(cls, v):
-        # Проверка на недопустимые символы
-        if re.search(r"[<>{}[\]]", v):
-            raise ValueError("Сообщение содержит недопустимые символы")
-        return v.strip()
-
-    @validator("user_name")
-    def validate_user_name(cls, v, values):
-        if not values.get("is_anonymous") and not v:
-            raise ValueError("Имя отправителя обязательно для неанонимных сообщений")
-        return v
-
 
 class PraiseMessageCreate(PraiseMessageBase):
     teacher_id: str = Field(
         ...,
         description="ID преподавателя",
-        pattern=r"^[a-f0-9]{8}-[a-f0-9]{4}-4[a-f0-9]{3}-[89ab][a-f0-9]{3}-[a-f0-9]{12}$",
+        pattern=r"^[a-f0-9]{8}-[a-f0-9]{4}-[47][a-f0-9]{3}-[89ab][a-f0-9]{3}-[a-f0-9]{12}$",
     )
 
+    # Проверки выполняются только на входе: ответы строятся из строк БД,
+    # которые уже прошли валидацию при создании
+    @field_validator("message")
+    @classmethod
+    def validate_message(cls, v: str) -> str:
+        # Проверка на недопустимые символы
+        if FORBIDDEN_MESSAGE_CHARS.search(v):
+            raise ValueError("Сообщение содержит недопустимые символы")
+        return v.strip()
+
+    @model_validator(mode="after")
+    def validate_user_name(self) -> "PraiseMessageCreate":
+        if not self.is_anonymous and not self.user_name:
+            raise ValueError("Имя отправителя обязательно для неанонимных сообщений")
+        return self
+
 
 class PraiseMessage(PraiseMessageBase):
     id: str
@@ -98,13 +122,22 @@ class PraiseMessage(PraiseMessageBase):
 
 
 class PraiseMessageDetail(PraiseMessage):
-    teacher_full_name: str
-    teacher_subject: str
+    # None у архивных сообщений окончательно удаленных преподавателей
+    teacher_full_name: Optional[str]
+    teacher_subject: Optional[str]
+    # None у строк старых архивов, созданных до появления колонки
+    is_flagged: Optional[bool] = False
 
     class Config:
         from_attributes = True
 
 
+class PraiseInboxSummary(BaseModel):
+    total: int
+    unread: int
+    latest_created_at: Optional[datetime] = None
+
+
 # Admin schemas
 class AdminStats(BaseModel):
     total_teachers: int
@@ -112,6 +145,26 @@ class AdminStats(BaseModel):
     praises_last_week: int
 
 
+class AnalyticsPoint(BaseModel):
+    bucket: datetime
+    count: int
+
+
+class AnalyticsSeries(BaseModel):
+    key: str
+    label: str
+    total: int
+    points: List[AnalyticsPoint]
+
+
+class PraiseAnalytics(BaseModel):
+    granularity: str
+    group_by: str
+    start: datetime
+    end: datetime
+    series: List[AnalyticsSeries]
+
+
 # Auth schemas
 class LoginCredentials(BaseModel):
     username: str = Field(..., min_length=3, max_length=50)
@@ -121,6 +174,16 @@ class LoginCredentials(BaseModel):
 class LoginResponse(BaseModel):
     teacher: Teacher
     token: str
+    refresh_token: str
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str = Field(..., min_length=20, max_length=200)
+
+
+class TokenPair(BaseModel):
+    token: str
+    refresh_token: str
 
 
 class TokenData(BaseModel):
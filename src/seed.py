@@ -0,0 +1,52 @@
+import os
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import models
+from config import ROLE_ADMIN, logger, settings
+from database import get_db_context
+from roster import read_roster
+
+
+async def seed_database(tenant: Optional[str] = None):
+    """
+    Создание преподавателей и администраторов из файла состава.
+    Хеши паролей посчитаны заранее (python cli.py build-roster), поэтому
+    при запуске ничего не хешируется; все строки - один INSERT
+    """
+    if not os.path.exists(settings.ROSTER_PATH):
+        logger.warning(f"Файл состава {settings.ROSTER_PATH} не найден, заполнение пропущено")
+        return
+    entries = await read_roster(settings.ROSTER_PATH)
+
+    async with get_db_context(tenant) as db:
+        # Проверяем существующих преподавателей
+        result = await db.execute(select(models.Teacher.id).limit(1))
+        has_teachers = result.first() is not None
+        if has_teachers:
+            # Только недостающие администраторы
+            entries = [entry for entry in entries if entry["role"] == ROLE_ADMIN]
+        else:
+            logger.info("Нет преподавателей, создаем тестовые данные...")
+
+        if not entries:
+            return
+        rows = [
+            {
+                "id": models.generate_uuid(),
+                "username": entry["username"],
+                "full_name": entry["full_name"],
+                "subject": entry["subject"],
+                "role": entry["role"],
+                "password_hash": entry["password_hash"],
+            }
+            for entry in entries
+        ]
+        statement = sqlite_insert(models.Teacher.__table__).on_conflict_do_nothing(
+            index_elements=["username"]
+        )
+        result = await db.execute(statement, rows)
+        await db.commit()
+        logger.info(f"Создано учетных записей из файла состава: {result.rowcount}")
@@ -0,0 +1,283 @@
+import hashlib
+import re
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, select, tuple_, update
+
+import models
+import rollups
+from config import logger, settings
+from database import get_engine, sql_datetime
+
+_NON_WORD = re.compile(r"[\W_]+")
+_SIMHASH_BITS = 64
+# Расстояние Хэмминга <= 3 между 64-битными отпечатками гарантирует
+# совпадение хотя бы одной из четырех 16-битных полос
+_BANDS = 4
+_BAND_BITS = _SIMHASH_BITS // _BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+def normalize(text: str) -> str:
+    """Текст без регистра, пунктуации и лишних пробелов"""
+    text = text.lower().replace("ё", "е")
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def _digest(normalized: str) -> str:
+    return hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+
+
+def fingerprint(text: str) -> str:
+    """Хеш нормализованного текста: одинаков для точных копий"""
+    return _digest(normalize(text))
+
+
+@lru_cache(maxsize=32768)
+def _hash64(token: str) -> int:
+    # Триграмм в живом тексте немного, поэтому их хеши кешируются
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big")
+
+
+def _simhash(normalized: str) -> int:
+    shingles = {normalized[i : i + 3] for i in range(max(len(normalized) - 2, 1))}
+    # Бит отпечатка установлен, если он установлен у большинства триграмм;
+    # столбцы битов считаются через zip вместо цикла по 64 битам
+    rows = [format(_hash64(shingle), "064b") for shingle in shingles]
+    value = 0
+    for column in zip(*rows):
+        value = value << 1 | (2 * column.count("1") > len(rows))
+    return value
+
+
+def simhash(text: str) -> int:
+    """
+    64-битный simhash по триграммам символов нормализованного текста:
+    у похожих текстов отличается лишь несколько бит
+    """
+    return _simhash(normalize(text))
+
+
+def _bands(value: int) -> List[Tuple[int, int]]:
+    return [(band, value >> (band * _BAND_BITS) & _BAND_MASK) for band in range(_BANDS)]
+
+
+@dataclass(frozen=True)
+class Verdict:
+    """Результат проверки сообщения; simhash None у коротких сообщений"""
+
+    fingerprint: str
+    simhash: Optional[int]
+    duplicates: int
+    is_spam: bool
+
+
+class _Cluster:
+    """Группа похожих сообщений окна: отпечаток первого и число сообщений"""
+
+    __slots__ = ("simhash", "count")
+
+    def __init__(self, simhash: int):
+        self.simhash = simhash
+        self.count = 0
+
+
+class SlidingWindow:
+    """
+    Окно недавних сообщений. Похожие сообщения сводятся в группы со
+    счетчиком, индекс по полосам simhash хранит группы, а не сообщения:
+    во время волны копий проверка касается одной группы, а не тысяч записей
+    """
+
+    def __init__(self, window_seconds: float, max_entries: int):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._entries: Deque[Tuple[float, _Cluster]] = deque()
+        self._buckets: Dict[Tuple[int, int], Dict[int, _Cluster]] = defaultdict(dict)
+
+    def _evict(self, now: float) -> None:
+        while self._entries and (
+            self._entries[0][0] <= now - self.window_seconds
+            or len(self._entries) > self.max_entries
+        ):
+            _, cluster = self._entries.popleft()
+            cluster.count -= 1
+            if cluster.count:
+                continue
+            for key in _bands(cluster.simhash):
+                bucket = self._buckets[key]
+                del bucket[cluster.simhash]
+                if not bucket:
+                    del self._buckets[key]
+
+    def _similar(self, value: int, max_distance: int) -> Dict[int, _Cluster]:
+        clusters: Dict[int, _Cluster] = {}
+        for key in _bands(value):
+            for simhash, cluster in self._buckets.get(key, {}).items():
+                if bin(simhash ^ value).count("1") <= max_distance:
+                    clusters[simhash] = cluster
+        return clusters
+
+    def count_similar(self, value: int, max_distance: int, now: float) -> int:
+        self._evict(now)
+        return sum(cluster.count for cluster in self._similar(value, max_distance).values())
+
+    def add(self, value: int, max_distance: int, now: float) -> None:
+        clusters = self._similar(value, max_distance)
+        if clusters:
+            cluster = min(
+                clusters.values(), key=lambda c: bin(c.simhash ^ value).count("1")
+            )
+        else:
+            cluster = _Cluster(value)
+            for key in _bands(value):
+                self._buckets[key][value] = cluster
+        cluster.count += 1
+        self._entries.append((now, cluster))
+        self._evict(now)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SpamDetector:
+    """
+    Поиск волн одинаковых сообщений: текст считается спамом, если за
+    SPAM_WINDOW_SECONDS уже было SPAM_DUPLICATE_LIMIT похожих сообщений
+    (любым преподавателям). Короткие благодарности вроде «Спасибо!»
+    естественно повторяются и не проверяются
+    """
+
+    def __init__(
+        self,
+        window_seconds: float,
+        duplicate_limit: int,
+        max_distance: int,
+        min_length: int,
+        max_entries: int,
+    ):
+        self.window_seconds = window_seconds
+        self.duplicate_limit = duplicate_limit
+        self.max_distance = max_distance
+        self.min_length = min_length
+        self.max_entries = max_entries
+        self._windows: Dict[Optional[str], SlidingWindow] = {}
+
+    def _window(self, tenant: Optional[str]) -> SlidingWindow:
+        window = self._windows.get(tenant)
+        if window is None:
+            window = SlidingWindow(self.window_seconds, self.max_entries)
+            self._windows[tenant] = window
+        return window
+
+    def check(
+        self, message: str, tenant: Optional[str] = None, now: Optional[float] = None
+    ) -> Verdict:
+        """Проверка без запоминания; до записи в БД"""
+        normalized = normalize(message)
+        digest = _digest(normalized)
+        if len(normalized) < self.min_length:
+            return Verdict(digest, None, 0, False)
+        value = _simhash(normalized)
+        now = now if now is not None else datetime.now(timezone.utc).timestamp()
+        duplicates = self._window(tenant).count_similar(value, self.max_distance, now)
+        return Verdict(digest, value, duplicates, duplicates >= self.duplicate_limit)
+
+    def observe(
+        self, verdict: Verdict, tenant: Optional[str] = None, now: Optional[float] = None
+    ) -> None:
+        """Учет принятого сообщения в окне"""
+        if verdict.simhash is None:
+            return
+        now = now if now is not None else datetime.now(timezone.utc).timestamp()
+        self._window(tenant).add(verdict.simhash, self.max_distance, now)
+
+
+def make_detector() -> SpamDetector:
+    return SpamDetector(
+        window_seconds=settings.SPAM_WINDOW_SECONDS,
+        duplicate_limit=settings.SPAM_DUPLICATE_LIMIT,
+        max_distance=settings.SPAM_SIMHASH_DISTANCE,
+        min_length=settings.SPAM_MIN_LENGTH,
+        max_entries=settings.SPAM_WINDOW_MAX_ENTRIES,
+    )
+
+
+detector = make_detector()
+
+
+async def rescan(
+    since_days: Optional[int] = None,
+    batch_size: int = 1000,
+    tenant: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Повторная проверка сохраненных сообщений тем же детектором
+    в порядке создания: заполняет fingerprint у старых строк и
+    отмечает is_flagged у найденных волн. Каждая порция читается
+    и обновляется в отдельной короткой транзакции; затем сводные
+    интервалы пересчитываются с первого отмеченного сообщения
+    """
+    table = models.PraiseMessage.__table__
+    conditions = []
+    if since_days is not None:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=since_days)
+        conditions.append(table.c.created_at >= sql_datetime(cutoff))
+
+    scanner = make_detector()
+    engine = get_engine(tenant)
+    totals = {"scanned": 0, "fingerprinted": 0, "flagged": 0}
+    last = None
+    first_flagged = None
+    while True:
+        statement = select(
+            table.c.id, table.c.message, table.c.created_at, table.c.fingerprint
+        ).where(*conditions)
+        if last is not None:
+            last_created_at, last_id = last
+            statement = statement.where(
+                tuple_(table.c.created_at, table.c.id)
+                > tuple_(sql_datetime(last_created_at), last_id)
+            )
+        statement = statement.order_by(table.c.created_at, table.c.id).limit(batch_size)
+
+        async with engine.begin() as conn:
+            rows = (await conn.execute(statement)).all()
+            fingerprints, flagged = [], []
+            for praise_id, message, created_at, stored_fingerprint in rows:
+                now = created_at.replace(tzinfo=timezone.utc).timestamp()
+                verdict = scanner.check(message, now=now)
+                scanner.observe(verdict, now=now)
+                if stored_fingerprint is None:
+                    fingerprints.append({"_id": praise_id, "_fp": verdict.fingerprint})
+                if verdict.is_spam:
+                    flagged.append(praise_id)
+                    first_flagged = first_flagged or created_at
+            if fingerprints:
+                await conn.execute(
+                    update(table)
+                    .where(table.c.id == bindparam("_id"))
+                    .values(fingerprint=bindparam("_fp")),
+                    fingerprints,
+                )
+            if flagged:
+                await conn.execute(
+                    update(table).where(table.c.id.in_(flagged)).values(is_flagged=True)
+                )
+
+        totals["scanned"] += len(rows)
+        totals["fingerprinted"] += len(fingerprints)
+        totals["flagged"] += len(flagged)
+        if len(rows) < batch_size:
+            break
+        last = (rows[-1].created_at, rows[-1].id)
+
+    if totals["flagged"]:
+        logger.warning(f"Повторная проверка отметила сообщений как спам: {totals['flagged']}")
+        # Аналитика не должна учитывать спам, который уже исключен из статистики
+        await rollups.backfill(tenant=tenant, since=first_flagged)
+    return totals
@@ -0,0 +1,32 @@
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from config import logger
+
+
+class StartupReport:
+    """Длительность фаз запуска воркера и флаг готовности к трафику"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+
+    def record(self, name: str, started_at: float) -> None:
+        self.phases[name] = round((time.perf_counter() - started_at) * 1000, 1)
+
+    @contextmanager
+    def phase(self, name: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, started_at)
+
+    def log(self) -> None:
+        total = sum(self.phases.values())
+        lines = [f"{duration:>10.1f} ms | {name}" for name, duration in self.phases.items()]
+        logger.info("Фазы запуска:\n" + "\n".join(lines) + f"\n{total:>10.1f} ms | total")
+
+
+startup = StartupReport()
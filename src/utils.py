@@ -1,25 +1,59 @@
-from fastapi import Depends, HTTPException, status
-from sqlalchemy import select
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
+import cache
 import models
+import schemas
 from auth import get_token, verify_token
 from config import ROLE_ADMIN, logger
 from database import get_db
 
+# Теги кеша, сбрасываемые изменениями в админке
+TEACHERS_TAG = "teachers"
+PRAISES_TAG = "praises"
+
+
+@cache.cached(
+    # Свой ключ: запись GET /teachers/{id} восстанавливается другой функцией load
+    key=lambda tenant, teacher_id, **_: cache.scoped(
+        tenant, f"auth-teacher:{teacher_id}"
+    ),
+    tags=lambda tenant, **_: [cache.scoped(tenant, TEACHERS_TAG)],
+    model=schemas.Teacher,
+    load=lambda data: models.Teacher(**data),
+    # Удаление преподавателя в одном воркере должно сразу действовать во всех
+    shared_only=True,
+)
+async def _load_teacher(
+    tenant: Optional[str], teacher_id: str, db: AsyncSession
+) -> Optional[models.Teacher]:
+    """
+    Преподаватель по id. Из кеша возвращается объект вне сессии
+    с полями schemas.Teacher (без хеша пароля). Удаленный преподаватель
+    не возвращается и не кешируется; кеш в памяти процесса не используется,
+    иначе другие воркеры принимали бы его токены до истечения TTL
+    """
+    teacher = await db.get(models.Teacher, teacher_id)
+    if teacher is None or not teacher.is_active:
+        return None
+    return teacher
+
 
 # Dependency to get current teacher
 async def get_current_teacher(
-    token: str = Depends(get_token), db: AsyncSession = Depends(get_db)
+    request: Request,
+    token: str = Depends(get_token),
+    db: AsyncSession = Depends(get_db),
 ):
     """Получение текущего аутентифицированного преподавателя"""
     try:
-        teacher_id = verify_token(token)
+        teacher_id = verify_token(token, request.state.tenant)
 
-        result = await db.execute(
-            select(models.Teacher).where(models.Teacher.id == teacher_id)
+        teacher = await _load_teacher(
+            tenant=request.state.tenant, teacher_id=teacher_id, db=db
         )
-        teacher = result.scalar_one_or_none()
 
         if not teacher:
             raise HTTPException(
@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+
+import pytest
+
+# Настройки читаются при импорте config, поэтому окружение задается до импорта app
+_workdir = tempfile.mkdtemp(prefix="praise-tests-")
+os.environ.update(
+    {
+        "SECRET_KEY": "test-secret",
+        "ALLOWED_ORIGIN": "*",
+        "DATABASE_URL": f"sqlite+aiosqlite:///{_workdir}/test.db",
+        # Тестовый состав со своими паролями собирается в фикстуре roster
+        "ROSTER_PATH": f"{_workdir}/roster.json",
+        # Кеш скрыл бы запросы к БД, фоновые задачи - добавили бы свои
+        "CACHE_BACKEND": "none",
+        "JOBS_ENABLED": "false",
+        "JOBS_SQLITE_PATH": f"{_workdir}/jobs.db",
+        "QUERY_STATS_ENABLED": "false",
+    }
+)
+
+ADMIN = {"username": "test_admin", "password": "admin-password"}
+TEACHER = {"username": "test_teacher", "password": "teacher-password"}
+
+
+@pytest.fixture(scope="session")
+def roster() -> str:
+    from config import settings
+    from roster import build_roster
+
+    source = os.path.join(_workdir, "roster-source.json")
+    with open(source, "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "admins": [
+                    {**ADMIN, "full_name": "Тестовый Администратор", "subject": "Директор"}
+                ],
+                "teachers": [
+                    {**TEACHER, "full_name": "Тестовый Преподаватель", "subject": "История"},
+                    {
+                        "username": "test_colleague",
+                        "password": "colleague-password",
+                        "full_name": "Тестовый Коллега",
+                        "subject": "Математика",
+                    },
+                ],
+            },
+            file,
+        )
+    build_roster(source, settings.ROSTER_PATH)
+    return settings.ROSTER_PATH
+
+
+@pytest.fixture(scope="session")
+def client(roster):
+    from fastapi.testclient import TestClient
+
+    import app
+
+    with TestClient(app.app) as client:
+        yield client
+
+
+def _login(client, credentials) -> dict:
+    response = client.post("/auth/login", json=credentials)
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+@pytest.fixture(scope="session")
+def admin_headers(client) -> dict:
+    return _login(client, ADMIN)
+
+
+@pytest.fixture(scope="session")
+def teacher_headers(client) -> dict:
+    return _login(client, TEACHER)
+
+
+@pytest.fixture(scope="session")
+def teacher_id(client) -> str:
+    teachers = client.get("/teachers").json()
+    return next(t["id"] for t in teachers if t["username"] == TEACHER["username"])
+
+
+@pytest.fixture
+def tenant_databases(tmp_path, monkeypatch):
+    """БД школ во временном каталоге теста"""
+    from config import settings
+
+    monkeypatch.setattr(
+        settings, "TENANT_DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path}/{{tenant}}.db"
+    )
@@ -0,0 +1,23 @@
+import pytest
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"start": "2026-01-01T00:00:00"},
+        {"start": "2026-01-01T00:00:00", "end": "2026-02-01T00:00:00+03:00"},
+        {"end": "2026-02-01T00:00:00"},
+    ],
+)
+def test_naive_and_aware_bounds(client, admin_headers, params):
+    response = client.get("/admin/analytics", headers=admin_headers, params=params)
+    assert response.status_code == 200, response.text
+
+
+def test_start_after_end(client, admin_headers):
+    response = client.get(
+        "/admin/analytics",
+        headers=admin_headers,
+        params={"start": "2026-02-01T00:00:00", "end": "2026-01-01T00:00:00Z"},
+    )
+    assert response.status_code == 400
@@ -0,0 +1,85 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import select
+
+import archive
+import bulk
+import models
+from database import create_tables, get_engine
+
+ARCHIVED_ID = "0b6f3c1e-2f44-4e55-8a6e-1c9d2e7f5a30"
+FLAGGED_ID = "5e0d8a44-9b1f-4c2e-b7a3-6f8e2d1c0b99"
+
+
+@pytest.fixture
+def tenants(tenant_databases):
+    return "export_source", "export_target"
+
+
+async def _teacher_database(tenant: str) -> None:
+    engine = get_engine(tenant)
+    await create_tables(engine)
+    async with engine.begin() as conn:
+        await conn.execute(
+            models.Teacher.__table__.insert().values(
+                id=models.generate_uuid(),
+                username="exported",
+                full_name="Выгружаемый Преподаватель",
+                subject="История",
+                password_hash="hash",
+            )
+        )
+
+
+async def _source_database(tenant: str) -> None:
+    await _teacher_database(tenant)
+    praises = models.PraiseMessage.__table__
+    async with get_engine(tenant).begin() as conn:
+        teacher_id = await conn.scalar(select(models.Teacher.id))
+        await conn.execute(
+            praises.insert(),
+            [
+                {
+                    "id": ARCHIVED_ID,
+                    "teacher_id": teacher_id,
+                    "message": "Спасибо за прошлый год!",
+                    "created_at": datetime(2024, 10, 1),
+                    "is_flagged": False,
+                },
+                {
+                    "id": FLAGGED_ID,
+                    "teacher_id": teacher_id,
+                    "message": "Спасибо за уроки!",
+                    "created_at": datetime(2025, 3, 1),
+                    "is_flagged": True,
+                },
+            ],
+        )
+        await conn.run_sync(
+            archive.archive_batch, datetime(2025, 1, 1, tzinfo=timezone.utc), 100
+        )
+
+
+async def _flags(tenant: str) -> dict:
+    async with get_engine(tenant).connect() as conn:
+        praises = models.PraiseMessage.__table__
+        result = await conn.execute(select(praises.c.id, praises.c.is_flagged))
+        return dict(result.all())
+
+
+def test_export_includes_archive_and_moderation(client, tenants, tmp_path):
+    source, target = tenants
+    path = str(tmp_path / "praises.ndjson")
+
+    client.portal.call(_source_database, source)
+    assert client.portal.call(bulk.export_praises, path, source) == 2
+    with open(path, encoding="utf-8") as file:
+        exported = {record["id"]: record for record in map(json.loads, file)}
+    assert set(exported) == {ARCHIVED_ID, FLAGGED_ID}
+    assert exported[FLAGGED_ID]["is_flagged"] is True
+
+    client.portal.call(_teacher_database, target)
+    assert client.portal.call(bulk.import_praises, path, 2000, 50000, False, target) == 2
+    assert client.portal.call(_flags, target) == {ARCHIVED_ID: False, FLAGGED_ID: True}
@@ -0,0 +1,79 @@
+import asyncio
+
+import cache
+
+
+def _counting(**options):
+    calls = []
+
+    @cache.cached(key=lambda value, **_: f"value:{value}", **options)
+    async def load(value: int) -> int:
+        calls.append(value)
+        return value
+
+    return load, calls
+
+
+def test_memory_backend_caches(monkeypatch):
+    monkeypatch.setattr(cache, "backend", cache.MemoryCache(10))
+    load, calls = _counting()
+    for _ in range(3):
+        assert asyncio.run(load(value=1)) == 1
+    assert calls == [1]
+
+
+def test_shared_only_skips_process_cache(monkeypatch):
+    monkeypatch.setattr(cache, "backend", cache.MemoryCache(10))
+    load, calls = _counting(shared_only=True)
+    for _ in range(3):
+        assert asyncio.run(load(value=1)) == 1
+    assert calls == [1, 1, 1]
+
+
+def test_shared_only_uses_shared_backend(monkeypatch, tmp_path):
+    backend = cache.SQLiteCache(str(tmp_path / "cache.db"))
+    monkeypatch.setattr(cache, "backend", backend)
+    load, calls = _counting(shared_only=True)
+
+    async def run():
+        try:
+            for _ in range(3):
+                assert await load(value=1) == 1
+        finally:
+            await backend.close()
+
+    asyncio.run(run())
+    assert calls == [1]
+
+
+def test_new_praise_refreshes_admin_stats(client, admin_headers, teacher_id, monkeypatch):
+    monkeypatch.setattr(cache, "backend", cache.MemoryCache(100))
+    before = client.get("/admin/stats", headers=admin_headers).json()["total_praises"]
+    response = client.post(
+        "/praise", json={"teacher_id": teacher_id, "message": "Спасибо за помощь с проектом!"}
+    )
+    assert response.status_code == 200, response.text
+    after = client.get("/admin/stats", headers=admin_headers).json()["total_praises"]
+    assert after == before + 1
+
+
+def test_auth_and_public_teacher_entries_are_separate(
+    client, teacher_headers, teacher_id, tmp_path, monkeypatch
+):
+    backend = cache.SQLiteCache(str(tmp_path / "cache.db"))
+    monkeypatch.setattr(cache, "backend", backend)
+    try:
+        assert client.get(f"/teachers/{teacher_id}").status_code == 200
+        # Аутентификация по тому же id не читает запись публичного эндпоинта
+        response = client.get(f"/praise/teacher/{teacher_id}", headers=teacher_headers)
+        assert response.status_code == 200, response.text
+        keys = client.portal.call(_cache_keys, backend)
+        assert {f"teacher:{teacher_id}", f"auth-teacher:{teacher_id}"} <= keys
+    finally:
+        client.portal.call(backend.close)
+
+
+async def _cache_keys(backend) -> set:
+    conn = await backend._connection()
+    async with conn.execute("SELECT key FROM cache_entries") as cursor:
+        return {row[0] for row in await cursor.fetchall()}
@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+from sqlalchemy import func, select
+from starlette.requests import Request
+
+import coalesce
+import models
+from database import get_sessionmaker
+
+
+def _request() -> Request:
+    request = Request({"type": "http", "path": "/coalesce", "query_string": b"", "headers": []})
+    request.state.tenant = None
+    return request
+
+
+async def _leader_cancelled() -> tuple:
+    started = asyncio.Event()
+    sessions = []
+
+    @coalesce.single_flight(int)
+    async def handler(request: Request, db):
+        sessions.append(db)
+        started.set()
+        await asyncio.sleep(0.05)
+        return await db.scalar(select(func.count()).select_from(models.Teacher))
+
+    sessionmaker = await get_sessionmaker()
+    async with sessionmaker() as leader_db, sessionmaker() as follower_db:
+        leader = asyncio.ensure_future(handler(request=_request(), db=leader_db))
+        await started.wait()
+        follower = asyncio.ensure_future(handler(request=_request(), db=follower_db))
+        await asyncio.sleep(0)
+        # Клиент первого запроса отключился: get_db закрывает его сессию
+        leader.cancel()
+        await leader_db.close()
+        response = await follower
+        return sessions, (leader_db, follower_db), json.loads(response.body)
+
+
+def test_shared_call_uses_its_own_session(client):
+    sessions, request_sessions, count = client.portal.call(_leader_cancelled)
+    assert len(sessions) == 1
+    assert sessions[0] not in request_sessions
+    assert count > 0
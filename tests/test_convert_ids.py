@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+import archive
+import models
+from database import convert_id_storage, create_tables, make_engine
+
+TEACHER_ID = "7d1d6a58-6d2a-4b39-9a57-3f0f4c2b8e11"
+PRAISE_ID = "0b6f3c1e-2f44-4e55-8a6e-1c9d2e7f5a30"
+
+
+async def _archived_database(path) -> object:
+    engine = make_engine(f"sqlite+aiosqlite:///{path}")
+    await create_tables(engine)
+    async with engine.begin() as conn:
+        await conn.execute(
+            models.Teacher.__table__.insert().values(
+                id=TEACHER_ID,
+                username="archived",
+                full_name="Архивный Преподаватель",
+                subject="История",
+                password_hash="hash",
+            )
+        )
+        await conn.execute(
+            models.PraiseMessage.__table__.insert().values(
+                id=PRAISE_ID,
+                teacher_id=TEACHER_ID,
+                message="Спасибо за уроки!",
+                created_at=datetime(2024, 10, 1),
+            )
+        )
+        moved = await conn.run_sync(
+            archive.archive_batch, datetime(2025, 1, 1, tzinfo=timezone.utc), 100
+        )
+    assert moved == {"2024_1": 1}
+    return engine
+
+
+async def _archived_ids(engine) -> list:
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text(
+                "SELECT a.id, a.teacher_id, t.id FROM praise_messages_archive_2024_1 a "
+                "JOIN teachers t ON t.id = a.teacher_id"
+            )
+        )
+        return result.all()
+
+
+def test_convert_ids_includes_archive_tables(tmp_path):
+    async def run():
+        engine = await _archived_database(tmp_path / "convert.db")
+        try:
+            await convert_id_storage(binary=True, target_engine=engine)
+            [(praise_id, teacher_id, joined)] = await _archived_ids(engine)
+            assert isinstance(praise_id, bytes) and len(praise_id) == 16
+            assert teacher_id == joined
+
+            await convert_id_storage(binary=False, target_engine=engine)
+            assert await _archived_ids(engine) == [(PRAISE_ID, TEACHER_ID, TEACHER_ID)]
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import select, update
+from starlette.requests import Request
+
+import models
+from conftest import TEACHER
+from database import get_db, get_db_context
+
+
+async def _forget_commit(statement) -> None:
+    """Обработчик, выполнивший запись без commit()"""
+    dependency = get_db(Request({"type": "http", "headers": []}))
+    db = await dependency.__anext__()
+    await db.execute(statement)
+    with pytest.raises(StopAsyncIteration):
+        await dependency.__anext__()
+
+
+async def _full_name() -> str:
+    async with get_db_context() as db:
+        return await db.scalar(
+            select(models.Teacher.full_name).where(
+                models.Teacher.username == TEACHER["username"]
+            )
+        )
+
+
+def test_get_db_commits_forgotten_core_dml(client):
+    original = client.portal.call(_full_name)
+    rename = (
+        update(models.Teacher)
+        .where(models.Teacher.username == TEACHER["username"])
+        .values(full_name="Переименованный Преподаватель")
+    )
+    client.portal.call(_forget_commit, rename)
+    try:
+        assert client.portal.call(_full_name) == "Переименованный Преподаватель"
+    finally:
+        restore = rename.values(full_name=original)
+        client.portal.call(_forget_commit, restore)
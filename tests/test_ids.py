@@ -0,0 +1,23 @@
+import uuid
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    "form",
+    [
+        lambda value: value.upper(),
+        lambda value: "{" + value + "}",
+        lambda value: f"urn:uuid:{value}",
+        lambda value: uuid.UUID(value).hex,
+    ],
+    ids=["upper", "braces", "urn", "hex"],
+)
+def test_non_canonical_ids_find_the_row(client, teacher_id, form):
+    response = client.get(f"/teachers/{form(teacher_id)}")
+    assert response.status_code == 200, response.text
+    assert response.json()["id"] == teacher_id
+
+
+def test_malformed_id_is_rejected(client):
+    assert client.get("/teachers/not-a-uuid").status_code == 422
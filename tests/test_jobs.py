@@ -0,0 +1,36 @@
+import asyncio
+
+import jobs
+from config import settings
+
+
+async def _long_job(path) -> tuple:
+    queue = jobs.JobQueue(str(path))
+    runner = jobs.JobRunner(queue, concurrency=1, poll_interval=0.05)
+    try:
+        await queue.enqueue("slow", None, {})
+        job = await queue.claim(settings.JOBS_LEASE_SECONDS)
+        run = asyncio.ensure_future(runner._run(job))
+        # Второй воркер опрашивает очередь, пока задача выполняется
+        stolen = []
+        while not run.done():
+            stolen.append(await queue.claim(settings.JOBS_LEASE_SECONDS))
+            await asyncio.sleep(0.02)
+        await run
+        conn = await queue._connection()
+        async with conn.execute("SELECT status, attempts FROM jobs") as cursor:
+            return [job for job in stolen if job is not None], await cursor.fetchall()
+    finally:
+        await queue.close()
+
+
+def test_lease_is_renewed_while_job_runs(tmp_path, monkeypatch):
+    async def slow(tenant):
+        # Выполняется в несколько раз дольше аренды
+        await asyncio.sleep(0.6)
+
+    monkeypatch.setitem(jobs.HANDLERS, "slow", slow)
+    monkeypatch.setattr(settings, "JOBS_LEASE_SECONDS", 0.15)
+    stolen, rows = asyncio.run(_long_job(tmp_path / "jobs.db"))
+    assert stolen == []
+    assert [tuple(row) for row in rows] == [("done", 1)]
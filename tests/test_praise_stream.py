@@ -0,0 +1,50 @@
+import uuid
+
+import pytest
+
+from config import settings
+
+
+@pytest.fixture
+def stream_teacher_id(client, admin_headers) -> str:
+    response = client.post(
+        "/admin/teachers",
+        headers=admin_headers,
+        json={
+            "username": f"stream_{uuid.uuid4().hex[:8]}",
+            "password": "secret1",
+            "full_name": "Проверка Потока Событий",
+            "subject": "Физика",
+        },
+    )
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+@pytest.mark.parametrize(
+    "revoke",
+    [
+        lambda client, headers, teacher_id: client.delete(
+            f"/admin/teachers/{teacher_id}", headers=headers
+        ),
+        lambda client, headers, teacher_id: client.put(
+            f"/admin/teachers/{teacher_id}", headers=headers, json={"password": "secret2"}
+        ),
+    ],
+    ids=["deleted", "password_changed"],
+)
+def test_stream_closes_when_access_is_revoked(
+    client, admin_headers, stream_teacher_id, monkeypatch, revoke
+):
+    # TestClient дочитывает ответ целиком, поэтому генератор потока
+    # проверяется напрямую в цикле приложения
+    from handlers.praise import _praise_event_stream
+
+    monkeypatch.setattr(settings, "SSE_HEARTBEAT_SECONDS", 0.05)
+    stream = _praise_event_stream(None, stream_teacher_id, None)
+    assert client.portal.call(stream.__anext__) == ": heartbeat\n\n"
+    assert client.portal.call(stream.__anext__) == ": heartbeat\n\n"
+
+    assert revoke(client, admin_headers, stream_teacher_id).status_code == 200
+    with pytest.raises(StopAsyncIteration):
+        client.portal.call(stream.__anext__)
@@ -0,0 +1,179 @@
+"""
+Бюджет SQL-запросов и коммитов на эндпоинт: одна сессия и не больше
+одного коммита на запрос. Рост числа запросов - регрессия, которую
+нужно либо исправить, либо осознанно отразить здесь
+"""
+
+import uuid
+from contextlib import contextmanager
+from typing import List
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from conftest import TEACHER
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements: List[str] = []
+        self.commits = 0
+
+    def _statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def _commit(self, conn):
+        self.commits += 1
+
+    def describe(self) -> str:
+        return "\n".join(" ".join(statement.split()) for statement in self.statements)
+
+
+@contextmanager
+def count_queries():
+    counter = StatementCounter()
+    event.listen(Engine, "before_cursor_execute", counter._statement)
+    event.listen(Engine, "commit", counter._commit)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, "before_cursor_execute", counter._statement)
+        event.remove(Engine, "commit", counter._commit)
+
+
+def assert_budget(counter: StatementCounter, statements: int, commits: int) -> None:
+    assert len(counter.statements) == statements, counter.describe()
+    assert counter.commits == commits
+
+
+@pytest.fixture(scope="module")
+def praise_id(client, teacher_id) -> str:
+    response = client.post(
+        "/praise", json={"teacher_id": teacher_id, "message": "Спасибо за уроки!"}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()["praise_id"]
+
+
+@pytest.fixture
+def new_teacher_id(client, admin_headers) -> str:
+    response = client.post(
+        "/admin/teachers",
+        headers=admin_headers,
+        json={
+            "username": f"budget_{uuid.uuid4().hex[:8]}",
+            "full_name": "Проверка Бюджета Запросов",
+            "subject": "Физика",
+            "password": "secret1",
+        },
+    )
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_list_teachers(client):
+    with count_queries() as counter:
+        assert client.get("/teachers").status_code == 200
+    assert_budget(counter, statements=1, commits=0)
+
+
+def test_get_teacher(client, teacher_id):
+    with count_queries() as counter:
+        assert client.get(f"/teachers/{teacher_id}").status_code == 200
+    assert_budget(counter, statements=1, commits=0)
+
+
+def test_send_praise(client, teacher_id):
+    with count_queries() as counter:
+        response = client.post(
+            "/praise",
+            json={"teacher_id": teacher_id, "message": "Спасибо за интересные уроки!"},
+        )
+    assert response.status_code == 200, response.text
+    # Преподаватель, INSERT сообщения, upsert сводных интервалов
+    assert_budget(counter, statements=3, commits=1)
+
+
+def test_teacher_inbox(client, teacher_id, teacher_headers, praise_id):
+    with count_queries() as counter:
+        response = client.get(f"/praise/teacher/{teacher_id}", headers=teacher_headers)
+    assert response.status_code == 200
+    # Текущий пользователь и страница сообщений в одной сессии
+    assert_budget(counter, statements=2, commits=0)
+
+
+def test_admin_stats(client, admin_headers):
+    with count_queries() as counter:
+        assert client.get("/admin/stats", headers=admin_headers).status_code == 200
+    assert_budget(counter, statements=2, commits=0)
+
+
+def test_admin_praises(client, admin_headers, praise_id):
+    with count_queries() as counter:
+        assert client.get("/admin/praises", headers=admin_headers).status_code == 200
+    assert_budget(counter, statements=2, commits=0)
+
+
+def test_create_teacher(client, admin_headers):
+    with count_queries() as counter:
+        response = client.post(
+            "/admin/teachers",
+            headers=admin_headers,
+            json={
+                "username": "budget_create",
+                "full_name": "Проверка Создания Учителя",
+                "subject": "Химия",
+                "password": "secret1",
+            },
+        )
+    assert response.status_code == 200, response.text
+    # Администратор, проверка имени, INSERT без refresh
+    assert_budget(counter, statements=3, commits=1)
+
+
+def test_update_teacher(client, admin_headers, new_teacher_id):
+    with count_queries() as counter:
+        response = client.put(
+            f"/admin/teachers/{new_teacher_id}",
+            headers=admin_headers,
+            json={"subject": "Астрономия"},
+        )
+    assert response.status_code == 200, response.text
+    assert_budget(counter, statements=3, commits=1)
+
+
+def test_delete_teacher(client, admin_headers, new_teacher_id):
+    with count_queries() as counter:
+        response = client.delete(f"/admin/teachers/{new_teacher_id}", headers=admin_headers)
+    assert response.status_code == 200, response.text
+    # Администратор, преподаватель, UPDATE deleted_at и отзыв refresh-токенов
+    assert_budget(counter, statements=4, commits=1)
+
+
+def test_update_teacher_password(client, admin_headers, new_teacher_id):
+    with count_queries() as counter:
+        response = client.put(
+            f"/admin/teachers/{new_teacher_id}",
+            headers=admin_headers,
+            json={"password": "secret2"},
+        )
+    assert response.status_code == 200, response.text
+    # Смена пароля дополнительно отзывает refresh-токены
+    assert_budget(counter, statements=4, commits=1)
+
+
+def test_delete_praise(client, admin_headers, praise_id):
+    with count_queries() as counter:
+        response = client.delete(f"/admin/praises/{praise_id}", headers=admin_headers)
+    assert response.status_code == 200, response.text
+    # DELETE ... RETURNING и уменьшение часового и суточного интервалов
+    assert_budget(counter, statements=4, commits=1)
+
+
+def test_login(client):
+    with count_queries() as counter:
+        response = client.post("/auth/login", json=TEACHER)
+    assert response.status_code == 200, response.text
+    # Преподаватель по имени и новый refresh-токен
+    assert_budget(counter, statements=2, commits=1)
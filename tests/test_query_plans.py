@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+
+import migrations
+import models
+
+ADMIN_PRAISES = [
+    query for query in migrations.PLANNED_QUERIES if query.name.startswith("admin.praises")
+]
+
+
+@pytest.fixture(scope="module")
+def report(tmp_path_factory):
+    path = tmp_path_factory.mktemp("plans") / "plans.db"
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        models.Base.metadata.create_all(conn)
+        migrations.apply_pending(conn)
+        yield migrations.check_indexes(conn)
+    engine.dispose()
+
+
+def test_every_filter_value_is_planned():
+    names = {query.name for query in ADMIN_PRAISES}
+    # 4 фильтра без флагов и 3 флага с двумя значениями: 2**4 * 3**3
+    assert len(names) == len(ADMIN_PRAISES) == 432
+    assert "admin.praises[has_user_name=false,is_flagged=false]" in names
+    assert "admin.praises[subject,is_anonymous=false]" in names
+
+
+@pytest.mark.parametrize("query", ADMIN_PRAISES, ids=lambda query: query.name)
+def test_admin_praises_plan(report, query):
+    plan = report.plans[query.name]
+    assert query.name not in report.full_scans, plan
+    assert query.name not in report.temp_sorts, plan
+
+
+def test_no_full_scans_or_temp_sorts(report):
+    assert report.full_scans == {}
+    assert report.temp_sorts == []
+    assert report.missing_indexes == []
+    assert report.unused_indexes == []
+
+
+@pytest.mark.parametrize(
+    "database, returncode", [(":memory:", 0), ("{tmp}/empty.db", 1)]
+)
+def test_check_indexes_cli(tmp_path, database, returncode):
+    src = os.path.join(os.path.dirname(__file__), "..", "src")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{database.format(tmp=tmp_path)}",
+    }
+    result = subprocess.run(
+        [sys.executable, "cli.py", "migrate", "check-indexes"],
+        cwd=src,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == returncode, result.stdout + result.stderr
+    if returncode:
+        assert "migrate apply" in result.stdout
@@ -0,0 +1,75 @@
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def credentials(client, admin_headers) -> dict:
+    credentials = {"username": f"revoke_{uuid.uuid4().hex[:8]}", "password": "secret1"}
+    response = client.post(
+        "/admin/teachers",
+        headers=admin_headers,
+        json={**credentials, "full_name": "Проверка Отзыва Токенов", "subject": "Физика"},
+    )
+    assert response.status_code == 200, response.text
+    credentials["id"] = response.json()["id"]
+    return credentials
+
+
+def _refresh_tokens(client, credentials, count: int = 2) -> list:
+    tokens = []
+    for _ in range(count):
+        response = client.post(
+            "/auth/login",
+            json={"username": credentials["username"], "password": credentials["password"]},
+        )
+        assert response.status_code == 200, response.text
+        tokens.append(response.json()["refresh_token"])
+    return tokens
+
+
+def _refresh(client, token: str) -> int:
+    return client.post("/auth/refresh", json={"refresh_token": token}).status_code
+
+
+def test_password_change_revokes_all_families(client, admin_headers, credentials):
+    tokens = _refresh_tokens(client, credentials)
+    response = client.put(
+        f"/admin/teachers/{credentials['id']}",
+        headers=admin_headers,
+        json={"password": "secret2"},
+    )
+    assert response.status_code == 200, response.text
+    assert [_refresh(client, token) for token in tokens] == [401, 401]
+
+
+def test_profile_update_keeps_sessions(client, admin_headers, credentials):
+    (token,) = _refresh_tokens(client, credentials, count=1)
+    response = client.put(
+        f"/admin/teachers/{credentials['id']}",
+        headers=admin_headers,
+        json={"subject": "Астрономия"},
+    )
+    assert response.status_code == 200, response.text
+    assert _refresh(client, token) == 200
+
+
+def test_delete_revokes_all_families(client, admin_headers, credentials):
+    import models
+    from database import get_db_context
+    from sqlalchemy import func, select
+
+    _refresh_tokens(client, credentials)
+    response = client.delete(f"/admin/teachers/{credentials['id']}", headers=admin_headers)
+    assert response.status_code == 200, response.text
+
+    async def active_tokens() -> int:
+        async with get_db_context() as db:
+            return await db.scalar(
+                select(func.count()).where(
+                    models.RefreshToken.teacher_id == credentials["id"],
+                    models.RefreshToken.revoked_at.is_(None),
+                )
+            )
+
+    assert client.portal.call(active_tokens) == 0
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+import models
+import rollups
+import spam
+from database import create_tables, get_engine
+
+BASE = (
+    "Огромное спасибо нашему учителю за терпение, доброту и интересные уроки, "
+    "за то что всегда находит время объяснить сложную тему каждому ученику!"
+)
+
+
+def make_detector(window_seconds: float = 600.0) -> spam.SpamDetector:
+    return spam.SpamDetector(
+        window_seconds=window_seconds,
+        duplicate_limit=3,
+        max_distance=3,
+        min_length=20,
+        max_entries=10000,
+    )
+
+
+def send(detector: spam.SpamDetector, message: str, now: float) -> spam.Verdict:
+    verdict = detector.check(message, now=now)
+    detector.observe(verdict, now=now)
+    return verdict
+
+
+def test_wave_is_flagged_after_limit():
+    detector = make_detector()
+    verdicts = [send(detector, BASE, now=100.0 + i) for i in range(4)]
+    assert [v.is_spam for v in verdicts] == [False, False, False, True]
+
+
+def test_edited_copies_share_one_counter():
+    detector = make_detector()
+    for i in range(50):
+        edited = BASE.replace("доброту", "доброту" + "!" * (i % 3))
+        send(detector, edited if i % 2 else BASE, now=100.0)
+    window = detector._window(None)
+    clusters = {id(c) for bucket in window._buckets.values() for c in bucket.values()}
+    assert len(window) == 50
+    assert len(clusters) == 1
+
+
+def test_short_messages_are_not_tracked():
+    detector = make_detector()
+    for _ in range(10):
+        verdict = send(detector, "Спасибо!", now=100.0)
+    assert verdict.simhash is None
+    assert not verdict.is_spam
+    assert len(detector._window(None)) == 0
+
+
+def test_window_expires():
+    detector = make_detector(window_seconds=10.0)
+    for _ in range(3):
+        send(detector, BASE, now=100.0)
+    assert detector.check(BASE, now=105.0).is_spam
+    assert not detector.check(BASE, now=111.0).is_spam
+    assert not detector._window(None)._buckets
+
+
+def test_simhash_matches_normalized_text():
+    assert spam.simhash("Спасибо, УЧИТЕЛЬ!") == spam.simhash("спасибо учитель")
+    assert spam.fingerprint("Ёлка") == spam.fingerprint("елка")
+
+
+async def _rescan_analytics(tenant: str) -> tuple:
+    engine = get_engine(tenant)
+    await create_tables(engine)
+    teacher_id = models.generate_uuid()
+    sent_at = datetime(2025, 3, 1, 10, 0)
+    async with engine.begin() as conn:
+        await conn.execute(
+            models.Teacher.__table__.insert().values(
+                id=teacher_id,
+                username="wave",
+                full_name="Преподаватель Волны",
+                subject="История",
+                password_hash="hash",
+            )
+        )
+        await conn.execute(
+            models.PraiseMessage.__table__.insert(),
+            [
+                {
+                    "id": models.generate_uuid(),
+                    "teacher_id": teacher_id,
+                    "message": BASE,
+                    "created_at": sent_at + timedelta(seconds=i),
+                }
+                for i in range(5)
+            ],
+        )
+    # Сводные интервалы посчитаны до того, как волну отметили
+    await rollups.backfill(tenant=tenant)
+
+    async def total() -> int:
+        async with engine.connect() as conn:
+            statement = rollups.analytics_statement(
+                sent_at - timedelta(days=1), sent_at + timedelta(days=1)
+            )
+            result = await conn.execute(statement)
+            return sum(row.count for row in result)
+
+    before = await total()
+    totals = await spam.rescan(tenant=tenant)
+    async with engine.connect() as conn:
+        flagged = await conn.scalar(
+            select(models.PraiseMessage.id).where(models.PraiseMessage.is_flagged).limit(1)
+        )
+    return before, totals["flagged"], flagged is not None, await total()
+
+
+def test_rescan_removes_flagged_from_analytics(client, tenant_databases):
+    before, flagged, stored, after = client.portal.call(_rescan_analytics, "rescan")
+    assert (before, flagged, stored) == (5, 2, True)
+    assert after == 3